@@ -0,0 +1,26 @@
+"""
+Imported first by the benchmark scripts, before any service module.
+
+Makes the service package (src/) and the test fakes (tests/) importable
+without installing anything, and gives the settings harmless values so the
+modules that read them at import time load without an .env. DATA_DIR is
+always a fresh temporary directory: a benchmark never touches real state.
+"""
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+
+sys.path.insert(0, str(ROOT / "src"))
+sys.path.insert(0, str(ROOT))
+
+os.environ.setdefault("AWS_REGION", "us-east-1")
+os.environ.setdefault("AWS_ACCESS_KEY_ID", "benchmark")
+os.environ.setdefault("AWS_SECRET_ACCESS_KEY", "benchmark")
+os.environ.setdefault("OWNER_PHONE", "+15550000000")
+os.environ.setdefault(
+    "IG_THREAD_URL", "https://www.instagram.com/direct/t/100/"
+)
+os.environ["DATA_DIR"] = tempfile.mkdtemp(prefix="ig-monitor-bench-")
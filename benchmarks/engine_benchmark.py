@@ -0,0 +1,216 @@
+#!/usr/bin/env python3
+"""
+Browser engine benchmark for the monitor.
+
+Launches each engine against the local fixture thread
+(benchmarks/fixtures/thread.html, served over HTTP on localhost) and reports:
+
+  - launch time: launch + context + first render of the thread
+  - steady-state memory of the browser process tree (PSS where the kernel
+    provides it, else RSS), measured after an idle settle period
+  - CPU per poll: browser + Python CPU time spent per message extraction
+
+Linux only (reads /proc). Install the engines first, e.g.
+    python -m playwright install \
+        chromium chromium-headless-shell firefox webkit
+
+Usage:
+    python benchmarks/engine_benchmark.py
+    python benchmarks/engine_benchmark.py \
+        --engines chromium-headless-shell,firefox --polls 50
+"""
+import argparse
+import asyncio
+import functools
+import http.server
+import os
+import sys
+import threading
+import time
+
+import _bootstrap
+from playwright.async_api import async_playwright
+
+from ig_monitor import engines
+from ig_monitor.extract import extract_messages
+
+
+FIXTURES_DIR = _bootstrap.ROOT / "benchmarks" / "fixtures"
+CLOCK_TICKS = os.sysconf("SC_CLK_TCK")
+
+
+def _children_map() -> dict:
+    children: dict = {}
+    for entry in os.listdir("/proc"):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f"/proc/{entry}/stat") as fh:
+                # Field 4 is the parent pid; the command name may contain
+                # spaces
+                ppid = int(fh.read().rsplit(")", 1)[1].split()[1])
+        except (OSError, ValueError, IndexError):
+            continue
+        children.setdefault(ppid, []).append(int(entry))
+    return children
+
+
+def _descendants(root: int) -> set:
+    children = _children_map()
+    found, stack = set(), [root]
+    while stack:
+        for child in children.get(stack.pop(), []):
+            if child not in found:
+                found.add(child)
+                stack.append(child)
+    return found
+
+
+def _memory_kb(pid: int) -> int:
+    """
+    Proportional set size (shared pages split between processes), falling
+    back to RSS
+    """
+    try:
+        with open(f"/proc/{pid}/smaps_rollup") as fh:
+            for line in fh:
+                if line.startswith("Pss:"):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    try:
+        with open(f"/proc/{pid}/status") as fh:
+            for line in fh:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    return 0
+
+
+def _cpu_seconds(pid: int) -> float:
+    try:
+        with open(f"/proc/{pid}/stat") as fh:
+            fields = fh.read().rsplit(")", 1)[1].split()
+        # utime and stime are fields 14 and 15 of the full stat line
+        return (int(fields[11]) + int(fields[12])) / CLOCK_TICKS
+    except (OSError, ValueError, IndexError):
+        return 0.0
+
+
+def _serve_fixtures() -> tuple:
+    handler = functools.partial(_QuietHandler, directory=str(FIXTURES_DIR))
+    server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}/thread.html"
+
+
+class _QuietHandler(http.server.SimpleHTTPRequestHandler):
+    def log_message(self, *args):
+        pass
+
+
+async def bench_engine(
+    pw, engine: str, url: str, polls: int, settle_seconds: float
+) -> dict:
+    # The Playwright driver is already running
+    existing = _descendants(os.getpid())
+
+    started = time.perf_counter()
+    browser = await engines.browser_type(pw, engine).launch(
+        **engines.launch_options(engine, True)
+    )
+    try:
+        context = await browser.new_context(**engines.context_options(engine))
+        page = await context.new_page()
+        stealth = engines.stealth_script(engine)
+        if stealth:
+            await page.add_init_script(stealth)
+        await page.goto(url, wait_until="domcontentloaded")
+        await page.wait_for_selector("[role='row']")
+        launch_seconds = time.perf_counter() - started
+
+        # Let startup work (compilation, GC) finish before measuring steady
+        # state
+        await asyncio.sleep(settle_seconds)
+        procs = _descendants(os.getpid()) - existing
+        browser_cpu_before = sum(_cpu_seconds(p) for p in procs)
+        python_cpu_before = time.process_time()
+        poll_started = time.perf_counter()
+        extracted = 0
+        for _ in range(polls):
+            extracted = len(await extract_messages(page, "benchmark"))
+        poll_wall = (time.perf_counter() - poll_started) / polls
+        browser_cpu = sum(_cpu_seconds(p) for p in procs) - browser_cpu_before
+        python_cpu = time.process_time() - python_cpu_before
+
+        procs = _descendants(os.getpid()) - existing
+        return {
+            "engine": engine,
+            "launch_s": launch_seconds,
+            "memory_mb": sum(_memory_kb(p) for p in procs) / 1024,
+            "processes": len(procs),
+            "cpu_ms_per_poll": (browser_cpu + python_cpu) / polls * 1000,
+            "wall_ms_per_poll": poll_wall * 1000,
+            "messages": extracted,
+        }
+    finally:
+        await browser.close()
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(
+        description=__doc__,
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+    )
+    parser.add_argument(
+        "--engines",
+        default=",".join(engines.ENGINES),
+        help="comma separated engine names",
+    )
+    parser.add_argument(
+        "--polls", type=int, default=30, help="extractions per engine"
+    )
+    parser.add_argument(
+        "--settle",
+        type=float,
+        default=5.0,
+        help="idle seconds before measuring",
+    )
+    args = parser.parse_args()
+
+    server, url = _serve_fixtures()
+    results = []
+    try:
+        async with async_playwright() as pw:
+            for engine in args.engines.split(","):
+                engine = engine.strip()
+                print(f"Benchmarking {engine}...", file=sys.stderr)
+                try:
+                    results.append(await bench_engine(
+                        pw, engine, url, args.polls, args.settle
+                    ))
+                except Exception as e:
+                    results.append(
+                        {"engine": engine, "error": str(e).splitlines()[0]}
+                    )
+    finally:
+        server.shutdown()
+
+    print(
+        f"{'engine':<26}{'launch s':>10}{'memory MB':>11}{'procs':>7}"
+        f"{'cpu ms/poll':>13}{'wall ms/poll':>14}"
+    )
+    for r in results:
+        if "error" in r:
+            print(f"{r['engine']:<26}  error: {r['error']}")
+            continue
+        print(
+            f"{r['engine']:<26}{r['launch_s']:>10.2f}"
+            f"{r['memory_mb']:>11.1f}{r['processes']:>7}"
+            f"{r['cpu_ms_per_poll']:>13.2f}{r['wall_ms_per_poll']:>14.2f}"
+        )
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+"""
+Monitor loop microbenchmark on the in-memory fake browser (tests/fakes.py).
+
+Runs the real _monitor_loop against a scripted Instagram with a virtual clock,
+so it measures only our own Python overhead per poll: extraction bookkeeping,
+id assignment, the SQLite seen-set, lease claims and events. No browser needed.
+
+Usage:
+    python benchmarks/monitor_loop_benchmark.py
+    python benchmarks/monitor_loop_benchmark.py \
+        --polls 5000 --mode inbox --threads 20
+    python benchmarks/monitor_loop_benchmark.py --profile
+"""
+import argparse
+import asyncio
+import cProfile
+import pstats
+import time
+
+import _bootstrap  # noqa: F401  (sys.path and settings, before ig_monitor)
+
+from ig_monitor import monitor, settle, state
+from ig_monitor.http_backend import thread_id_from_url
+from tests.fakes import FakeClock, FakeInstagram
+
+
+def build_scenario(polls: int, threads: int, mode: str) -> FakeInstagram:
+    """A new message somewhere roughly every third poll, plus some history"""
+    ig = FakeInstagram(FakeClock())
+    keys = [thread_id_from_url(str(monitor.settings.ig_thread_url))]
+    if mode == "inbox":
+        keys = [str(1000 + i) for i in range(threads)]
+    for key in keys:
+        for i in range(20):
+            ig.add_message(key, f"history {i}", at=-1000 + i)
+    step = monitor.settings.poll_seconds * 3
+    for i in range(polls // 3):
+        ig.add_message(keys[i % len(keys)], f"message {i}", at=step * (i + 1))
+    return ig
+
+
+async def run(polls: int, threads: int, mode: str) -> dict:
+    ig = build_scenario(polls, threads, mode)
+    sent = []
+    monitor.send_sms = lambda to, body: sent.append(body)
+    monitor.settings.monitor_mode = mode
+    monitor.set_browser_factory(ig.new_context)
+
+    calls = 0
+
+    async def limited_running() -> bool:
+        nonlocal calls
+        calls += 1
+        return calls <= polls
+
+    monitor.is_running = limited_running
+    await state.init_state()
+    with ig.clock.patch(monitor, settle):
+        started = time.perf_counter()
+        cpu_started = time.process_time()
+        await monitor._monitor_loop()
+        wall = time.perf_counter() - started
+        cpu = time.process_time() - cpu_started
+    return {
+        "polls": polls,
+        "wall_s": wall,
+        "polls_per_s": polls / wall,
+        "cpu_ms_per_poll": cpu / polls * 1000,
+        "sms": len(sent),
+        "evaluations": ig.evaluations,
+        "virtual_hours": ig.clock.slept / 3600,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description=__doc__,
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+    )
+    parser.add_argument("--polls", type=int, default=2000)
+    parser.add_argument(
+        "--mode", choices=("thread", "inbox"), default="thread"
+    )
+    parser.add_argument(
+        "--threads", type=int, default=10, help="conversations in inbox mode"
+    )
+    parser.add_argument(
+        "--profile",
+        action="store_true",
+        help="print the top functions by cumulative time",
+    )
+    args = parser.parse_args()
+
+    profiler = cProfile.Profile() if args.profile else None
+    if profiler:
+        profiler.enable()
+    result = asyncio.run(run(args.polls, args.threads, args.mode))
+    if profiler:
+        profiler.disable()
+
+    print(
+        f"{result['polls']} polls ({args.mode} mode, "
+        f"{result['virtual_hours']:.1f} virtual hours) "
+        f"in {result['wall_s']:.2f}s: {result['polls_per_s']:.0f} polls/s, "
+        f"{result['cpu_ms_per_poll']:.2f} ms CPU/poll, {result['sms']} SMS, "
+        f"{result['evaluations']} page evaluations"
+    )
+    if profiler:
+        pstats.Stats(profiler).sort_stats("cumulative").print_stats(25)
+
+
+if __name__ == "__main__":
+    main()
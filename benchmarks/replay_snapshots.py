@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+"""
+Replay recorded thread DOM snapshots through the message extractor, offline.
+
+Snapshots are written by the monitor when SNAPSHOT_RECORDING=true (sanitized,
+gzipped, under DATA_DIR/snapshots). Each one is loaded into a local page with
+all network blocked, MESSAGES_JS runs on it, and the result is compared with
+what the extractor returned live when the snapshot was taken.
+
+Reports precision/recall of message texts, sender and timestamp accuracy,
+median extraction time, and how many snapshots would need the legacy fallback.
+A drop in recall after an extractor change (or on new recordings) means the
+layout moved.
+
+Usage:
+    python benchmarks/replay_snapshots.py /data/snapshots
+    python benchmarks/replay_snapshots.py snapshots/*.json.gz \
+        --engine firefox --repeats 20
+"""
+import argparse
+import asyncio
+import os
+import sys
+
+import _bootstrap  # noqa: F401  (sys.path and settings, before ig_monitor)
+from playwright.async_api import async_playwright
+
+from ig_monitor import engines
+from ig_monitor.snapshots import SnapshotStore, replay
+
+
+def _paths(args: list) -> list:
+    paths = []
+    for arg in args:
+        if os.path.isdir(arg):
+            paths.extend(SnapshotStore(arg, 0).files())
+        else:
+            paths.append(arg)
+    return paths
+
+
+def _pct(value) -> str:
+    return "   n/a" if value is None else f"{value * 100:5.1f}%"
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(
+        description=__doc__,
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+    )
+    parser.add_argument(
+        "snapshots", nargs="+", help="snapshot files or directories"
+    )
+    parser.add_argument(
+        "--engine", default="chromium", choices=engines.ENGINES
+    )
+    parser.add_argument(
+        "--repeats",
+        type=int,
+        default=5,
+        help="extractions per snapshot (median is reported)",
+    )
+    args = parser.parse_args()
+
+    paths = _paths(args.snapshots)
+    if not paths:
+        sys.exit("No snapshots found")
+
+    async with async_playwright() as pw:
+        browser = await engines.browser_type(pw, args.engine).launch(
+            **engines.launch_options(args.engine, True)
+        )
+        try:
+            page = await browser.new_page()
+            # Offline: the sanitized HTML has no scripts, and nothing may be
+            # fetched
+            await page.route("**/*", lambda route: route.abort())
+            report = await replay(page, paths, repeats=args.repeats)
+        finally:
+            await browser.close()
+
+    print(
+        f"{'snapshot':<36}{'exp':>5}{'got':>5}{'prec':>8}{'recall':>8}"
+        f"{'sender':>8}{'time':>8}{'ms':>8}"
+    )
+    for r in report["results"]:
+        print(
+            f"{r['file']:<36}{r['expected']:>5}{r['extracted']:>5}"
+            f"{_pct(r['precision']):>8}{_pct(r['recall']):>8}"
+            f"{_pct(r['sender_accuracy']):>8}"
+            f"{_pct(r['timestamp_accuracy']):>8}{r['extract_ms']:>8.2f}"
+        )
+    print(
+        f"\n{report['snapshots']} snapshots: "
+        f"precision {_pct(report['precision'])}, "
+        f"recall {_pct(report['recall'])}, "
+        f"sender {_pct(report['sender_accuracy'])}, "
+        f"timestamp {_pct(report['timestamp_accuracy'])}, "
+        f"median {report['extract_ms_median']:.2f} ms, "
+        f"{report['needs_fallback']} need the fallback"
+    )
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -21,6 +21,7 @@ async def login_instagram():
     data_dir = Path(__file__).parent / "data"
     user_data_dir = data_dir / "user_data_dir"
     user_data_dir.mkdir(parents=True, exist_ok=True)
+    storage_state_file = data_dir / "storage_state.json"
     
     print("🌐 Opening Instagram in browser...")
     print("📝 Please log in to Instagram in the browser window that opens")
@@ -82,13 +83,18 @@ async def login_instagram():
             print("")
             print("⏱️  Timeout reached. Assuming login complete or manual exit.")
         
+        # Compact session (cookies + localStorage only) for SESSION_MODE=storage_state
+        await browser.storage_state(path=str(storage_state_file))
+        
         print("")
         print("💾 Session saved to:", user_data_dir)
+        print("💾 Compact session saved to:", storage_state_file)
         print("")
         print("📦 To use this session on Render:")
         print("   1. The session is saved in: ./data/user_data_dir")
         print("   2. You can copy this folder to Render's persistent disk")
         print("   3. Or run the monitor locally with this session")
+        print("   4. Or, with SESSION_MODE=storage_state, copy just ./data/storage_state.json")
         print("")
         print("🔄 To log out, delete the session folder and run this script again")
         print("")
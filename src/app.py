@@ -1,13 +1,16 @@
 import asyncio
+import json
 import logging
 import sys
 from typing import Optional
-from fastapi import FastAPI, Request, Depends, HTTPException, Query, Form
-from fastapi.responses import JSONResponse, PlainTextResponse, HTMLResponse, Response
+from fastapi import FastAPI, Request, Depends, HTTPException, Query, Form, WebSocket, WebSocketDisconnect
+from fastapi.responses import JSONResponse, PlainTextResponse, HTMLResponse, Response, StreamingResponse
 from ig_monitor.config import get_settings
 from ig_monitor.sms import send_sms
-from ig_monitor.state import init_state, get_last_seen_id, get_last_login_ts, is_running as state_is_running
-from ig_monitor.monitor import start_monitor, stop_monitor, is_monitor_running, get_browser_page
+from ig_monitor.state import is_running as state_is_running
+from ig_monitor import events, heap, sampler
+from ig_monitor.scheduler import SchedulerBusy
+from ig_monitor.worker import get_browser
 
 # Configure logging to output to stdout (so Render captures it)
 logging.basicConfig(
@@ -22,19 +25,68 @@ app = FastAPI(title="IG-SMS")
 settings = get_settings()
 
 
+# Owns the browser here (BROWSER_WORKER=inline) or talks to the worker process
+browser = get_browser()
+
+
 @app.on_event("startup")
 async def _startup() -> None:
-    await init_state()
+    try:
+        await browser.start()
+    except Exception as e:
+        # Requests retry the connection; /readyz reports the worker as unavailable meanwhile
+        logger.error(f"Browser owner failed to start: {e}", exc_info=True)
+
+
+@app.on_event("shutdown")
+async def _shutdown() -> None:
+    await browser.close()
 
 
 @app.get("/healthz")
 async def healthz():
-    return JSONResponse({
-        "status": "ok",
-        "poll_seconds": settings.poll_seconds,
-        "data_dir": settings.data_dir,
-        "monitor_running": is_monitor_running(),
-    })
+    """Liveness: 503 while the monitor loop's heartbeat is older than the watchdog allows"""
+    health = await browser.health()
+    return JSONResponse(
+        {
+            "status": "ok" if health["healthy"] else "stale",
+            "poll_seconds": settings.poll_seconds,
+            "data_dir": settings.data_dir,
+            "browser_worker": settings.browser_worker,
+            **health,
+        },
+        status_code=200 if health["healthy"] else 503,
+    )
+
+
+@app.get("/readyz")
+async def readyz():
+    """
+    Readiness, as opposed to /healthz liveness: 503 until the state database is
+    open and the browser has been pre-launched (or while it is launching or
+    its launch failed), or while the browser worker can't be reached. The
+    session is reported but doesn't affect readiness: a logged-out instance
+    can still serve the login UI.
+    """
+    try:
+        status = await browser.call("status")
+    except Exception as e:
+        return JSONResponse({"ready": False, "error": f"Browser worker unavailable: {e}"}, status_code=503)
+    launch = status["browser"]
+    if launch["status"] == "not_started":
+        browser_ready = not settings.browser_warmup or settings.monitor_backend == "http"
+    else:
+        browser_ready = launch["status"] in ("open", "closed")
+    ready = status["state_ready"] and browser_ready
+    return JSONResponse(
+        {
+            "ready": ready,
+            "state": status["state_ready"],
+            "browser": launch,
+            "session": status["session"],
+        },
+        status_code=200 if ready else 503,
+    )
 
 
     # NOTE: Twilio inbound SMS command handling has been removed.
@@ -113,8 +165,8 @@ async def browser_interface(token: str = Query(None)):
         <div class="status" id="status">Ready. Click "Open Instagram Login" to start.</div>
         
         <div class="screenshot-container">
-            <img id="screenshot" onclick="handleScreenshotClick(event)" />
-            <div class="click-instructions">Click on the image above to interact with the page</div>
+            <img id="screenshot" tabindex="0" onclick="handleScreenshotClick(event)" />
+            <div class="click-instructions">Click on the image above to interact with the page. While it has focus, your keystrokes are sent live.</div>
         </div>
         
         <div class="controls">
@@ -142,6 +194,44 @@ async def browser_interface(token: str = Query(None)):
             status.style.color = isError ? '#721c24' : '#333';
         }
         
+        // Persistent input channel: events are pipelined over one WebSocket and acked in order.
+        // Falls back to the per-action HTTP endpoints whenever the socket isn't open.
+        let ws = null;
+        let nextInputId = 1;
+        const pendingInputs = new Map();
+        
+        function connectInputChannel() {
+            const proto = window.location.protocol === 'https:' ? 'wss' : 'ws';
+            ws = new WebSocket(`${proto}://${window.location.host}/browser/ws?token=${encodeURIComponent(token)}`);
+            ws.onmessage = (e) => {
+                const msg = JSON.parse(e.data);
+                if (msg.idle) {
+                    getScreenshot();
+                    return;
+                }
+                const label = pendingInputs.get(msg.ack);
+                pendingInputs.delete(msg.ack);
+                if (msg.ok) {
+                    updateStatus(`✅ ${label || 'Done'}`);
+                } else {
+                    updateStatus(`❌ ${label || 'Input'} failed: ${msg.error || 'Unknown error'}`, true);
+                }
+            };
+            ws.onclose = () => {
+                ws = null;
+                pendingInputs.clear();
+                setTimeout(connectInputChannel, 3000);
+            };
+        }
+        
+        function sendInput(msg, label) {
+            if (!ws || ws.readyState !== WebSocket.OPEN) return false;
+            msg.id = nextInputId++;
+            pendingInputs.set(msg.id, label);
+            ws.send(JSON.stringify(msg));
+            return true;
+        }
+        
         async function navigateTo(url) {
             updateStatus(`Navigating to ${url}...`);
             try {
@@ -224,7 +314,7 @@ async def browser_interface(token: str = Query(None)):
         
         async function checkLoginStatus() {
             try {
-                const response = await fetch(`/browser/status?token=${token}`);
+                const response = await fetch(`/browser/status?refresh=1&token=${token}`);
                 if (!response.ok) {
                     const text = await response.text();
                     updateStatus(`❌ Status check failed: ${response.status} ${text}`, true);
@@ -258,6 +348,8 @@ async def browser_interface(token: str = Query(None)):
             const actualY = Math.round(y * scaleY);
             
             updateStatus(`Clicking at (${actualX}, ${actualY})...`);
+            img.focus();
+            if (sendInput({type: 'click', x: actualX, y: actualY}, `Clicked at (${actualX}, ${actualY})`)) return;
             try {
                 const response = await fetch(`/browser/click?token=${token}&x=${actualX}&y=${actualY}`, {
                     method: 'POST'
@@ -284,6 +376,10 @@ async def browser_interface(token: str = Query(None)):
             if (!text) return;
             
             updateStatus(`Typing text...`);
+            if (sendInput({type: 'type', text: text}, 'Typed text')) {
+                document.getElementById('typeInput').value = '';
+                return;
+            }
             try {
                 const response = await fetch(`/browser/type?token=${token}&text=${encodeURIComponent(text)}`, {
                     method: 'POST'
@@ -315,6 +411,7 @@ async def browser_interface(token: str = Query(None)):
         }
         
         async function sendKey(key) {
+            if (sendInput({type: 'key', key: key}, `Pressed ${key}`)) return;
             try {
                 const response = await fetch(`/browser/key?token=${token}&key=${key}`, {
                     method: 'POST'
@@ -358,6 +455,7 @@ async def browser_interface(token: str = Query(None)):
         
         async function scrollPage(direction) {
             updateStatus(`Scrolling ${direction}...`);
+            if (sendInput({type: 'scroll', direction: direction}, `Scrolled ${direction}`)) return;
             try {
                 const response = await fetch(`/browser/scroll?token=${token}&direction=${direction}`, {
                     method: 'POST'
@@ -379,8 +477,20 @@ async def browser_interface(token: str = Query(None)):
             }
         }
         
+        // Live keyboard: while the screenshot has focus, forward keystrokes as they happen
+        const LIVE_KEYS = ['Enter', 'Tab', 'Backspace', 'Delete', 'Escape', 'ArrowUp', 'ArrowDown', 'ArrowLeft', 'ArrowRight'];
+        document.getElementById('screenshot').addEventListener('keydown', (e) => {
+            if (e.ctrlKey || e.metaKey || e.altKey) return;
+            if (e.key.length === 1) {
+                if (sendInput({type: 'type', text: e.key}, 'Typed')) e.preventDefault();
+            } else if (LIVE_KEYS.includes(e.key)) {
+                if (sendInput({type: 'key', key: e.key}, `Pressed ${e.key}`)) e.preventDefault();
+            }
+        });
+        
         // Add keyboard shortcuts for scrolling
         document.addEventListener('keydown', (e) => {
+            if (e.defaultPrevented) return;
             // Check if not typing in an input field
             if (e.target.tagName !== 'INPUT' && e.target.tagName !== 'TEXTAREA') {
                 if (e.key === 'ArrowUp' || e.key === 'PageUp') {
@@ -397,6 +507,7 @@ async def browser_interface(token: str = Query(None)):
         setInterval(getScreenshot, 5000);
         
         // Initial load
+        connectInputChannel();
         getScreenshot();
         checkLoginStatus();
         
@@ -415,181 +526,193 @@ async def browser_interface(token: str = Query(None)):
     """)
 
 
-# Lock to prevent concurrent navigations
-_navigation_lock = asyncio.Lock()
+TRANSPARENT_PNG = b'\x89PNG\r\n\x1a\n\x00\x00\x00\rIHDR\x00\x00\x00\x01\x00\x00\x00\x01\x08\x06\x00\x00\x00\x1f\x15\xc4\x89\x00\x00\x00\nIDATx\x9cc\x00\x01\x00\x00\x05\x00\x01\r\n-\xdb\x00\x00\x00\x00IEND\xaeB`\x82'
+
+
+def _busy_response(e: SchedulerBusy) -> JSONResponse:
+    return JSONResponse(
+        {"success": False, "error": str(e), "retry_after": e.retry_after},
+        status_code=503,
+        headers={"Retry-After": str(e.retry_after)},
+    )
+
 
 @app.get("/browser/screenshot")
 async def browser_screenshot(token: str = Query(None)):
     """Get screenshot of current browser state"""
     _check_token(token)
     try:
-        # Add timeout for entire operation (20 seconds max - reduced from 30)
-        async def _take_screenshot():
-            page = await get_browser_page()
-            
-            # Only navigate if page is truly blank, and use lock to prevent conflicts
-            # Skip navigation if it's likely to fail or conflict
-            current_url = page.url
-            if current_url and current_url not in ["about:blank", ""] and "about:" not in current_url:
-                # Page has content, just screenshot it
-                pass
-            else:
-                # Page is blank - try to navigate but don't block on it
-                # Use lock to prevent multiple simultaneous navigations
-                async with _navigation_lock:
-                    try:
-                        # Quick check if still blank (might have been navigated by another request)
-                        if page.url in ["about:blank", ""] or "about:" in page.url:
-                            logger.info("Page is blank, attempting navigation...")
-                            # Use shorter timeout and don't wait for full load
-                            await asyncio.wait_for(
-                                page.goto("https://www.instagram.com", wait_until="domcontentloaded", timeout=5000),
-                                timeout=6.0
-                            )
-                            # Give it a moment to render
-                            await asyncio.sleep(1)
-                    except (asyncio.TimeoutError, Exception) as nav_error:
-                        logger.warning(f"Navigation skipped or failed: {type(nav_error).__name__}: {nav_error}")
-                        # Continue to screenshot anyway - might be a blank/loading page
-            
-            # Try to screenshot whatever is there - even if blank or loading
-            try:
-                screenshot_bytes = await asyncio.wait_for(
-                    page.screenshot(full_page=False, clip={"x": 0, "y": 0, "width": 800, "height": 600}),
-                    timeout=5.0  # Reduced timeout for screenshot itself
-                )
-                return Response(content=screenshot_bytes, media_type="image/png")
-            except Exception as screenshot_error:
-                logger.warning(f"Screenshot capture failed: {screenshot_error}, trying without clip...")
-                # Fallback: try screenshot without clip
-                screenshot_bytes = await page.screenshot(full_page=False, timeout=5000)
-                return Response(content=screenshot_bytes, media_type="image/png")
-        
-        return await asyncio.wait_for(_take_screenshot(), timeout=20.0)
+        return Response(content=await browser.screenshot(), media_type="image/png")
+    except SchedulerBusy as e:
+        return Response(
+            content=TRANSPARENT_PNG, media_type="image/png", status_code=503,
+            headers={"Retry-After": str(e.retry_after)},
+        )
     except asyncio.TimeoutError:
-        logger.error("Screenshot operation timed out after 20 seconds")
-        transparent_png = b'\x89PNG\r\n\x1a\n\x00\x00\x00\rIHDR\x00\x00\x00\x01\x00\x00\x00\x01\x08\x06\x00\x00\x00\x1f\x15\xc4\x89\x00\x00\x00\nIDATx\x9cc\x00\x01\x00\x00\x05\x00\x01\r\n-\xdb\x00\x00\x00\x00IEND\xaeB`\x82'
-        return Response(content=transparent_png, media_type="image/png", status_code=504)  # 504 Gateway Timeout
+        logger.error("Screenshot operation timed out")
+        return Response(content=TRANSPARENT_PNG, media_type="image/png", status_code=504)  # 504 Gateway Timeout
     except Exception as e:
         logger.error(f"Screenshot error: {e}", exc_info=True)
-        transparent_png = b'\x89PNG\r\n\x1a\n\x00\x00\x00\rIHDR\x00\x00\x00\x01\x00\x00\x00\x01\x08\x06\x00\x00\x00\x1f\x15\xc4\x89\x00\x00\x00\nIDATx\x9cc\x00\x01\x00\x00\x05\x00\x01\r\n-\xdb\x00\x00\x00\x00IEND\xaeB`\x82'
-        return Response(content=transparent_png, media_type="image/png", status_code=500)
+        return Response(content=TRANSPARENT_PNG, media_type="image/png", status_code=500)
 
 
 @app.get("/browser/status")
-async def browser_status(token: str = Query(None)):
-    """Check if logged into Instagram"""
+async def browser_status(token: str = Query(None), refresh: bool = Query(False)):
+    """
+    Whether we're logged into Instagram. Served from the status snapshot the monitor
+    keeps current; refresh=1 (or no known state yet) checks the page live.
+    """
     _check_token(token)
+    snapshot = events.status_snapshot()
+    if not refresh and snapshot.get("logged_in") is not None:
+        return JSONResponse({"logged_in": snapshot["logged_in"], "url": snapshot.get("url"), "cached": True})
     try:
-        from ig_monitor.monitor import is_logged_in
-        page = await get_browser_page()
-        logged_in = await is_logged_in(page)
-        current_url = page.url
-        return JSONResponse({"logged_in": logged_in, "url": current_url})
+        result = await browser.call("login_check")
+        events.update_status(url=result["url"])
+        return JSONResponse({**result, "cached": False})
+    except SchedulerBusy as e:
+        return _busy_response(e)
     except Exception as e:
         logger.error(f"Status check error: {e}", exc_info=True)
         return JSONResponse({"logged_in": False, "error": str(e)})
 
 
+async def _browser_action(op: str, error_label: str, **args) -> JSONResponse:
+    """Run one remote-browser operation and turn the outcome into the endpoint's JSON reply"""
+    try:
+        result = await browser.call(op, **args)
+        return JSONResponse({"success": True, **result})
+    except SchedulerBusy as e:
+        return _busy_response(e)
+    except ValueError as e:
+        return JSONResponse({"success": False, "error": str(e)}, status_code=400)
+    except Exception as e:
+        logger.error(f"{error_label} error: {e}", exc_info=True)
+        return JSONResponse({"success": False, "error": str(e)}, status_code=500)
+
+
 @app.post("/browser/navigate")
 async def browser_navigate(url: str = Query(...), token: str = Query(None)):
     """Navigate browser to a URL"""
     _check_token(token)
-    try:
-        page = await get_browser_page()
-        await page.goto(url, wait_until="networkidle")
-        return JSONResponse({"success": True, "url": page.url})
-    except Exception as e:
-        logger.error(f"Navigate error: {e}", exc_info=True)
-        return JSONResponse({"success": False, "error": str(e)}, status_code=500)
+    return await _browser_action("navigate", "Navigate", url=url)
 
 
 @app.post("/browser/click")
 async def browser_click(x: int = Query(...), y: int = Query(...), token: str = Query(None)):
     """Click at coordinates in the browser"""
     _check_token(token)
-    try:
-        page = await get_browser_page()
-        await page.mouse.click(x, y)
-        await page.wait_for_timeout(500)  # Wait for any navigation/updates
-        return JSONResponse({"success": True})
-    except Exception as e:
-        logger.error(f"Click error: {e}", exc_info=True)
-        return JSONResponse({"success": False, "error": str(e)}, status_code=500)
+    return await _browser_action("click", "Click", x=x, y=y)
 
 
 @app.post("/browser/type")
 async def browser_type(text: str = Query(...), token: str = Query(None)):
     """Type text into the currently focused element"""
     _check_token(token)
-    try:
-        page = await get_browser_page()
-        await page.keyboard.type(text, delay=50)
-        return JSONResponse({"success": True})
-    except Exception as e:
-        logger.error(f"Type error: {e}", exc_info=True)
-        return JSONResponse({"success": False, "error": str(e)}, status_code=500)
+    return await _browser_action("type", "Type", text=text)
 
 
 @app.post("/browser/key")
 async def browser_key(key: str = Query(...), token: str = Query(None)):
     """Press a key (Enter, Tab, etc.)"""
     _check_token(token)
-    try:
-        page = await get_browser_page()
-        await page.keyboard.press(key)
-        await page.wait_for_timeout(300)
-        return JSONResponse({"success": True})
-    except Exception as e:
-        logger.error(f"Key press error: {e}", exc_info=True)
-        return JSONResponse({"success": False, "error": str(e)}, status_code=500)
+    return await _browser_action("key", "Key press", key=key)
 
 
 @app.post("/browser/scroll")
 async def browser_scroll(direction: str = Query(...), token: str = Query(None)):
     """Scroll the page (up, down, pageUp, pageDown)"""
     _check_token(token)
+    return await _browser_action("scroll", "Scroll", direction=direction)
+
+
+# Input events a single WebSocket client may have queued before we stop reading
+WS_MAX_PENDING_INPUTS = 256
+
+
+async def _ws_dispatch(msg: dict) -> dict:
+    """Execute one input event from the WebSocket channel; returns extra ack fields"""
+    kind = msg.get("type")
+    # Settling happens once per burst, when the queue drains
+    if kind == "click":
+        return await browser.call("click", x=int(msg["x"]), y=int(msg["y"]), settle=False)
+    elif kind == "type":
+        return await browser.call("type", text=str(msg["text"]))
+    elif kind == "key":
+        return await browser.call("key", key=str(msg["key"]), settle=False)
+    elif kind == "scroll":
+        await browser.call("scroll", direction=str(msg["direction"]), settle=False)
+        return {}
+    elif kind == "navigate":
+        return await browser.call("navigate", url=str(msg["url"]), wait_until="domcontentloaded")
+    raise ValueError(f"Unknown input type: {kind}")
+
+
+@app.websocket("/browser/ws")
+async def browser_ws(websocket: WebSocket, token: str = Query(None)):
+    """
+    Persistent input channel for the remote browser.
+
+    The client streams JSON events ({"id", "type": click|type|key|scroll|navigate, ...})
+    without waiting for replies. Events are executed strictly in order and each one is
+    acknowledged with {"ack": id, "ok": bool, ...}. When the queue drains the server
+    sends {"idle": true} so the client refreshes its screenshot once per burst.
+    """
+    if settings.app_secret_token and token != settings.app_secret_token:
+        await websocket.close(code=1008)
+        return
+    await websocket.accept()
+
+    queue: asyncio.Queue = asyncio.Queue(maxsize=WS_MAX_PENDING_INPUTS)
+
+    async def _executor():
+        while True:
+            msg = await queue.get()
+            ack = {"ack": msg.get("id")}
+            try:
+                ack.update(await _ws_dispatch(msg))
+                ack["ok"] = True
+            except SchedulerBusy as e:
+                ack.update({"ok": False, "error": str(e), "retry_after": e.retry_after})
+            except Exception as e:
+                logger.warning(f"WebSocket input error ({msg.get('type')}): {e}")
+                ack.update({"ok": False, "error": str(e)})
+            await websocket.send_json(ack)
+            if queue.empty():
+                # Let the page react to the burst before telling the client to re-screenshot
+                try:
+                    settled = await browser.call("settle")
+                except Exception as e:
+                    await websocket.send_json({"ok": False, "error": f"Browser unavailable: {e}"})
+                    continue
+                if queue.empty():
+                    await websocket.send_json({"idle": True, "url": settled["url"]})
+
+    executor = asyncio.create_task(_executor(), name="browser-ws-input")
     try:
-        page = await get_browser_page()
-        
-        # Get viewport height from JavaScript (more reliable)
-        viewport_height = await page.evaluate("window.innerHeight")
-        if not viewport_height or viewport_height == 0:
-            viewport_height = 600  # Fallback
-        
-        if direction == "up":
-            # Scroll up by 300 pixels
-            await page.evaluate("window.scrollBy(0, -300)")
-        elif direction == "down":
-            # Scroll down by 300 pixels
-            await page.evaluate("window.scrollBy(0, 300)")
-        elif direction == "pageUp":
-            # Scroll up by viewport height
-            await page.evaluate(f"window.scrollBy(0, -{viewport_height})")
-        elif direction == "pageDown":
-            # Scroll down by viewport height
-            await page.evaluate(f"window.scrollBy(0, {viewport_height})")
-        else:
-            return JSONResponse({"success": False, "error": f"Invalid direction: {direction}. Use 'up', 'down', 'pageUp', or 'pageDown'"}, status_code=400)
-        
-        await page.wait_for_timeout(200)  # Wait for scroll animation
-        return JSONResponse({"success": True, "direction": direction})
+        while True:
+            msg = await websocket.receive_json()
+            if not isinstance(msg, dict):
+                continue
+            # Blocks reading further input (backpressure) if the client floods us
+            await queue.put(msg)
+    except WebSocketDisconnect:
+        pass
     except Exception as e:
-        logger.error(f"Scroll error: {e}", exc_info=True)
-        return JSONResponse({"success": False, "error": str(e)}, status_code=500)
+        logger.error(f"WebSocket channel error: {e}", exc_info=True)
+    finally:
+        executor.cancel()
+        try:
+            await executor
+        except (asyncio.CancelledError, Exception):
+            pass
 
 
 @app.post("/browser/thread")
 async def browser_thread(token: str = Query(None)):
     """Navigate to the configured DM thread"""
     _check_token(token)
-    try:
-        page = await get_browser_page()
-        await page.goto(settings.ig_thread_url, wait_until="networkidle")
-        return JSONResponse({"success": True, "url": page.url})
-    except Exception as e:
-        logger.error(f"Thread navigation error: {e}", exc_info=True)
-        return JSONResponse({"success": False, "error": str(e)}, status_code=500)
+    return await _browser_action("open_thread", "Thread navigation")
 
 
 @app.get("/dashboard")
@@ -639,6 +762,7 @@ async def dashboard(token: str = Query(None)):
                 <button class="danger" onclick="stopMonitor()">⏸ Stop Monitor</button>
                 <button class="secondary" onclick="refreshStatus()">🔄 Refresh Status</button>
                 <button class="secondary" onclick="testSms()">📲 Send Test SMS</button>
+                <button class="secondary" onclick="pruneProfile()">🧹 Prune Browser Caches</button>
             </div>
             <div class="hint">
                 Use <a href="#" onclick="openBrowser(); return false;">Remote Browser</a> to log into Instagram before starting the monitor.
@@ -649,6 +773,11 @@ async def dashboard(token: str = Query(None)):
             <h3 style="margin-bottom: 8px;">Current Status</h3>
             <div id="statusBox" class="status-box">Loading...</div>
         </div>
+
+        <div class="section">
+            <h3 style="margin-bottom: 8px;">Disk Usage <a href="#" onclick="loadDisk(true); return false;" style="font-size: 12px;">refresh</a></h3>
+            <div id="diskBox" class="status-box">Loading...</div>
+        </div>
     </div>
 
     <script>
@@ -681,6 +810,42 @@ async def dashboard(token: str = Query(None)):
             return { ok: resp.ok, status: resp.status, rawText: text, data };
         }
 
+        // Latest known status, kept current by the /dashboard/events stream
+        let current = {};
+        let lastEvent = '';
+
+        function renderStatus() {
+            const d = current;
+            setBadge(!!d.running);
+            const lines = [
+                `running: ${d.running}`,
+                `logged_in: ${d.logged_in === undefined ? 'Unknown' : d.logged_in}`,
+                `last_seen_id: ${d.last_seen_id || 'None'}`,
+                `last_login_ts: ${d.last_login_ts || 'None'}`,
+                `thread_url: ${d.thread_url || 'Unknown'}`,
+                `last_poll: ${d.last_poll || 'None'}`,
+            ];
+            if (d.last_error) lines.push(`last_error: [${d.last_error.ts}] ${d.last_error.error}`);
+            if (d.sms && d.sms.notifications) {
+                lines.push(`sms: ${d.sms.notifications} sent, ${d.sms.segments} segments ` +
+                    `(${d.sms.segments_per_notification}/notification, ${d.sms.ucs2} UCS-2, ${d.sms.truncated} truncated)`);
+            }
+            if (d.extraction) {
+                const c = d.extraction.candidates[d.extraction.strategy] || {};
+                lines.push(`extraction: ${d.extraction.strategy} (${c.latency_ms === null ? '?' : c.latency_ms} ms, ` +
+                    `hit rate ${c.hit_rate === null ? '?' : Math.round(c.hit_rate * 100) + '%'})`);
+            }
+            if (d.latency && d.latency.intervals.end_to_end.count) {
+                const fmt = (i) => `p50 ${i.p50}s / p95 ${i.p95}s / p99 ${i.p99}s`;
+                const i = d.latency.intervals;
+                lines.push(`latency (last ${i.end_to_end.count} SMS): ${fmt(i.end_to_end)}` +
+                    (d.latency.slo_breached ? `  SLO BREACHED (> ${d.latency.slo_seconds}s)` : ''));
+                lines.push(`  detect ${fmt(i.detect)}, commit p95 ${i.commit.p95}s, sms p95 ${i.sms.p95}s`);
+            }
+            if (lastEvent) lines.push('', lastEvent);
+            setStatus(lines.join('\\n'));
+        }
+
         async function refreshStatus() {
             setStatus('Loading status...');
             try {
@@ -690,21 +855,81 @@ async def dashboard(token: str = Query(None)):
                     setBadge(false);
                     return;
                 }
-                const d = r.data || {};
-                setBadge(!!d.running);
-                const lines = [
-                    `running: ${d.running}`,
-                    `last_seen_id: ${d.last_seen_id || 'None'}`,
-                    `last_login_ts: ${d.last_login_ts || 'None'}`,
-                    `thread_url: ${d.thread_url || 'Unknown'}`,
-                ];
-                setStatus(lines.join('\\n'));
+                current = Object.assign(current, r.data || {});
+                renderStatus();
             } catch (e) {
                 setStatus(`Error loading status: ${e.message}`);
                 setBadge(false);
             }
         }
 
+        function formatMB(bytes) {
+            return `${(bytes / 1048576).toFixed(1)} MB`;
+        }
+
+        async function loadDisk(refresh) {
+            const r = await callEndpoint(refresh ? '/dashboard/disk?refresh=1' : '/dashboard/disk', 'GET');
+            const box = document.getElementById('diskBox');
+            if (!r.ok) {
+                box.textContent = `Error ${r.status}: ${r.rawText}`;
+                return;
+            }
+            const d = r.data || {};
+            const lines = [
+                `total: ${formatMB(d.total)}  (profile ${formatMB(d.profile_total)}, prunable ${formatMB(d.prunable)})`,
+                '',
+            ];
+            for (const [name, size] of Object.entries(d.profile || {}).slice(0, 12)) {
+                lines.push(`${formatMB(size).padStart(10)}  user_data_dir/${name}`);
+            }
+            for (const [name, size] of Object.entries(d.data_dir || {})) {
+                lines.push(`${formatMB(size).padStart(10)}  ${name}`);
+            }
+            box.textContent = lines.join('\\n');
+        }
+
+        async function pruneProfile() {
+            setStatus('Pruning browser caches...');
+            const r = await callEndpoint('/dashboard/disk/prune', 'POST');
+            setStatus(r.ok ? (r.data || {}).message : `Prune failed (${r.status}): ${r.rawText}`);
+        }
+
+        function connectEvents() {
+            const source = new EventSource(`/dashboard/events?token=${encodeURIComponent(token)}`);
+            source.addEventListener('snapshot', (e) => {
+                current = Object.assign(current, JSON.parse(e.data));
+                renderStatus();
+            });
+            source.addEventListener('state', (e) => {
+                current = Object.assign(current, JSON.parse(e.data).data);
+                renderStatus();
+            });
+            source.addEventListener('login', (e) => {
+                const ev = JSON.parse(e.data);
+                current.logged_in = ev.data.logged_in;
+                lastEvent = `[${ev.ts}] login: ${ev.data.logged_in}`;
+                renderStatus();
+            });
+            source.addEventListener('disk', () => loadDisk(false));
+            source.addEventListener('poll', (e) => {
+                current.last_poll = JSON.parse(e.data).ts;
+                renderStatus();
+            });
+            source.addEventListener('message', (e) => {
+                const ev = JSON.parse(e.data);
+                lastEvent = `[${ev.ts}] new message: ${ev.data.text}`;
+                renderStatus();
+            });
+            source.addEventListener('error', (e) => {
+                // Named 'error' events carry data; connection errors don't (EventSource reconnects itself)
+                if (!e.data) return;
+                const ev = JSON.parse(e.data);
+                current.last_error = { error: ev.data.error, ts: ev.ts };
+                lastEvent = `[${ev.ts}] error: ${ev.data.error}`;
+                renderStatus();
+            });
+        }
+
         async function startMonitor() {
             setStatus('Starting monitor...');
             try {
@@ -757,8 +982,9 @@ async def dashboard(token: str = Query(None)):
             }
         }
 
-        // Initial load
-        refreshStatus();
+        // Initial load; afterwards the event stream pushes every change
+        connectEvents();
+        loadDisk(false);
     </script>
 </body>
 </html>
@@ -766,28 +992,171 @@ async def dashboard(token: str = Query(None)):
 
 
 @app.get("/dashboard/status")
-async def dashboard_status(token: str = Query(None)):
+async def dashboard_status(token: str = Query(None), refresh: bool = Query(False)):
     """
-    Return JSON with monitor state and some basic metadata.
+    Return JSON with monitor state and some basic metadata, from the in-memory
+    status snapshot (refresh=1 re-reads the persisted values first).
     """
     _check_token(token)
     try:
-        running = is_monitor_running()
-        last_seen_id = await get_last_seen_id()
-        last_login_ts = await get_last_login_ts()
-        return JSONResponse(
-            {
-                "running": running,
-                "last_seen_id": last_seen_id,
-                "last_login_ts": last_login_ts,
-                "thread_url": settings.ig_thread_url,
-            }
-        )
+        return JSONResponse(await _dashboard_status_payload(refresh))
     except Exception as e:
         logger.error(f"Dashboard status error: {e}", exc_info=True)
         raise HTTPException(status_code=500, detail=str(e))
 
 
+async def _dashboard_status_payload(refresh: bool = False) -> dict:
+    if refresh:
+        events.update_status(**await browser.call("snapshot", refresh=True))
+    payload = {
+        "logged_in": None,
+        "url": None,
+        "last_seen_id": None,
+        "last_login_ts": None,
+        "last_message": None,
+        "last_poll": None,
+        "last_error": None,
+        "running": None,
+        "disk_total": None,
+        "profile_total": None,
+        "sms": None,
+        "extraction": None,
+        "latency": None,
+        **events.status_snapshot(),
+    }
+    payload["thread_url"] = str(settings.ig_thread_url)
+    return payload
+
+
+@app.get("/dashboard/profile")
+async def dashboard_profile(
+    token: str = Query(None),
+    seconds: float = Query(10, gt=0),
+    format: str = Query("svg"),
+    process: str = Query("browser"),
+):
+    """
+    Sample the Python stacks of a process for `seconds` (capped at sampler.MAX_SECONDS)
+    and return a flamegraph (format=svg) or collapsed stacks (format=collapsed).
+    process=browser profiles whichever process runs the browser and monitor loop
+    (this one with BROWSER_WORKER=inline); process=web profiles this web worker.
+    """
+    _check_token(token)
+    if format not in ("svg", "collapsed"):
+        raise HTTPException(status_code=400, detail="format must be 'svg' or 'collapsed'")
+    if process not in ("browser", "web"):
+        raise HTTPException(status_code=400, detail="process must be 'browser' or 'web'")
+    try:
+        if process == "web":
+            result = await sampler.profile(seconds)
+        else:
+            result = await browser.call("cpu_profile", seconds=seconds)
+    except sampler.ProfilerBusy as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    except Exception as e:
+        logger.error(f"CPU profile error: {e}", exc_info=True)
+        raise HTTPException(status_code=500, detail=str(e))
+    logger.info(
+        f"CPU profile of pid {result['pid']}: {result['samples']} samples "
+        f"({result['idle']} idle) over {result['seconds']}s"
+    )
+    if format == "collapsed":
+        return PlainTextResponse(sampler.collapsed(result["stacks"]))
+    title = f"pid {result['pid']}, {result['seconds']}s, {result['idle']} of {result['samples']} samples idle"
+    return Response(content=sampler.render_svg(result["stacks"], title), media_type="image/svg+xml")
+
+
+@app.get("/dashboard/heap")
+async def dashboard_heap(
+    token: str = Query(None),
+    top: int = Query(20, ge=1, le=200),
+    process: str = Query("browser"),
+):
+    """
+    Memory report: tracemalloc's top growing allocation sites since the previous
+    call and since tracing started (the first call starts it), growth by origin
+    (ig_monitor / playwright / other), and the page's JS heap, DOM node and
+    listener counts over CDP. process=browser reports on the process that runs
+    the browser; process=web on this web worker (no page figures).
+    """
+    _check_token(token)
+    if process not in ("browser", "web"):
+        raise HTTPException(status_code=400, detail="process must be 'browser' or 'web'")
+    try:
+        if process == "web":
+            return JSONResponse(await heap.report(None, top))
+        return JSONResponse(await browser.call("heap", limit=top))
+    except Exception as e:
+        logger.error(f"Heap report error: {e}", exc_info=True)
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@app.post("/dashboard/heap/stop")
+async def dashboard_heap_stop(token: str = Query(None), process: str = Query("browser")):
+    """Stop tracemalloc (it costs memory and CPU while on) and drop its snapshots"""
+    _check_token(token)
+    if process not in ("browser", "web"):
+        raise HTTPException(status_code=400, detail="process must be 'browser' or 'web'")
+    if process == "web":
+        return JSONResponse({"stopped": heap.stop_tracing()})
+    return JSONResponse(await browser.call("heap_stop"))
+
+
+@app.get("/dashboard/disk")
+async def dashboard_disk(token: str = Query(None), refresh: bool = Query(False)):
+    """
+    Disk usage under DATA_DIR with the browser profile broken down per subdirectory.
+    Served from the last maintenance report unless refresh=1.
+    """
+    _check_token(token)
+    return JSONResponse(await browser.call("disk", refresh=refresh))
+
+
+@app.post("/dashboard/disk/prune")
+async def dashboard_disk_prune(token: str = Query(None)):
+    """
+    Prune browser profile caches now (or at the monitor's next idle point if it is running).
+    """
+    _check_token(token)
+    try:
+        result = (await browser.call("prune"))["result"]
+        return JSONResponse({"ok": True, "message": f"Profile prune {result}"})
+    except Exception as e:
+        logger.error(f"Profile prune error: {e}", exc_info=True)
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+# Comment line sent on idle SSE streams so proxies don't close the connection
+SSE_KEEPALIVE_SECONDS = 25
+
+
+@app.get("/dashboard/events")
+async def dashboard_events(token: str = Query(None)):
+    """
+    Server-Sent Events stream of monitor events (state, message, error, login, lease).
+    Sends one 'snapshot' event on connect, then only pushes when something changes.
+    """
+    _check_token(token)
+    snapshot = await _dashboard_status_payload()
+
+    async def _stream():
+        with events.subscribe() as queue:
+            yield f"event: snapshot\ndata: {json.dumps(snapshot)}\n\n"
+            while True:
+                try:
+                    event = await asyncio.wait_for(queue.get(), timeout=SSE_KEEPALIVE_SECONDS)
+                except asyncio.TimeoutError:
+                    yield ": keepalive\n\n"
+                    continue
+                yield f"event: {event['type']}\ndata: {json.dumps(event)}\n\n"
+
+    return StreamingResponse(
+        _stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
 @app.post("/dashboard/start")
 async def dashboard_start(token: str = Query(None)):
     """
@@ -795,7 +1164,7 @@ async def dashboard_start(token: str = Query(None)):
     """
     _check_token(token)
     try:
-        status = await start_monitor()
+        status = (await browser.call("start"))["status"]
         return JSONResponse({"ok": True, "message": f"Monitor {status}"})
     except Exception as e:
         logger.error(f"Dashboard start error: {e}", exc_info=True)
@@ -809,7 +1178,7 @@ async def dashboard_stop(token: str = Query(None)):
     """
     _check_token(token)
     try:
-        status = await stop_monitor()
+        status = (await browser.call("stop"))["status"]
         return JSONResponse({"ok": True, "message": f"Monitor {status}"})
     except Exception as e:
         logger.error(f"Dashboard stop error: {e}", exc_info=True)
@@ -825,7 +1194,8 @@ async def dashboard_test_sms(token: str = Query(None)):
     try:
         if not settings.owner_phone:
             raise HTTPException(status_code=400, detail="OWNER_PHONE is not configured")
-        send_sms(settings.owner_phone, "IG-SMS: test notification via AWS SNS dashboard.")
+        # SNS calls block; keep them off the event loop
+        await asyncio.to_thread(send_sms, settings.owner_phone, "IG-SMS: test notification via AWS SNS dashboard.")
         return JSONResponse({"ok": True, "message": f"Test SMS sent to {settings.owner_phone}"})
     except HTTPException:
         raise
@@ -15,17 +15,91 @@ class Settings(BaseSettings):
     # Instagram thread to monitor
     ig_thread_url: AnyUrl = Field(..., alias="IG_THREAD_URL")
 
+    # "thread" polls IG_THREAD_URL; "inbox" watches every conversation from the DM inbox list
+    monitor_mode: str = Field("thread", alias="MONITOR_MODE")
+    ig_inbox_url: str = Field("https://www.instagram.com/direct/inbox/", alias="IG_INBOX_URL")
+
+    # "browser" polls through Playwright; "http" polls IG's JSON endpoints with the
+    # saved session cookies and only opens the browser when the session needs a human
+    monitor_backend: str = Field("browser", alias="MONITOR_BACKEND")
+    ig_api_base_url: str = Field("https://www.instagram.com", alias="IG_API_BASE_URL")
+
+    # Notification rules (JSON; default DATA_DIR/rules.json, see ig_monitor.rules), how
+    # often low-priority messages are texted as one digest (0 = never text them) and
+    # the digest's own segment cap (0 = no cap)
+    rules_path: Optional[str] = Field(None, alias="RULES_PATH")
+    low_priority_digest_minutes: int = Field(60, alias="LOW_PRIORITY_DIGEST_MINUTES")
+    digest_max_segments: int = Field(6, alias="DIGEST_MAX_SEGMENTS")
+
+    # SMS size: cap per notification in billable segments (0 = no cap), and whether to
+    # transliterate to GSM-7: "auto" (when it saves segments), "always" or "never"
+    sms_max_segments: int = Field(2, alias="SMS_MAX_SEGMENTS")
+    sms_transliterate: str = Field("auto", alias="SMS_TRANSLITERATE")
+
     # Polling interval (seconds)
     poll_seconds: int = Field(90, alias="POLL_SECONDS")
 
+    # Notification latency: recent SMS the percentiles are computed over, and the
+    # p95 message-to-SMS time (seconds) above which an alert is raised (0 = no alert)
+    latency_window: int = Field(200, alias="LATENCY_WINDOW")
+    latency_slo_seconds: int = Field(300, alias="LATENCY_SLO_SECONDS")
+
     # Optional app secret for admin / browser endpoints
     app_secret_token: Optional[str] = Field(None, alias="APP_SECRET_TOKEN")
 
+    # Deadline for a single page operation, and heartbeat age after which the
+    # watchdog restarts the loop (default: derived from POLL_SECONDS)
+    page_op_timeout_seconds: int = Field(20, alias="PAGE_OP_TIMEOUT_SECONDS")
+    watchdog_stale_seconds: Optional[int] = Field(None, alias="WATCHDOG_STALE_SECONDS")
+
+    # Page settle detection: quiet window with no DOM mutations / requests, and hard cap (ms)
+    settle_quiet_ms: int = Field(300, alias="SETTLE_QUIET_MS")
+    settle_max_ms: int = Field(5000, alias="SETTLE_MAX_MS")
+
     # Paths for persistent data (mounted volume on Render)
     data_dir: str = Field("/data", alias="DATA_DIR")
     user_data_dir_name: str = Field("user_data_dir", alias="USER_DATA_DIR_NAME")
     state_db_name: str = Field("state.db", alias="STATE_DB_NAME")
 
+    # Record a sanitized, gzipped snapshot of the thread DOM whenever it changes
+    # (for offline replay against the extractor); default dir DATA_DIR/snapshots
+    snapshot_recording: bool = Field(False, alias="SNAPSHOT_RECORDING")
+    snapshot_dir: Optional[str] = Field(None, alias="SNAPSHOT_DIR")
+    snapshot_budget_mb: int = Field(50, alias="SNAPSHOT_BUDGET_MB")
+
+    # inline: the web app owns the browser and monitor loop. process: they run in
+    # a separate worker process (python -m ig_monitor.worker) that web workers
+    # talk to over a Unix socket, so uvicorn can run with --workers > 1
+    browser_worker: str = Field("inline", alias="BROWSER_WORKER")
+    worker_socket: Optional[str] = Field(None, alias="WORKER_SOCKET")
+
+    # Launch the browser in the background at startup instead of on first use
+    # (skipped with MONITOR_BACKEND=http, where the browser is only needed to log in)
+    browser_warmup: bool = Field(True, alias="BROWSER_WARMUP")
+
+    # chromium | chromium-headless-shell | chromium-new-headless | firefox | webkit (see ig_monitor.engines)
+    browser_engine: str = Field("chromium", alias="BROWSER_ENGINE")
+
+    # "profile" keeps a full Chromium user_data_dir; "storage_state" persists only
+    # cookies + localStorage and runs the monitor in an ephemeral context
+    session_mode: str = Field("profile", alias="SESSION_MODE")
+    storage_state_name: str = Field("storage_state.json", alias="STORAGE_STATE_NAME")
+
+    # Browser profile maintenance: prune cache dirs above this size or this often
+    profile_budget_mb: int = Field(500, alias="PROFILE_BUDGET_MB")
+    profile_prune_hours: int = Field(24, alias="PROFILE_PRUNE_HOURS")
+    profile_check_minutes: int = Field(30, alias="PROFILE_CHECK_MINUTES")
+
+    # Multi-node coordination: "file" (local lock file) or "sql" (shared database)
+    coordination_backend: str = Field("file", alias="COORDINATION_BACKEND")
+    # Path of the shared SQLite database used by the "sql" backend
+    coordination_db_path: Optional[str] = Field(None, alias="COORDINATION_DB_PATH")
+    # Identity of this instance; by default an id reserved under DATA_DIR/node-ids,
+    # reused after a restart
+    node_id: Optional[str] = Field(None, alias="NODE_ID")
+    # How long a thread lease / node heartbeat stays valid without renewal (seconds)
+    lease_ttl_seconds: int = Field(240, alias="LEASE_TTL_SECONDS")
+
     class Config:
         env_file = ".env"
         env_file_encoding = "utf-8"
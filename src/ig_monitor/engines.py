@@ -0,0 +1,168 @@
+from importlib import metadata
+from typing import Any, Dict, Optional
+
+from playwright.async_api import BrowserType, Playwright
+
+
+# Per-engine launch settings for the monitor browser. Deliberately independent
+# of application settings so benchmarks can import it without an .env.
+
+# "chromium": Playwright's default Chromium launch (the headless shell when
+#     headless on Playwright >= 1.49, old headless mode before that)
+# "chromium-headless-shell": Playwright's stripped-down headless build (no UI stack),
+#     asked for by channel so it stays the shell whatever Playwright's default is
+# "chromium-new-headless": full Chromium in new headless mode (Playwright >= 1.49)
+ENGINES = ("chromium", "chromium-headless-shell", "chromium-new-headless", "firefox", "webkit")
+
+# First Playwright release with the "chromium" and "chromium-headless-shell" channels
+CHANNELS_MIN_PLAYWRIGHT = (1, 49)
+
+# Use a more recent, realistic user agent
+CHROME_USER_AGENT = (
+    "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 "
+    "(KHTML, like Gecko) Chrome/131.0.0.0 Safari/537.36"
+)
+
+CHROMIUM_ARGS = [
+    "--disable-dev-shm-usage",
+    "--no-sandbox",  # Required for Docker, but might be detected
+    "--disable-gpu",
+    # Keep only essential flags - remove ones that scream "automation"
+    "--disable-background-networking",
+    "--disable-background-timer-throttling",
+    "--disable-backgrounding-occluded-windows",
+    "--disable-component-extensions-with-background-pages",
+    "--disable-default-apps",
+    "--disable-notifications",
+    "--no-first-run",
+    "--no-default-browser-check",
+    "--no-zygote",
+    # Remove automation detection
+    "--disable-blink-features=AutomationControlled",
+    "--exclude-switches=enable-automation",
+]
+
+FIREFOX_PREFS = {
+    # Hide navigator.webdriver at the source instead of patching it from JS
+    "dom.webdriver.enabled": False,
+    "useAutomationExtension": False,
+    # Memory: no back/forward cache of rendered pages, small in-memory cache
+    "browser.sessionhistory.max_total_viewers": 0,
+    "browser.cache.memory.capacity": 16384,
+    "media.autoplay.default": 5,
+    "dom.push.enabled": False,
+}
+
+# Add extra HTTP headers to look more legitimate
+EXTRA_HTTP_HEADERS = {
+    "Accept-Language": "en-US,en;q=0.9",
+    "Accept-Encoding": "gzip, deflate, br",
+    "Accept": "text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,*/*;q=0.8",
+    "Connection": "keep-alive",
+    "Upgrade-Insecure-Requests": "1",
+    "Sec-Fetch-Dest": "document",
+    "Sec-Fetch-Mode": "navigate",
+    "Sec-Fetch-Site": "none",
+    "Cache-Control": "max-age=0",
+}
+
+HIDE_WEBDRIVER_JS = """
+    // Remove webdriver property
+    Object.defineProperty(navigator, 'webdriver', {
+        get: () => undefined
+    });
+"""
+
+# Additional JavaScript to hide automation (stealth plugin handles most, but add extra)
+CHROMIUM_STEALTH_JS = HIDE_WEBDRIVER_JS + """
+    // Override permissions
+    const originalQuery = window.navigator.permissions.query;
+    window.navigator.permissions.query = (parameters) => (
+        parameters.name === 'notifications' ?
+            Promise.resolve({ state: Notification.permission }) :
+            originalQuery(parameters)
+    );
+
+    // Mock plugins
+    Object.defineProperty(navigator, 'plugins', {
+        get: () => [1, 2, 3, 4, 5]
+    });
+
+    // Mock languages
+    Object.defineProperty(navigator, 'languages', {
+        get: () => ['en-US', 'en']
+    });
+"""
+
+
+def _check(engine: str) -> None:
+    if engine not in ENGINES:
+        raise ValueError(f"Unknown BROWSER_ENGINE: {engine}. Use one of {', '.join(ENGINES)}")
+
+
+def _playwright_version() -> tuple:
+    try:
+        version = metadata.version("playwright")
+    except metadata.PackageNotFoundError:
+        return ()
+    return tuple(int(part) for part in version.split(".")[:2] if part.isdigit())
+
+
+def _require_channels(engine: str) -> None:
+    version = _playwright_version()
+    if version and version < CHANNELS_MIN_PLAYWRIGHT:
+        raise ValueError(
+            f"BROWSER_ENGINE={engine} needs Playwright >= "
+            f"{'.'.join(map(str, CHANNELS_MIN_PLAYWRIGHT))} (installed: {'.'.join(map(str, version))})"
+        )
+
+
+def browser_type(pw: Playwright, engine: str) -> BrowserType:
+    _check(engine)
+    if engine.startswith("chromium"):
+        return pw.chromium
+    return getattr(pw, engine)
+
+
+def launch_options(engine: str, headless: bool) -> Dict[str, Any]:
+    """Keyword arguments for launch() / launch_persistent_context()"""
+    _check(engine)
+    if engine == "chromium":
+        return {"headless": headless, "args": CHROMIUM_ARGS}
+    if engine == "chromium-new-headless":
+        _require_channels(engine)
+        options: Dict[str, Any] = {"headless": headless, "args": CHROMIUM_ARGS}
+        if headless:
+            # Opt out of the headless shell Playwright uses by default
+            options["channel"] = "chromium"
+        return options
+    if engine == "chromium-headless-shell":
+        _require_channels(engine)
+        # The shell has no headed mode
+        return {"headless": True, "channel": "chromium-headless-shell", "args": CHROMIUM_ARGS}
+    if engine == "firefox":
+        return {"headless": headless, "firefox_user_prefs": FIREFOX_PREFS}
+    return {"headless": headless}
+
+
+def context_options(engine: str) -> Dict[str, Any]:
+    """Keyword arguments for new_context() / launch_persistent_context()"""
+    _check(engine)
+    options: Dict[str, Any] = {
+        "viewport": {"width": 1366, "height": 768},  # More common viewport size
+        "extra_http_headers": EXTRA_HTTP_HEADERS,
+    }
+    if engine.startswith("chromium"):
+        # A Chrome UA on Firefox/WebKit would contradict every other fingerprint
+        options["user_agent"] = CHROME_USER_AGENT
+    return options
+
+
+def stealth_script(engine: str) -> Optional[str]:
+    _check(engine)
+    if engine.startswith("chromium"):
+        return CHROMIUM_STEALTH_JS
+    if engine == "webkit":
+        return HIDE_WEBDRIVER_JS
+    # Firefox hides webdriver through FIREFOX_PREFS
+    return None
@@ -0,0 +1,108 @@
+import asyncio
+import logging
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from typing import Any, Dict, Iterator, Optional, Set
+
+
+logger = logging.getLogger(__name__)
+
+# Per-subscriber queue bound; a viewer that stops reading loses its oldest events
+# rather than growing memory without limit.
+MAX_QUEUED_EVENTS = 100
+
+_subscribers: Set["asyncio.Queue[Dict[str, Any]]"] = set()
+
+# Latest value of everything the events have reported (login state, page URL,
+# last message/poll/error...), so status endpoints never touch the DB or the page
+_status: Dict[str, Any] = {}
+
+# Loop the subscribers live on; publish from another thread hands over to it
+_loop: Optional[asyncio.AbstractEventLoop] = None
+
+
+def _fold(event: Dict[str, Any]) -> None:
+    data = event["data"]
+    if event["type"] == "state":
+        _status.update(data)
+    elif event["type"] == "login":
+        _status["logged_in"] = data["logged_in"]
+    elif event["type"] == "message":
+        _status["last_message"] = dict(data, ts=event["ts"])
+    elif event["type"] == "error":
+        _status["last_error"] = {"error": data.get("error"), "ts": event["ts"]}
+    elif event["type"] == "disk":
+        _status["disk_total"] = data["total"]
+        _status["profile_total"] = data["profile_total"]
+    elif event["type"] == "poll":
+        _status["last_poll"] = event["ts"]
+        if data.get("url"):
+            _status["url"] = data["url"]
+
+
+def update_status(**fields: Any) -> None:
+    """Set snapshot fields without notifying subscribers (e.g. values loaded at startup)"""
+    _status.update(fields)
+
+
+def status_snapshot() -> Dict[str, Any]:
+    return dict(_status)
+
+
+def _remember_loop() -> None:
+    global _loop
+    try:
+        _loop = asyncio.get_running_loop()
+    except RuntimeError:
+        pass
+
+
+def publish(event_type: str, **data: Any) -> None:
+    """
+    Fan an event out to every connected subscriber (e.g. dashboard SSE streams).
+    Never blocks the caller. Safe from other threads (e.g. code run with
+    asyncio.to_thread): the event is then handed to the event loop thread.
+    """
+    event = {
+        "type": event_type,
+        "ts": datetime.now(timezone.utc).isoformat(),
+        "data": data,
+    }
+    try:
+        running = asyncio.get_running_loop()
+    except RuntimeError:
+        running = None
+    if running is None and _loop is not None and _loop.is_running():
+        _loop.call_soon_threadsafe(forward, event)
+    else:
+        forward(event)
+
+
+def forward(event: Dict[str, Any]) -> None:
+    """Publish an event that was created elsewhere (e.g. in the browser worker process) as is"""
+    _remember_loop()
+    _fold(event)
+    for queue in list(_subscribers):
+        if queue.full():
+            try:
+                queue.get_nowait()
+            except asyncio.QueueEmpty:
+                pass
+        queue.put_nowait(event)
+
+
+@contextmanager
+def subscribe() -> Iterator["asyncio.Queue[Dict[str, Any]]"]:
+    """Register a subscriber queue for the duration of the with-block."""
+    _remember_loop()
+    queue: "asyncio.Queue[Dict[str, Any]]" = asyncio.Queue(maxsize=MAX_QUEUED_EVENTS)
+    _subscribers.add(queue)
+    logger.debug(f"Event subscriber added ({len(_subscribers)} total)")
+    try:
+        yield queue
+    finally:
+        _subscribers.discard(queue)
+
+
+def subscriber_count() -> int:
+    return len(_subscribers)
@@ -0,0 +1,351 @@
+import hashlib
+import json
+import logging
+import re
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional
+
+from playwright.async_api import Page, Response
+
+from ig_monitor.latency import parse_ig_timestamp
+
+
+logger = logging.getLogger(__name__)
+
+# Number of trailing message rows read per poll
+TAIL_ROWS = 10
+# How far back we may extend the tail so it starts at a timestamp separator
+MAX_GROUP_EXTENSION = 50
+# Message ids remembered per page from network payloads
+MAX_NETWORK_ITEMS = 200
+
+# Reads the trailing message rows of the open thread with everything IG exposes
+# about their identity: ids in DOM attributes or React props, the nearest
+# timestamp, the sender and the row position. The tail is extended backwards to
+# the previous timestamp separator so "n-th identical message in this time
+# group" stays stable while new messages are appended, and the message before
+# that separator comes first as a "context" row (for its group's id only).
+#
+# Extraction is incremental: the last row read is kept as an anchor (in a page
+# global, with a WeakSet of the rows already read) and the next call only walks
+# the DOM after it, re-reading the small window of rows it keeps. If the anchor
+# was re-rendered away, the thread changed or the order no longer adds up, the
+# window is rebuilt by walking backwards from the end of the pane, which stops
+# after enough rows instead of matching every row of the loaded history.
+MESSAGES_JS = """
+([limit, maxExtension, incremental = true, container = "[role='main']", rowSelectors = null]) => {
+    const main = document.querySelector(container);
+    if (!main) return [];
+    rowSelectors = rowSelectors || ["[role='row']", "[data-message-id], [id^='mid.']"];
+    // One more row than the window can use, for the context row
+    const keep = limit + maxExtension + 1;
+    // One anchor per container/row selector combination, so strategies don't reset each other
+    const key = container + '|' + rowSelectors.join('|');
+    const anchors = (window.__igmExtract = window.__igmExtract || {});
+    const stats = (window.__igmExtractStats = window.__igmExtractStats || { incremental: 0, rescans: 0 });
+
+    // Rows in document order after `anchor`, touching only the nodes that follow it
+    const rowsAfter = (anchor, selector) => {
+        const found = [];
+        for (let node = anchor; node && node !== main; node = node.parentElement) {
+            for (let next = node.nextElementSibling; next; next = next.nextElementSibling) {
+                if (next.matches(selector)) found.push(next);
+                else for (const row of next.querySelectorAll(selector)) found.push(row);
+            }
+        }
+        return found;
+    };
+    // The last `count` rows, walking backwards from the end of the pane
+    const lastRows = (selector, count) => {
+        const walker = document.createTreeWalker(main, NodeFilter.SHOW_ELEMENT);
+        let node = main;
+        while (node.lastElementChild) node = node.lastElementChild;
+        walker.currentNode = node;
+        const found = [];
+        for (; node && node !== main && found.length < count; node = walker.previousNode()) {
+            if (node.matches(selector)) found.push(node);
+        }
+        return found.reverse();
+    };
+
+    let state = anchors[key];
+    let rows = null;
+    if (incremental && state && state.main === main && state.path === location.pathname &&
+            state.rows.length && state.rows.every(r => r.isConnected)) {
+        const added = rowsAfter(state.rows[state.rows.length - 1], state.selector);
+        // Rows already read showing up after the anchor means the list was re-ordered
+        if (!added.some(r => state.read.has(r))) {
+            rows = state.rows.concat(added);
+            state.total += added.length;
+            stats.incremental++;
+        }
+    }
+    if (!rows) {
+        const selector = rowSelectors.find(s => main.querySelector(s));
+        if (!selector) return [];
+        rows = lastRows(selector, keep);
+        // Positions are only comparable within one scan; start counting again
+        state = anchors[key] = { main: main, path: location.pathname, selector: selector, rows: [], read: new WeakSet(), total: rows.length };
+        stats.rescans++;
+    }
+    if (rows.length > keep) rows = rows.slice(rows.length - keep);
+    for (const row of rows) state.read.add(row);
+    state.rows = rows;
+    const offset = state.total - rows.length;
+
+    const idFromProps = (el) => {
+        for (const name of Object.keys(el)) {
+            if (!name.startsWith('__reactFiber$') && !name.startsWith('__reactProps$')) continue;
+            let node = el[name];
+            for (let depth = 0; node && depth < 6; depth++) {
+                const props = node.memoizedProps || node;
+                const msg = props && (props.message || props.item || props);
+                const id = msg && (msg.messageId || msg.message_id || msg.item_id || msg.offlineThreadingId);
+                if (id && typeof id !== 'object') return String(id);
+                node = node.return;
+            }
+        }
+        return null;
+    };
+    const domId = (row) => {
+        for (const el of [row, ...row.querySelectorAll('[data-message-id], [id^="mid."], [data-item-id]')].slice(0, 8)) {
+            const id = el.getAttribute('data-message-id') || el.getAttribute('data-item-id') ||
+                ((el.id || '').startsWith('mid.') ? el.id : null);
+            if (id) return id;
+        }
+        return idFromProps(row);
+    };
+    const timeOf = (row) => {
+        const t = row.querySelector('time[datetime], time, abbr[aria-label]');
+        return t ? (t.getAttribute('datetime') || t.getAttribute('aria-label') || t.textContent.trim()) : null;
+    };
+    const senderOf = (row) => {
+        const label = row.getAttribute('aria-label');
+        if (label) return label.split(',')[0].trim();
+        const img = row.querySelector('img[alt]');
+        return img ? img.getAttribute('alt').replace(/'s profile picture$/, '') : null;
+    };
+    const textOf = (row) => {
+        const parts = Array.from(row.querySelectorAll("[dir='auto']")).map(el => el.innerText.trim()).filter(Boolean);
+        return (parts.length ? parts.join('\\n') : row.innerText || '').trim();
+    };
+
+    let start = Math.max(0, rows.length - limit);
+    const floor = Math.max(0, start - maxExtension);
+    while (start > floor && !timeOf(rows[start])) start--;
+
+    const out = [];
+    for (let i = start - 1; i >= 0; i--) {
+        const text = textOf(rows[i]);
+        if (!text) continue;
+        out.push({ text: text, sender: senderOf(rows[i]), context: true });
+        break;
+    }
+    let group = null;
+    for (let i = start; i < rows.length; i++) {
+        const row = rows[i];
+        const ts = timeOf(row);
+        if (ts) group = ts;
+        const text = textOf(row);
+        if (!text) continue;
+        out.push({ text: text, dom_id: domId(row), timestamp: group, sender: senderOf(row), index: offset + i });
+    }
+    return out;
+}
+"""
+
+
+# Fallback for layouts without message rows: the text of the last multi-line
+# element in the pane (the old "div:has-text('\\n')" heuristic), found by walking
+# backwards from the end and giving up after maxNodes elements
+LAST_BUBBLE_JS = """
+(maxNodes) => {
+    const main = document.querySelector("[role='main']");
+    if (!main) return null;
+    const walker = document.createTreeWalker(main, NodeFilter.SHOW_ELEMENT);
+    let node = main;
+    while (node.lastElementChild) node = node.lastElementChild;
+    walker.currentNode = node;
+    for (let seen = 0; node && node !== main && seen < maxNodes; node = walker.previousNode(), seen++) {
+        if (node.tagName !== 'DIV' || !node.textContent.includes('\\n')) continue;
+        const text = (node.innerText || '').trim();
+        if (text) return text;
+    }
+    return null;
+}
+"""
+# Elements LAST_BUBBLE_JS may visit
+LAST_BUBBLE_MAX_NODES = 2000
+
+
+class _PayloadWatcher:
+    """Remembers message ids seen in IG's JSON responses, keyed by message text."""
+
+    def __init__(self, page: Page):
+        self.items: "OrderedDict[str, List[Dict[str, Any]]]" = OrderedDict()
+        page.on("response", self._on_response)
+
+    async def _on_response(self, response: Response) -> None:
+        if "/direct_v2/" not in response.url:
+            return
+        try:
+            if "json" not in (response.headers.get("content-type") or ""):
+                return
+            payload = await response.json()
+        except Exception:
+            return
+        for item in _iter_items(payload):
+            text = item.get("text")
+            if not isinstance(text, str):
+                continue
+            entries = self.items.setdefault(text.strip(), [])
+            if all(e["item_id"] != item["item_id"] for e in entries):
+                entries.append({"item_id": str(item["item_id"]), "timestamp": item.get("timestamp"), "user_id": item.get("user_id")})
+                entries.sort(key=lambda e: int(e["timestamp"] or 0))
+            self.items.move_to_end(text.strip())
+        while len(self.items) > MAX_NETWORK_ITEMS:
+            self.items.popitem(last=False)
+
+
+def _iter_items(node: Any):
+    """Yield every dict in a payload that looks like a direct message item"""
+    stack = [node]
+    while stack:
+        current = stack.pop()
+        if isinstance(current, dict):
+            if "item_id" in current and "timestamp" in current:
+                yield current
+            stack.extend(current.values())
+        elif isinstance(current, list):
+            stack.extend(current)
+
+
+_watchers: Dict[int, _PayloadWatcher] = {}
+
+
+def watch_message_payloads(page: Page) -> None:
+    """Start collecting message ids from network responses; call right after creating the page"""
+    if id(page) not in _watchers:
+        _watchers[id(page)] = _PayloadWatcher(page)
+        page.on("close", lambda _: _watchers.pop(id(page), None))
+
+
+# Time of day in a page label ("Today 3:45 PM", "Mon 15:45"); the day part is relative
+_CLOCK_TIME = re.compile(r"\b(\d{1,2}:\d{2})\s*([AP])\.?M\.?", re.IGNORECASE)
+_CLOCK_TIME_24H = re.compile(r"\b\d{1,2}:\d{2}\b")
+
+
+def _stable_time(label: Optional[str]) -> Optional[str]:
+    """
+    The part of a timestamp label that stays the same as the message ages: the
+    datetime itself if IG gave one, otherwise the time of day. Relative labels
+    ("2h", "Yesterday") give None.
+    """
+    if not label:
+        return None
+    epoch = parse_ig_timestamp(label)
+    if epoch is not None:
+        return str(int(epoch))
+    match = _CLOCK_TIME.search(label)
+    if match:
+        return f"{match.group(1)}{match.group(2).upper()}M"
+    match = _CLOCK_TIME_24H.search(label)
+    return match.group(0) if match else None
+
+
+def assign_message_ids(thread_key: str, rows: List[Dict[str, Any]], network: Optional[Dict[str, List[Dict]]] = None) -> List[Dict[str, Any]]:
+    """
+    Give every extracted row a stable id, in order of preference:
+    an id IG put in the DOM, an id from a network payload with the same text,
+    or a hash of (thread, sender, text, stable part of the group's timestamp,
+    n-th occurrence since the group's timestamp separator).
+
+    Only fields that don't change as the message ages go into the hash: the
+    time label is reduced to the datetime or time of day, and duplicates are
+    counted from their separator rather than from the start of the window
+    (which moves as new messages arrive). A time of day or a relative label
+    ("2h") recurs in later groups, so those groups are also tied to the
+    message just before their separator (the leading "context" row for the
+    first group). The context row itself gets no id and is not returned.
+    """
+    context = rows[0] if rows and rows[0].get("context") else None
+    if context:
+        rows = rows[1:]
+    network = network or {}
+    occurrences: Dict[tuple, int] = {}
+    same_text: Dict[str, List[Dict[str, Any]]] = {}
+    for row in rows:
+        same_text.setdefault(row["text"], []).append(row)
+
+    group = 0
+    previous_label = None
+    time_label = anchor = None
+    for index, row in enumerate(rows):
+        label = row.get("timestamp")
+        if index == 0 or label != previous_label:
+            group += 1
+            previous_label = label
+            time_label = _stable_time(label)
+            anchor = None
+            before = rows[index - 1] if index > 0 else context
+            if before and (time_label is None or parse_ig_timestamp(label) is None):
+                anchor = [before.get("sender"), before["text"]]
+        if row.get("dom_id"):
+            row["id"] = f"dom:{row['dom_id']}"
+            continue
+        # Only trust network ids when the counts line up, so the n-th "ok" on screen
+        # maps to the n-th "ok" in the payload
+        candidates = network.get(row["text"], [])
+        siblings = same_text[row["text"]]
+        if candidates and len(candidates) >= len(siblings):
+            row["id"] = f"ig:{candidates[len(candidates) - len(siblings) + siblings.index(row)]['item_id']}"
+            continue
+        group_key = (group, row.get("sender"), row["text"])
+        occurrence = occurrences.get(group_key, 0)
+        occurrences[group_key] = occurrence + 1
+        row["id"] = message_hash(thread_key, row["text"], row.get("sender"), time_label, occurrence, anchor)
+    return rows
+
+
+def message_hash(
+    thread_key: str,
+    text: str,
+    sender: Optional[str] = None,
+    time_label: Optional[str] = None,
+    occurrence: int = 0,
+    anchor: Optional[List[Optional[str]]] = None,
+) -> str:
+    """The "h:" id of a message IG gave no id for"""
+    fields: List[Any] = [thread_key, sender, time_label, text, occurrence]
+    if anchor is not None:
+        fields.append(anchor)
+    basis = json.dumps(fields)
+    return "h:" + hashlib.sha1(basis.encode("utf-8")).hexdigest()
+
+
+def network_items(page: Page) -> Optional[Dict[str, List[Dict[str, Any]]]]:
+    """Message ids collected from the page's network payloads, keyed by text"""
+    watcher = _watchers.get(id(page))
+    return watcher.items if watcher else None
+
+
+async def extract_messages(
+    page: Page,
+    thread_key: str,
+    limit: int = TAIL_ROWS,
+    container: Optional[str] = None,
+    row_selectors: Optional[List[str]] = None,
+    incremental: bool = True,
+) -> List[Dict[str, Any]]:
+    """Trailing messages of the open thread, oldest first, each with a stable 'id'"""
+    args: List[Any] = [limit, MAX_GROUP_EXTENSION, incremental]
+    if container:
+        args += [container, row_selectors]
+    rows = await page.evaluate(MESSAGES_JS, args)
+    return assign_message_ids(thread_key, rows, network_items(page))
+
+
+async def extract_last_bubble(page: Page, thread_key: str) -> List[Dict[str, Any]]:
+    """The newest message only, for layouts without message rows"""
+    text = await page.evaluate(LAST_BUBBLE_JS, LAST_BUBBLE_MAX_NODES)
+    return assign_message_ids(thread_key, [{"text": text}]) if text else []
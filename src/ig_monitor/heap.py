@@ -0,0 +1,184 @@
+"""
+Memory diagnostics: where the Python heap grows, and how big the page is.
+
+Python side: the first report starts tracemalloc and keeps that snapshot as
+the baseline. Every later report takes a new snapshot and lists the top
+allocation sites (file:line) that grew since the previous report and since the
+baseline. It also totals the growth by origin: our code (ig_monitor, app),
+Playwright's client (its object and callback bookkeeping), or everything else.
+Tracing costs memory and CPU, so it stays off until asked for and
+stop_tracing() turns it off again.
+
+Browser side: JS heap usage, DOM nodes, event listeners, documents and frames
+of the monitor's page, from the Chrome DevTools Protocol (Chromium only).
+"""
+import asyncio
+import logging
+import os
+import time
+import tracemalloc
+from collections import deque
+from typing import Any, Deque, Dict, List, Optional
+
+from playwright.async_api import Page
+
+
+logger = logging.getLogger(__name__)
+
+# Stack depth tracemalloc records per allocation; 1 is enough to group by line
+TRACE_FRAMES = 1
+# Reports kept for the growth-over-time table
+HISTORY_SIZE = 50
+# Deadline for the CDP round trips
+CDP_TIMEOUT_SECONDS = 5
+
+# Performance.getMetrics names -> report keys
+CDP_METRICS = {
+    "JSHeapUsedSize": "js_heap_used",
+    "JSHeapTotalSize": "js_heap_total",
+    "Nodes": "dom_nodes",
+    "JSEventListeners": "js_event_listeners",
+    "Documents": "documents",
+    "Frames": "frames",
+}
+
+_SRC_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+_baseline: Optional[tracemalloc.Snapshot] = None
+_previous: Optional[tracemalloc.Snapshot] = None
+_started_at: Optional[float] = None
+_lock = asyncio.Lock()
+history: Deque[Dict[str, Any]] = deque(maxlen=HISTORY_SIZE)
+
+
+def origin(filename: str) -> str:
+    """ig_monitor, playwright or other, for a traced allocation's file"""
+    if os.path.abspath(filename).startswith(_SRC_DIR + os.sep):
+        return "ig_monitor"
+    if f"{os.sep}playwright{os.sep}" in filename:
+        return "playwright"
+    return "other"
+
+
+def _rss_bytes() -> Optional[int]:
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+def _take_snapshot() -> tracemalloc.Snapshot:
+    return tracemalloc.take_snapshot().filter_traces((
+        tracemalloc.Filter(False, tracemalloc.__file__),
+        tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+        tracemalloc.Filter(False, "<frozen importlib._bootstrap_external>"),
+        tracemalloc.Filter(False, "<unknown>"),
+    ))
+
+
+def _top(snapshot: tracemalloc.Snapshot, since: tracemalloc.Snapshot, limit: int) -> List[Dict[str, Any]]:
+    out = []
+    for stat in snapshot.compare_to(since, "lineno")[:limit]:
+        frame = stat.traceback[0]
+        out.append({
+            "site": f"{frame.filename}:{frame.lineno}",
+            "origin": origin(frame.filename),
+            "size_diff": stat.size_diff,
+            "size": stat.size,
+            "count_diff": stat.count_diff,
+        })
+    return out
+
+
+def _by_origin(snapshot: tracemalloc.Snapshot, since: tracemalloc.Snapshot) -> Dict[str, Dict[str, int]]:
+    totals: Dict[str, Dict[str, int]] = {}
+    for stat in snapshot.compare_to(since, "filename"):
+        entry = totals.setdefault(origin(stat.traceback[0].filename), {"size": 0, "size_diff": 0})
+        entry["size"] += stat.size
+        entry["size_diff"] += stat.size_diff
+    return totals
+
+
+def stop_tracing() -> bool:
+    """Stop tracemalloc and drop the snapshots; False if it wasn't running"""
+    global _baseline, _previous, _started_at
+    was_tracing = tracemalloc.is_tracing()
+    tracemalloc.stop()
+    _baseline = _previous = _started_at = None
+    if was_tracing:
+        logger.info("tracemalloc stopped")
+    return was_tracing
+
+
+def python_report(limit: int = 20) -> Dict[str, Any]:
+    """tracemalloc figures and diffs; starts tracing (and reports nothing to diff yet) on first use"""
+    global _baseline, _previous, _started_at
+    if not tracemalloc.is_tracing():
+        tracemalloc.start(TRACE_FRAMES)
+        _started_at = time.time()
+        logger.info("tracemalloc started")
+    snapshot = _take_snapshot()
+    current, peak = tracemalloc.get_traced_memory()
+    report: Dict[str, Any] = {
+        "tracing_since": _started_at,
+        "traced_current": current,
+        "traced_peak": peak,
+        "tracemalloc_overhead": tracemalloc.get_tracemalloc_memory(),
+        "rss": _rss_bytes(),
+        "since_last": _top(snapshot, _previous, limit) if _previous is not None else [],
+        "since_start": _top(snapshot, _baseline, limit) if _baseline is not None else [],
+        "by_origin_since_start": _by_origin(snapshot, _baseline) if _baseline is not None else {},
+    }
+    if _baseline is None:
+        _baseline = snapshot
+    _previous = snapshot
+    return report
+
+
+async def browser_report(page: Optional[Page]) -> Optional[Dict[str, Any]]:
+    """CDP heap and DOM figures for page; None if there is no open page"""
+    if page is None:
+        return None
+    try:
+        session = await page.context.new_cdp_session(page)
+    except Exception as e:
+        # Firefox and WebKit have no CDP
+        return {"error": f"CDP unavailable: {e}"}
+    try:
+        async def _collect() -> Dict[str, Any]:
+            await session.send("Performance.enable")
+            metrics = await session.send("Performance.getMetrics")
+            return {
+                CDP_METRICS[m["name"]]: int(m["value"])
+                for m in metrics.get("metrics", [])
+                if m.get("name") in CDP_METRICS
+            }
+        report = await asyncio.wait_for(_collect(), timeout=CDP_TIMEOUT_SECONDS)
+        report["url"] = page.url
+        return report
+    except Exception as e:
+        return {"error": f"CDP metrics failed: {e}"}
+    finally:
+        try:
+            await session.detach()
+        except Exception:
+            pass
+
+
+async def report(page: Optional[Page] = None, limit: int = 20) -> Dict[str, Any]:
+    """Python heap diffs plus the page's figures, and a row in the history table"""
+    async with _lock:
+        # Snapshots and diffs are pure Python over every traced block; keep them off the loop thread
+        python = await asyncio.to_thread(python_report, limit)
+        browser = await browser_report(page)
+    row = {
+        "ts": time.time(),
+        "rss": python["rss"],
+        "traced_current": python["traced_current"],
+    }
+    if browser and "error" not in browser:
+        row.update(js_heap_used=browser.get("js_heap_used"), dom_nodes=browser.get("dom_nodes"),
+                   js_event_listeners=browser.get("js_event_listeners"))
+    history.append(row)
+    return {"pid": os.getpid(), "python": python, "browser": browser, "history": list(history)}
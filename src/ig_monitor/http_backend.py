@@ -0,0 +1,151 @@
+import json
+import os
+import re
+from typing import Any, Dict, List, Optional
+
+import httpx
+
+from ig_monitor.config import get_settings
+from ig_monitor.engines import CHROME_USER_AGENT
+
+
+settings = get_settings()
+
+# Public app id the Instagram web client sends with every API call
+IG_APP_ID = "936619743392459"
+
+# API error messages that mean a human has to look at the session
+_ATTENTION_MESSAGES = ("login_required", "checkpoint_required", "challenge_required", "consent_required")
+
+
+class SessionNeedsAttention(Exception):
+    """The HTTP session is logged out or challenged; the browser path has to take over"""
+
+
+def cookies_from_storage_state(path: str) -> Dict[str, str]:
+    """Instagram cookies from a Playwright storage_state file (empty if missing)"""
+    if not os.path.exists(path):
+        return {}
+    with open(path, "r", encoding="utf-8") as fh:
+        state = json.load(fh)
+    return {c["name"]: c["value"] for c in state.get("cookies", []) if "instagram.com" in c.get("domain", "")}
+
+
+def thread_id_from_url(url: str) -> Optional[str]:
+    match = re.search(r"/direct/t/([^/?#]+)", url)
+    return match.group(1) if match else None
+
+
+def _item_text(item: Dict[str, Any]) -> str:
+    if item.get("text"):
+        return item["text"]
+    # Non-text items (photos, reels, likes...) still deserve a notification
+    kind = item.get("item_type") or "message"
+    return f"[{kind.replace('_', ' ')}]"
+
+
+def _user_name(user: Dict[str, Any]) -> Optional[str]:
+    """The name the web client shows for a user: full name, else username"""
+    return user.get("full_name") or user.get("username") or None
+
+
+def _to_message(item: Dict[str, Any], users: Dict[str, str]) -> Dict[str, Any]:
+    """Same shape as the browser extractor's messages, with the same 'ig:' id scheme"""
+    user_id = str(item["user_id"]) if item.get("user_id") is not None else None
+    return {
+        "id": f"ig:{item['item_id']}",
+        "text": _item_text(item),
+        # Display name like the browser path, so sender rules match either backend
+        "sender": users.get(user_id, user_id) if user_id else None,
+        "timestamp": item.get("timestamp"),
+    }
+
+
+class InstagramHttpClient:
+    """
+    Polls Instagram's web inbox/thread JSON endpoints with the browser session's
+    cookies over one pooled keep-alive connection.
+    """
+
+    def __init__(self, cookies: Dict[str, str], base_url: Optional[str] = None, timeout: float = 15.0):
+        if "sessionid" not in cookies:
+            raise SessionNeedsAttention("no sessionid cookie in the saved session")
+        self._client = httpx.AsyncClient(
+            base_url=base_url or settings.ig_api_base_url,
+            cookies=cookies,
+            headers={
+                "User-Agent": CHROME_USER_AGENT,
+                "Accept": "*/*",
+                "Accept-Language": "en-US,en;q=0.9",
+                "X-IG-App-ID": IG_APP_ID,
+                "X-CSRFToken": cookies.get("csrftoken", ""),
+                "X-Requested-With": "XMLHttpRequest",
+                "Referer": "https://www.instagram.com/direct/inbox/",
+            },
+            limits=httpx.Limits(max_connections=2, max_keepalive_connections=2, keepalive_expiry=300),
+            timeout=timeout,
+            follow_redirects=False,
+        )
+        # Web thread ids (from /direct/t/<id>/ URLs) -> API thread ids
+        self._thread_ids: Dict[str, str] = {}
+        # User ids -> display names, from the "users" of every thread seen
+        self._users: Dict[str, str] = {}
+
+    async def aclose(self) -> None:
+        await self._client.aclose()
+
+    async def _get_json(self, path: str, params: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        response = await self._client.get(path, params=params)
+        if response.is_redirect:
+            location = response.headers.get("location", "")
+            raise SessionNeedsAttention(f"redirected to {location or 'unknown location'}")
+        if response.status_code in (401, 403):
+            raise SessionNeedsAttention(f"HTTP {response.status_code} from {path}")
+        try:
+            data = response.json()
+        except ValueError:
+            # An HTML page instead of JSON is the login wall
+            raise SessionNeedsAttention(f"non-JSON response from {path}") from None
+        message = str(data.get("message") or "")
+        if message in _ATTENTION_MESSAGES or data.get("require_login"):
+            raise SessionNeedsAttention(message or "login required")
+        response.raise_for_status()
+        return data
+
+    def _remember_users(self, thread: Dict[str, Any]) -> None:
+        for user in thread.get("users", []):
+            user_id = user.get("pk") or user.get("pk_id")
+            name = _user_name(user)
+            if user_id is not None and name:
+                self._users[str(user_id)] = name
+
+    async def inbox(self, limit: int = 20) -> List[Dict[str, Any]]:
+        """Inbox threads with their latest items (oldest first)"""
+        data = await self._get_json("/api/v1/direct_v2/inbox/", {"limit": limit, "thread_message_limit": 5})
+        threads = []
+        for thread in data.get("inbox", {}).get("threads", []):
+            thread_id = str(thread["thread_id"])
+            web_id = str(thread.get("thread_v2_id") or thread_id)
+            self._thread_ids[web_id] = thread_id
+            self._thread_ids[thread_id] = thread_id
+            self._remember_users(thread)
+            threads.append({
+                "key": web_id,
+                "thread_id": thread_id,
+                "name": thread.get("thread_title") or web_id,
+                "messages": [_to_message(i, self._users) for i in reversed(thread.get("items", [])) if i.get("item_id")],
+            })
+        return threads
+
+    async def resolve_thread_id(self, web_id: str) -> str:
+        if web_id not in self._thread_ids:
+            await self.inbox()
+        return self._thread_ids.get(web_id, web_id)
+
+    async def thread_messages(self, web_id: str, limit: int = 10) -> List[Dict[str, Any]]:
+        """Latest messages of a thread (oldest first)"""
+        thread_id = await self.resolve_thread_id(web_id)
+        data = await self._get_json(f"/api/v1/direct_v2/threads/{thread_id}/", {"limit": limit})
+        thread = data.get("thread", {})
+        self._remember_users(thread)
+        return [_to_message(i, self._users) for i in reversed(thread.get("items", [])) if i.get("item_id")]
@@ -0,0 +1,98 @@
+import logging
+from typing import Dict, List, Tuple
+
+from playwright.async_api import Page
+
+
+logger = logging.getLogger(__name__)
+
+# Reads every conversation entry of the DM inbox list in one pass. Each row is
+# tagged with data-igsms-key so it can be clicked later without re-scanning.
+# Threads are keyed by their /direct/t/<id>/ link when IG exposes one, otherwise
+# by the conversation title.
+INBOX_JS = """
+() => {
+    const rows = new Set();
+    for (const a of document.querySelectorAll("a[href*='/direct/t/']")) {
+        rows.add(a.closest("[role='listitem'], li") || a);
+    }
+    if (!rows.size) {
+        const list = document.querySelector("[aria-label*='hread list'], [aria-label*='onversations']");
+        if (list) {
+            for (const el of list.querySelectorAll("[role='listitem'], [role='button']")) rows.add(el);
+        }
+    }
+    const entries = [];
+    const keys = new Set();
+    for (const row of rows) {
+        const link = row.matches("a[href*='/direct/t/']") ? row : row.querySelector("a[href*='/direct/t/']");
+        const href = link ? link.getAttribute('href') : null;
+        const match = href ? href.match(/\\/direct\\/t\\/([^/?#]+)/) : null;
+        const lines = (row.innerText || '').split('\\n').map(s => s.trim()).filter(Boolean);
+        if (!lines.length) continue;
+        const key = match ? match[1] : 'name:' + lines[0];
+        if (keys.has(key)) continue;
+        keys.add(key);
+        row.setAttribute('data-igsms-key', key);
+        const time = row.querySelector('time, abbr');
+        const label = (row.getAttribute('aria-label') || '') + ' ' + row.innerHTML.slice(0, 4000);
+        entries.push({
+            key: key,
+            href: href,
+            name: lines[0],
+            snippet: lines.slice(1).join(' ').slice(0, 200),
+            timestamp: time ? (time.getAttribute('datetime') || time.getAttribute('title') || time.textContent) : null,
+            unread: /\\bunread\\b/i.test(label),
+        });
+    }
+    return entries;
+}
+"""
+
+CLICK_ENTRY_JS = """
+(key) => {
+    const row = [...document.querySelectorAll('[data-igsms-key]')].find(el => el.dataset.igsmsKey === key);
+    if (!row) return false;
+    const target = row.matches('a') ? row : (row.querySelector("a[href*='/direct/t/']") || row);
+    target.click();
+    return true;
+}
+"""
+
+
+async def read_inbox(page: Page) -> List[Dict]:
+    """Return the inbox entries currently rendered in the conversation list"""
+    return await page.evaluate(INBOX_JS)
+
+
+def entry_signature(entry: Dict) -> Tuple:
+    """What we compare between passes; a change means the thread needs opening"""
+    return (entry.get("snippet"), entry.get("timestamp"), bool(entry.get("unread")))
+
+
+def changed_entries(entries: List[Dict], previous: Dict[str, list]) -> List[Dict]:
+    """
+    Entries whose signature differs from the previous pass. Entries we have never
+    seen are only reported when they show as unread (a brand new conversation);
+    otherwise they just become part of the baseline.
+    """
+    changed = []
+    for entry in entries:
+        before = previous.get(entry["key"])
+        if before is None:
+            if entry.get("unread"):
+                changed.append(entry)
+        elif tuple(before) != entry_signature(entry):
+            # Reading a thread clears its unread marker; that alone isn't a new message
+            if tuple(before[:2]) == entry_signature(entry)[:2] and not entry.get("unread"):
+                continue
+            changed.append(entry)
+    return changed
+
+
+async def open_entry(page: Page, key: str) -> bool:
+    """Open a conversation from the inbox list in place (SPA navigation, list stays loaded)"""
+    opened = await page.evaluate(CLICK_ENTRY_JS, key)
+    if not opened:
+        logger.warning(f"Inbox entry {key} not found in the conversation list")
+    return opened
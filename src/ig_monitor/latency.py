@@ -0,0 +1,150 @@
+"""
+End-to-end notification latency.
+
+Every message the monitor notifies about is stamped (epoch seconds) as it
+goes through the pipeline:
+
+    seen       when IG says it was sent (an API item's own timestamp), or
+               failing that when the poll that found it started
+    extracted  when the poll had read it from the page / API
+    committed  when it was recorded as seen in the state database
+    sms_start  when send_sms was called
+    sms_done   when send_sms returned
+
+The intervals between stages are kept over a sliding window of recent
+messages and summarised as p50/p95/p99. When the p95 end-to-end latency goes
+over LATENCY_SLO_SECONDS an error event is published (and logged) once, and
+again only after it has recovered.
+"""
+import logging
+from collections import deque
+from datetime import datetime
+from typing import Any, Deque, Dict, Optional
+
+from ig_monitor import events
+from ig_monitor.config import get_settings
+
+
+settings = get_settings()
+logger = logging.getLogger(__name__)
+
+STAGES = ("seen", "extracted", "committed", "sms_start", "sms_done")
+# Reported intervals: name -> (from stage, to stage)
+INTERVALS = {
+    "detect": ("seen", "extracted"),
+    "commit": ("extracted", "committed"),
+    "sms": ("sms_start", "sms_done"),
+    "end_to_end": ("seen", "sms_done"),
+}
+PERCENTILES = (50, 95, 99)
+# The percentile compared with LATENCY_SLO_SECONDS
+SLO_PERCENTILE = 95
+
+
+def parse_ig_timestamp(value: Any) -> Optional[float]:
+    """
+    Epoch seconds from an IG timestamp: the API's microseconds (or milliseconds,
+    or seconds) since the epoch, or an ISO 8601 datetime attribute. None if it
+    is anything else (e.g. "2h" or "Yesterday" from the page).
+    """
+    if value is None or isinstance(value, bool):
+        return None
+    if isinstance(value, str):
+        text = value.strip()
+        if not text.isdigit():
+            try:
+                return datetime.fromisoformat(text.replace("Z", "+00:00")).timestamp()
+            except ValueError:
+                return None
+        value = int(text)
+    if not isinstance(value, (int, float)) or value <= 0:
+        return None
+    if value > 1e14:
+        return value / 1e6
+    if value > 1e11:
+        return value / 1e3
+    return float(value)
+
+
+def percentile(sorted_values: list, p: float) -> Optional[float]:
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return None
+    rank = max(1, -(-len(sorted_values) * p // 100))
+    return sorted_values[int(rank) - 1]
+
+
+class LatencyTracker:
+    def __init__(self, window: Optional[int] = None, slo_seconds: Optional[float] = None):
+        self.window = window or settings.latency_window
+        self.slo_seconds = settings.latency_slo_seconds if slo_seconds is None else slo_seconds
+        self.samples: Dict[str, Deque[float]] = {name: deque(maxlen=self.window) for name in INTERVALS}
+        self.last: Optional[Dict[str, Any]] = None
+        self.breached = False
+
+    @staticmethod
+    def start(message: Dict[str, Any], polled_at: float, extracted_at: float) -> Dict[str, Any]:
+        """Stamps for a newly detected message; the caller adds the later stages as they happen"""
+        # Only API items ("ig:" ids) carry their own send time. On the page the
+        # timestamp is the label of the message's time group, shared by every
+        # message under it, so it would date later messages too early
+        own_time = str(message.get("id") or "").startswith("ig:")
+        sent_at = parse_ig_timestamp(message.get("timestamp")) if own_time else None
+        # IG's time is only usable if our clock agrees with it (not in the future)
+        if sent_at is not None and sent_at <= extracted_at:
+            seen, source = sent_at, "ig"
+        else:
+            seen, source = polled_at, "poll"
+        return {"id": message.get("id"), "seen_source": source, "seen": seen, "extracted": extracted_at}
+
+    def record(self, stamps: Dict[str, Any]) -> None:
+        """Add a message's intervals to the window (stages it never reached are skipped)"""
+        durations = {}
+        for name, (begin, end) in INTERVALS.items():
+            if stamps.get(begin) is not None and stamps.get(end) is not None:
+                durations[name] = max(0.0, stamps[end] - stamps[begin])
+                self.samples[name].append(durations[name])
+        self.last = {"id": stamps.get("id"), "seen_source": stamps.get("seen_source"), **{
+            name: round(seconds, 3) for name, seconds in durations.items()
+        }}
+        self._check_slo()
+        events.publish("state", latency=self.summary())
+
+    def _check_slo(self) -> None:
+        if not self.slo_seconds:
+            return
+        value = percentile(sorted(self.samples["end_to_end"]), SLO_PERCENTILE)
+        if value is None:
+            return
+        breached = value > self.slo_seconds
+        if breached and not self.breached:
+            message = (
+                f"Notification latency SLO breached: p{SLO_PERCENTILE} {value:.1f}s "
+                f"> {self.slo_seconds}s over the last {len(self.samples['end_to_end'])} SMS"
+            )
+            logger.warning(message)
+            events.publish("error", error=message)
+        elif self.breached and not breached:
+            logger.info(f"Notification latency back within SLO: p{SLO_PERCENTILE} {value:.1f}s")
+        self.breached = breached
+
+    def summary(self) -> Dict[str, Any]:
+        intervals = {}
+        for name, samples in self.samples.items():
+            ordered = sorted(samples)
+            figures = {f"p{p}": percentile(ordered, p) for p in PERCENTILES}
+            intervals[name] = {
+                "count": len(ordered),
+                **{k: round(v, 3) if v is not None else None for k, v in figures.items()},
+            }
+        return {
+            "window": self.window,
+            "slo_seconds": self.slo_seconds,
+            "slo_percentile": SLO_PERCENTILE,
+            "slo_breached": self.breached,
+            "intervals": intervals,
+            "last": self.last,
+        }
+
+
+latency_tracker = LatencyTracker()
@@ -1,13 +1,13 @@
 import asyncio
 import gc
-import hashlib
 import logging
 import os
 import random
+import time
 from datetime import datetime, timezone
-from typing import Optional
+from typing import Awaitable, Callable, Optional
 
-from playwright.async_api import async_playwright, Browser, Page
+from playwright.async_api import async_playwright, Browser, BrowserContext, Page, Playwright
 
 from ig_monitor.config import get_settings
 from ig_monitor.state import (
@@ -16,16 +16,101 @@ from ig_monitor.state import (
     is_running,
     set_running,
     set_last_login_ts,
+    get_inbox_snapshot,
+    filter_unseen,
+    mark_seen,
+    has_seen_any,
+    set_inbox_snapshot,
+    get_profile_last_prune,
+    set_profile_last_prune,
+    get_coordinator,
+    get_readopt_threads,
+    set_readopt_threads,
+)
+from ig_monitor.sms import encode_for_sms, send_sms
+from ig_monitor import engines, events, profile, rules, snapshots
+from ig_monitor.scheduler import page_scheduler, PRIORITY_MONITOR, SchedulerBusy
+from ig_monitor.settle import track_network, wait_for_settle
+from ig_monitor.strategies import strategy_tuner
+from ig_monitor.latency import latency_tracker
+from ig_monitor.extract import watch_message_payloads
+from ig_monitor.inbox import read_inbox, open_entry, changed_entries, entry_signature
+from ig_monitor.http_backend import (
+    InstagramHttpClient,
+    SessionNeedsAttention,
+    cookies_from_storage_state,
+    thread_id_from_url,
 )
-from ig_monitor.sms import send_sms
 
 
 settings = get_settings()
+logger = logging.getLogger(__name__)
 
 
 _monitor_task: Optional[asyncio.Task] = None
+_playwright: Optional[Playwright] = None
+# Only set in storage_state session mode; in profile mode the context owns the browser
 _browser: Optional[Browser] = None
+_context: Optional[BrowserContext] = None
 _page: Optional[Page] = None
+_logged_in: Optional[bool] = None
+_last_session_save = 0.0
+# Last time the remote browser UI used the page (monotonic)
+_last_browser_activity = 0.0
+# Set by the maintenance task; the monitor loop prunes at its next idle point
+_maintenance_due = False
+
+# The browser counts as idle (safe to close for maintenance) after this long without remote use
+BROWSER_IDLE_SECONDS = 10 * 60
+
+# Re-save storage_state this often while monitoring so rotated cookies are kept
+SESSION_SAVE_INTERVAL_SECONDS = 30 * 60
+
+
+class PageOperationTimeout(Exception):
+    """A page call didn't finish within its deadline (likely a wedged renderer)"""
+
+
+class MonitorStalled(Exception):
+    """The monitor loop stopped updating its heartbeat"""
+
+
+async def _deadline(awaitable, op: str, seconds: Optional[float] = None):
+    """Await a page operation, failing with PageOperationTimeout after its deadline"""
+    seconds = settings.page_op_timeout_seconds if seconds is None else seconds
+    try:
+        return await asyncio.wait_for(awaitable, timeout=seconds)
+    except asyncio.TimeoutError:
+        raise PageOperationTimeout(f"{op} did not finish within {seconds:.0f}s") from None
+
+
+_heartbeat: Optional[float] = None
+# The heartbeat is also published (as a wall-clock heartbeat_at) for /healthz in
+# the web tier, at most this often (seconds)
+HEARTBEAT_PUBLISH_SECONDS = 10
+_heartbeat_published: Optional[float] = None
+
+
+def _beat(publish: bool = False) -> None:
+    global _heartbeat, _heartbeat_published
+    _heartbeat = time.monotonic()
+    if publish or _heartbeat_published is None or _heartbeat - _heartbeat_published >= HEARTBEAT_PUBLISH_SECONDS:
+        _heartbeat_published = _heartbeat
+        events.publish("state", heartbeat_at=time.time())
+
+
+def heartbeat_age() -> Optional[float]:
+    """Seconds since the monitor loop last made progress (None when not monitoring)"""
+    if _heartbeat is None or not is_monitor_running():
+        return None
+    return time.monotonic() - _heartbeat
+
+
+def _stale_after() -> float:
+    if settings.watchdog_stale_seconds:
+        return settings.watchdog_stale_seconds
+    # Longest legitimate gap: a full jittered sleep plus a couple of slow page operations
+    return max(10, settings.poll_seconds) * 1.2 + 2 * settings.page_op_timeout_seconds + 60
 
 
 def _data_paths() -> tuple[str, str]:
@@ -35,96 +120,251 @@ def _data_paths() -> tuple[str, str]:
     return user_data_dir, settings.ig_thread_url
 
 
-async def _ensure_browser() -> Page:
-    global _browser, _page
-    if _page is not None:
-        return _page
+def storage_state_path() -> str:
+    return os.path.join(settings.data_dir, settings.storage_state_name)
+
+
+# Replaces launching Playwright when set (tests and benchmarks inject the fakes in tests/fakes.py)
+_browser_factory: Optional[Callable[[], Awaitable[BrowserContext]]] = None
+
+
+def set_browser_factory(factory: Optional[Callable[[], Awaitable[BrowserContext]]]) -> None:
+    """Create browser contexts with factory() instead of Playwright; None restores the default"""
+    global _browser_factory
+    _browser_factory = factory
+
+
+async def _launch_context() -> BrowserContext:
+    global _playwright, _browser
+    if _playwright is None:
+        _playwright = await async_playwright().start()
 
-    user_data_dir, _ = _data_paths()
-    pw = await async_playwright().start()
-    
     # Check if we should run headless (default True for Render, False for local with visible browser)
     # Set HEADLESS_BROWSER=false to see the browser locally
     headless = os.getenv("HEADLESS_BROWSER", "true").lower() != "false"
-    
-    try:
-        # Use a more recent, realistic user agent
-        user_agent = (
-            "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 "
-            "(KHTML, like Gecko) Chrome/131.0.0.0 Safari/537.36"
-        )
-        
-        _browser = await pw.chromium.launch_persistent_context(
-            user_data_dir=user_data_dir,
-            headless=headless,
-            args=[
-                "--disable-dev-shm-usage",
-                "--no-sandbox",  # Required for Docker, but might be detected
-                "--disable-gpu",
-                # Keep only essential flags - remove ones that scream "automation"
-                "--disable-background-networking",
-                "--disable-background-timer-throttling",
-                "--disable-backgrounding-occluded-windows",
-                "--disable-component-extensions-with-background-pages",
-                "--disable-default-apps",
-                "--disable-notifications",
-                "--no-first-run",
-                "--no-default-browser-check",
-                "--no-zygote",
-                # Remove automation detection
-                "--disable-blink-features=AutomationControlled",
-                "--exclude-switches=enable-automation",
-            ],
-            viewport={"width": 1366, "height": 768},  # More common viewport size
-            user_agent=user_agent,
-            # Add extra HTTP headers to look more legitimate
-            extra_http_headers={
-                "Accept-Language": "en-US,en;q=0.9",
-                "Accept-Encoding": "gzip, deflate, br",
-                "Accept": "text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,*/*;q=0.8",
-                "Connection": "keep-alive",
-                "Upgrade-Insecure-Requests": "1",
-                "Sec-Fetch-Dest": "document",
-                "Sec-Fetch-Mode": "navigate",
-                "Sec-Fetch-Site": "none",
-                "Cache-Control": "max-age=0",
-            },
+
+    engine = settings.browser_engine
+    launcher = engines.browser_type(_playwright, engine)
+    launch_options = engines.launch_options(engine, headless)
+    context_options = engines.context_options(engine)
+
+    if settings.session_mode == "storage_state":
+        # Ephemeral context seeded with just cookies + localStorage from the last save
+        if _browser is None or not _browser.is_connected():
+            _browser = await launcher.launch(**launch_options)
+        state_path = storage_state_path()
+        return await _browser.new_context(
+            storage_state=state_path if os.path.exists(state_path) else None,
+            **context_options,
         )
-        _page = await _browser.new_page()
-        
-        # Additional JavaScript to hide automation (stealth plugin handles most, but add extra)
-        await _page.add_init_script("""
-            // Remove webdriver property
-            Object.defineProperty(navigator, 'webdriver', {
-                get: () => undefined
-            });
-            
-            // Override permissions
-            const originalQuery = window.navigator.permissions.query;
-            window.navigator.permissions.query = (parameters) => (
-                parameters.name === 'notifications' ?
-                    Promise.resolve({ state: Notification.permission }) :
-                    originalQuery(parameters)
-            );
-            
-            // Mock plugins
-            Object.defineProperty(navigator, 'plugins', {
-                get: () => [1, 2, 3, 4, 5]
-            });
-            
-            // Mock languages
-            Object.defineProperty(navigator, 'languages', {
-                get: () => ['en-US', 'en']
-            });
-        """)
-        
+    user_data_dir, _ = _data_paths()
+    return await launcher.launch_persistent_context(
+        user_data_dir=user_data_dir,
+        **launch_options,
+        **context_options,
+    )
+
+
+# The in-flight launch, shared by everyone who needs the page before it exists
+_launch_task: Optional[asyncio.Task] = None
+# Outcome of the last launch, for the readiness probe
+_launch_info: dict = {"error": None, "seconds": None, "at": None}
+# Set once a page has been opened, so a deliberately closed browser isn't "not started"
+_launched_once = False
+
+
+# Held while the profile's caches are deleted, so a launch (a /browser request, a
+# monitor restart) can't open the profile halfway through
+_profile_lock = asyncio.Lock()
+
+
+async def _launch_page() -> Page:
+    global _context, _page, _launched_once
+    started = time.monotonic()
+    try:
+        if _browser_factory is not None:
+            _context = await _browser_factory()
+            stealth = None
+        else:
+            async with _profile_lock:
+                _context = await _launch_context()
+            stealth = engines.stealth_script(settings.browser_engine)
+        page = await _context.new_page()
+        track_network(page)
+        watch_message_payloads(page)
+        if stealth:
+            await page.add_init_script(stealth)
+        _page = page
+        _launched_once = True
+        _launch_info.update(error=None, seconds=round(time.monotonic() - started, 2), at=time.time())
+        logger.info(f"Browser ready in {_launch_info['seconds']}s")
         return _page
     except Exception as e:
-        logger = logging.getLogger(__name__)
+        _launch_info.update(error=str(e), seconds=None, at=time.time())
         logger.error(f"Failed to launch browser: {e}", exc_info=True)
         raise RuntimeError(f"Browser launch failed: {e}") from e
 
 
+async def _ensure_browser() -> Page:
+    global _launch_task
+    if _page is not None:
+        return _page
+    # Single flight: concurrent first users (warm-up, /browser/*, the monitor) share
+    # one launch, and a caller giving up doesn't cancel it for the others
+    if _launch_task is None or _launch_task.done():
+        _launch_task = asyncio.create_task(_launch_page(), name="browser-launch")
+    return await asyncio.shield(_launch_task)
+
+
+async def warm_up_browser() -> None:
+    """Launch the browser in the background at startup so the first request doesn't pay for it"""
+    if not settings.browser_warmup or settings.monitor_backend == "http":
+        return
+    try:
+        await _ensure_browser()
+    except Exception as e:
+        # Already logged; the next user of the page retries the launch
+        logger.warning(f"Browser warm-up failed: {e}")
+
+
+def browser_launch_status() -> dict:
+    """Launch state of the browser: not_started, launching, open, closed or failed"""
+    if _launch_task is not None and not _launch_task.done():
+        status = "launching"
+    elif _page is not None and _browser_alive():
+        status = "open"
+    elif _launch_info["error"]:
+        status = "failed"
+    elif _launched_once:
+        status = "closed"
+    else:
+        status = "not_started"
+    return {"status": status, **_launch_info}
+
+
+def session_status() -> dict:
+    return {
+        "logged_in": _logged_in,
+        "saved_session": os.path.exists(storage_state_path()),
+    }
+
+
+async def save_session() -> Optional[str]:
+    """
+    Write the context's cookies and localStorage to storage_state.json (atomically).
+    Done in both session modes so switching to SESSION_MODE=storage_state keeps the login.
+    """
+    global _last_session_save
+    if _context is None:
+        return None
+    path = storage_state_path()
+    tmp_path = path + ".tmp"
+    await _context.storage_state(path=tmp_path)
+    os.replace(tmp_path, path)
+    _last_session_save = time.monotonic()
+    logger.info(f"Saved session storage state to {path}")
+    return path
+
+
+async def recycle_context() -> Page:
+    """
+    Save the session and replace the context/page with fresh ones. In storage_state
+    mode the browser process is kept, so this only costs a new context.
+    """
+    global _context, _page
+    try:
+        await save_session()
+    except Exception as e:
+        logger.warning(f"Could not save session before recycling: {e}")
+    if _context is not None:
+        try:
+            await _context.close()
+        except Exception as e:
+            logger.warning(f"Error closing browser context: {e}")
+    _context = None
+    _page = None
+    return await _ensure_browser()
+
+
+def is_browser_open() -> bool:
+    return _context is not None
+
+
+def open_page() -> Optional[Page]:
+    """The current page if the browser is open; never launches it"""
+    return _page if _context is not None else None
+
+
+async def close_browser() -> None:
+    """Save the session and close the context (and browser); the next use relaunches lazily"""
+    global _browser, _context, _page
+    if _context is not None:
+        try:
+            await save_session()
+        except Exception as e:
+            logger.warning(f"Could not save session before closing: {e}")
+        try:
+            await _context.close()
+        except Exception as e:
+            logger.warning(f"Error closing browser context: {e}")
+    if _browser is not None:
+        try:
+            await _browser.close()
+        except Exception as e:
+            logger.warning(f"Error closing browser: {e}")
+    _browser = None
+    _context = None
+    _page = None
+
+
+async def _prune_profile() -> int:
+    """Close the browser so nothing holds the profile open, then delete its caches"""
+    global _maintenance_due
+    async with _profile_lock:
+        await close_browser()
+        freed = await asyncio.to_thread(profile.prune_caches)
+    await set_profile_last_prune(time.time())
+    _maintenance_due = False
+    report = await asyncio.to_thread(profile.usage_report)
+    events.publish("disk", freed=freed, total=report["total"], profile_total=report["profile_total"])
+    return freed
+
+
+async def run_profile_maintenance(force: bool = False) -> str:
+    """
+    Refresh the disk usage report and prune the profile caches when over
+    PROFILE_BUDGET_MB or PROFILE_PRUNE_HOURS since the last prune (or when forced).
+    Prunes only while the browser is closed or idle; while monitoring, the loop
+    does it between polls.
+    """
+    global _maintenance_due
+    report = await asyncio.to_thread(profile.usage_report)
+    events.publish("disk", total=report["total"], profile_total=report["profile_total"])
+    if settings.session_mode != "profile":
+        return "not_applicable"
+
+    last_prune = await get_profile_last_prune()
+    due = force or profile.over_budget(report) or time.time() - last_prune > settings.profile_prune_hours * 3600
+    if not due:
+        return "not_due"
+    if is_monitor_running():
+        _maintenance_due = True
+        return "scheduled"
+    if is_browser_open() and time.monotonic() - _last_browser_activity < BROWSER_IDLE_SECONDS:
+        return "deferred"
+    await _prune_profile()
+    return "pruned"
+
+
+async def profile_maintenance_loop() -> None:
+    while True:
+        try:
+            await run_profile_maintenance()
+        except Exception as e:
+            logger.error(f"Profile maintenance failed: {e}", exc_info=True)
+        await asyncio.sleep(settings.profile_check_minutes * 60)
+
+
 async def is_logged_in(page: Page) -> bool:
     """Check if currently logged into Instagram"""
     # Heuristic: presence of the DM thread container vs login form
@@ -142,72 +382,470 @@ async def is_logged_in(page: Page) -> bool:
 _is_logged_in = is_logged_in
 
 
-async def open_thread_and_wait_ready(page: Page) -> None:
-    _, thread_url = _data_paths()
-    await page.goto(thread_url, wait_until="domcontentloaded")
-    # Give time for React app to render
-    await page.wait_for_timeout(1500)
+def note_login_state(logged_in: bool) -> bool:
+    """Record the latest login check and publish a 'login' event when it changes"""
+    global _logged_in
+    if logged_in != _logged_in:
+        _logged_in = logged_in
+        events.publish("login", logged_in=logged_in)
+        return True
+    return False
+
 
-    if not await is_logged_in(page):
+async def _wait_for_login(page: Page) -> None:
+    logged_in = await _deadline(is_logged_in(page), "login check")
+    note_login_state(logged_in)
+    if not logged_in:
         # Notify and rely on user to log in manually (first run)
-        send_sms(settings.owner_phone, "IG Monitor: login required. Please log in via the hosted session.")
+        await asyncio.to_thread(
+            send_sms, settings.owner_phone, "IG Monitor: login required. Please log in via the hosted session."
+        )
         # Keep page open for manual login window
         # Poll until logged in or timeout (~10 minutes)
         for _ in range(120):
-            if await is_logged_in(page):
-                await set_last_login_ts(datetime.now(timezone.utc).isoformat())
+            # Waiting for a human is progress, not a hang
+            _beat()
+            if await _deadline(is_logged_in(page), "login check"):
+                login_ts = datetime.now(timezone.utc).isoformat()
+                await set_last_login_ts(login_ts)
+                note_login_state(True)
+                events.publish("state", last_login_ts=login_ts)
+                await save_session()
                 break
-            await page.wait_for_timeout(5000)
+            # The login happens through the remote browser: if this runs inside
+            # a poll, its input must get the page while we wait
+            async with page_scheduler.released():
+                await asyncio.sleep(5)
+
+
+async def open_thread_and_wait_ready(page: Page) -> None:
+    _, thread_url = _data_paths()
+    await _deadline(page.goto(thread_url, wait_until="domcontentloaded"), "open thread", 45)
+    # Give the React app time to render: until DOM and network go quiet
+    await _deadline(wait_for_settle(page), "settle")
+    await _wait_for_login(page)
 
     # Wait for messages area heuristically
     # We target generic message bubble selectors to be resilient
-    await page.wait_for_selector("[role='main']", timeout=30000)
+    await _deadline(page.wait_for_selector("[role='main']", timeout=30000), "wait for thread", 35)
+
+
+async def open_inbox_and_wait_ready(page: Page) -> None:
+    await _deadline(page.goto(settings.ig_inbox_url, wait_until="domcontentloaded"), "open inbox", 45)
+    await _deadline(wait_for_settle(page), "settle")
+    await _wait_for_login(page)
+    await _deadline(page.wait_for_selector("[role='main']", timeout=30000), "wait for inbox", 35)
+
+
+async def _extract_messages(page: Page, thread_key: str) -> list[dict]:
+    """Trailing messages of the open thread (oldest first), each with a stable 'id'"""
+    return await _deadline(strategy_tuner.extract(page, thread_key), "extract messages")
 
 
-async def _extract_latest_message_id_and_text(page: Page) -> Optional[tuple[str, str]]:
-    # Try to query message bubbles and take the last one
-    # We use a generic approach due to frequent DOM changes, fallback by hashing text+time
-    elements = await page.query_selector_all("[role='main'] div:has-text('\n')")
-    if not elements:
+async def _extract_latest_message_id_and_text(page: Page, thread_key: Optional[str] = None) -> Optional[tuple[str, str]]:
+    messages = await _extract_messages(page, thread_key or str(settings.ig_thread_url))
+    if not messages:
         return None
+    return messages[-1]["id"], messages[-1]["text"]
 
-    # Scan last N elements to find a plausible message node with visible text
-    # Reduced from 30 to 10 to save memory
-    for el in reversed(elements[-10:]):
+
+_owned_threads: set[str] = set()
+
+
+async def _claim_threads(thread_keys: list[str]) -> set[str]:
+    """Only the node holding a thread's lease polls it, so replicas never double-notify"""
+    coordinator = get_coordinator()
+    owned = set(await coordinator.claim(thread_keys))
+    for key in owned.symmetric_difference(_owned_threads.intersection(thread_keys)):
+        acquired = key in owned
+        logger.info(f"Node {coordinator.node_id} {'acquired' if acquired else 'released'} lease on {key}")
+        events.publish("lease", thread=key, owned=acquired, node_id=coordinator.node_id)
+    _owned_threads.difference_update(thread_keys)
+    _owned_threads.update(owned)
+    return owned
+
+
+# Cap on SMS sent for one thread in one poll (e.g. after a long outage)
+MAX_NOTIFICATIONS_PER_POLL = 5
+
+
+async def _notify_if_new(page: Page, thread_key: str, label: str = "IG", thread_name: Optional[str] = None) -> None:
+    polled_at = time.time()
+    messages = await _extract_messages(page, thread_key)
+    extracted_at = time.time()
+    if settings.snapshot_recording:
         try:
-            txt = (await el.inner_text()).strip()
-            if not txt:
-                continue
-            # Create a synthetic id from text and position/time; IG may not expose stable ids in DOM
-            synthetic = hashlib.sha1((txt[:200]).encode("utf-8")).hexdigest()
-            return synthetic, txt
-        except Exception:
+            await _deadline(snapshots.get_recorder().record(page, thread_key, messages), "record snapshot")
+        except PageOperationTimeout:
+            raise
+        except Exception as e:
+            logger.warning(f"Could not record DOM snapshot: {e}")
+    await _adopt_after_switch(thread_key, messages, "browser")
+    await _notify_new_messages(thread_key, messages, label, polled_at, extracted_at, thread_name)
+
+
+# Threads still to re-adopt after a message id scheme change (loaded on first use)
+_readopt_pending: Optional[set[str]] = None
+
+
+async def _readopt(thread_key: str, ids: list[str]) -> bool:
+    """
+    After an upgrade that changed how message ids are derived, the thread's
+    seen-set no longer matches what is on screen: adopt the visible messages
+    once, as on the first poll after an upgrade, instead of re-sending them.
+    """
+    global _readopt_pending
+    if _readopt_pending is None:
+        _readopt_pending = set(await get_readopt_threads())
+    if thread_key not in _readopt_pending:
+        return False
+    await mark_seen(thread_key, ids)
+    _readopt_pending.discard(thread_key)
+    await set_readopt_threads(list(_readopt_pending))
+    logger.info(f"Adopted {len(ids)} visible messages of {thread_key} under the new message id scheme")
+    return True
+
+
+async def _notify_new_messages(
+    thread_key: str,
+    messages: list[dict],
+    label: str = "IG",
+    polled_at: Optional[float] = None,
+    extracted_at: Optional[float] = None,
+    thread_name: Optional[str] = None,
+) -> None:
+    """
+    Send an SMS for every message (oldest first) not yet in the thread's seen-set.
+    polled_at/extracted_at (epoch seconds) are when the poll that found them
+    started and finished, for the latency figures. thread_name (inbox mode)
+    stands in for a sender the page didn't show in the notification rules.
+    """
+    if not messages:
+        return
+    extracted_at = extracted_at or time.time()
+    polled_at = polled_at or extracted_at
+    ids = [m["id"] for m in messages]
+
+    if await _readopt(thread_key, ids):
+        return
+    if not await has_seen_any(thread_key):
+        # First poll of this thread: adopt the visible history as seen. As before,
+        # a fresh install is told about the latest message; an upgraded one isn't.
+        await mark_seen(thread_key, ids)
+        if await get_last_seen_id(thread_key) is not None:
+            await set_last_seen_id(ids[-1], thread_key)
+            return
+        new = messages[-1:]
+        # Possibly hours old: not a measure of how quickly we notify
+        timed = False
+    else:
+        unseen = set(await filter_unseen(thread_key, ids))
+        if not unseen:
+            return
+        await mark_seen(thread_key, [i for i in ids if i in unseen])
+        # Only what comes after the newest message we already know is new. An
+        # unseen id above it is an old message whose hashed id changed (e.g. a
+        # duplicate text that lost its separator); it is adopted, not re-sent.
+        known = [i for i, message_id in enumerate(ids) if message_id not in unseen]
+        new = [m for m in messages[known[-1] + 1 if known else 0:] if m["id"] in unseen]
+        if not new:
+            return
+        timed = True
+
+    for message in new[-MAX_NOTIFICATIONS_PER_POLL:]:
+        stamps = latency_tracker.start(message, polled_at, extracted_at)
+        await set_last_seen_id(message["id"], thread_key)
+        stamps["committed"] = time.time()
+        decision = rules.evaluate(message["text"], message.get("sender"), thread_name)
+        events.publish(
+            "message", id=message["id"], text=message["text"], thread=thread_key,
+            sender=message.get("sender"), priority=decision["priority"], rule=decision["rule"],
+        )
+        events.publish("state", last_seen_id=message["id"])
+        if decision["priority"] == "low":
+            _low_priority.append(f"{label}: {message['text']}")
+        elif decision["priority"] != "drop":
+            # send_sms cuts the text to SMS_MAX_SEGMENTS; the SNS call blocks, so it
+            # runs off the event loop like every other send
+            stamps["sms_start"] = time.time()
+            await asyncio.to_thread(send_sms, settings.owner_phone, f"{label}: {message['text']}")
+            stamps["sms_done"] = time.time()
+        if timed:
+            latency_tracker.record(stamps)
+
+
+# Low-priority notifications waiting for the next digest SMS
+_low_priority: list[str] = []
+_last_digest = time.monotonic()
+
+
+async def _flush_low_priority() -> None:
+    """Text the pending low-priority messages as one digest every LOW_PRIORITY_DIGEST_MINUTES"""
+    global _last_digest
+    if not _low_priority or settings.low_priority_digest_minutes <= 0:
+        _low_priority.clear()
+        _last_digest = time.monotonic()
+        return
+    if time.monotonic() - _last_digest < settings.low_priority_digest_minutes * 60:
+        return
+    body = _digest_body(_low_priority)
+    _low_priority.clear()
+    _last_digest = time.monotonic()
+    await asyncio.to_thread(send_sms, settings.owner_phone, body, max_segments=settings.digest_max_segments)
+
+
+def _digest_body(entries: list[str]) -> str:
+    """
+    The digest text, within DIGEST_MAX_SEGMENTS: whole entries are left out
+    from the newest end (and counted) rather than cutting one mid-sentence.
+    """
+    header = f"IG digest ({len(entries)} low priority):"
+    body = "\n".join([header, *entries])
+    budget = settings.digest_max_segments
+    kept = len(entries)
+    while kept > 1 and budget and encode_for_sms(body, 0, settings.sms_transliterate)["segments"] > budget:
+        kept -= 1
+        body = "\n".join([header, *entries[:kept], f"(+{len(entries) - kept} more on the dashboard)"])
+    return body
+
+
+async def _poll_thread(page: Page) -> None:
+    thread_key = str(settings.ig_thread_url)
+    if thread_key in await _claim_threads([thread_key]):
+        await _notify_if_new(page, thread_key)
+
+
+async def _poll_inbox(page: Page) -> None:
+    """
+    One pass over the inbox list: compare every entry with the previous pass and
+    open only the conversations whose entry changed (and whose lease we hold).
+    """
+    if "/direct/" not in page.url:
+        # Someone navigated the shared page elsewhere (e.g. the remote browser)
+        await open_inbox_and_wait_ready(page)
+
+    entries = await _deadline(read_inbox(page), "read inbox")
+    if not entries:
+        return
+    previous = await get_inbox_snapshot()
+    owned = await _claim_threads([e["key"] for e in entries])
+    changed = changed_entries(entries, previous)
+    changed_keys = {e["key"] for e in changed}
+    # Only entries this pass is done with get their new signature: a thread another
+    # node owns, or one that didn't open, must still look changed next time
+    processed = {e["key"]: list(entry_signature(e)) for e in entries if e["key"] not in changed_keys}
+
+    for entry in changed:
+        if entry["key"] not in owned:
             continue
+        # A pass opening many threads is slow, not stuck
+        _beat()
+        if await _deadline(open_entry(page, entry["key"]), "open inbox entry"):
+            await _deadline(wait_for_settle(page), "settle")
+            await _notify_if_new(page, entry["key"], label=f"IG ({entry['name']})", thread_name=entry["name"])
+            processed[entry["key"]] = list(entry_signature(entry))
+
+    # Re-read: other nodes sharing the state database record their own entries
+    latest = await get_inbox_snapshot()
+    snapshot = {e["key"]: latest[e["key"]] for e in entries if e["key"] in latest}
+    snapshot.update(processed)
+    await set_inbox_snapshot(snapshot)
+
+
+# After falling back to the browser, wait this long before trying the HTTP backend again
+HTTP_RETRY_SECONDS = 30 * 60
+
+# Backend ("http" or "browser") that last polled each thread in this process,
+# and the texts of the messages that poll saw
+_polled_by: dict[str, str] = {}
+_last_visible: dict[str, list[str]] = {}
+
+
+def _overlap_end(previous: list[str], texts: list[str]) -> Optional[int]:
+    """Index in texts just after the longest run that ends the previous view, if any"""
+    for n in range(min(len(previous), len(texts)), 0, -1):
+        for end in range(len(texts), n - 1, -1):
+            if texts[end - n:end] == previous[-n:]:
+                return end
     return None
 
 
-async def _monitor_loop() -> None:
+async def _adopt_after_switch(thread_key: str, messages: list[dict], backend: str) -> None:
+    """
+    The two backends identify the same message differently: API "ig:" ids over
+    HTTP, DOM or hash ids in the browser. On a backend's first poll of a thread
+    after the other one polled it, the two views are lined up by message text
+    and everything up to the end of the previous view is adopted as seen, so
+    only what arrived since is notified. With nothing to line up with (the HTTP
+    backend's first poll in this process, e.g. right after enabling it), visible
+    messages that are all unknown are adopted.
+    """
+    if not messages:
+        return
+    texts = [m["text"] for m in messages]
+    previous_backend = _polled_by.get(thread_key)
+    previous_texts = _last_visible.get(thread_key)
+    _polled_by[thread_key] = backend
+    _last_visible[thread_key] = texts
+    if previous_backend == backend or (previous_backend is None and backend == "browser"):
+        return
+    if not await has_seen_any(thread_key):
+        return
+    ids = [m["id"] for m in messages]
+    unseen = set(await filter_unseen(thread_key, ids))
+    end = _overlap_end(previous_texts, texts) if previous_texts else None
+    if end is None:
+        if len(unseen) < len(ids):
+            return
+        end = len(messages)
+    adopted = [m["id"] for m in messages[:end] if m["id"] in unseen]
+    if adopted:
+        await mark_seen(thread_key, adopted)
+        logger.info(f"Adopted {len(adopted)} known messages of {thread_key} after switching to the {backend} backend")
+
+
+async def _open_http_client() -> Optional[InstagramHttpClient]:
+    """
+    HTTP client carrying the browser session's cookies. The cookies are exported
+    from the context (launching it once if no session was ever saved); the
+    browser is then closed unless someone is using it remotely.
+    """
+    if _context is None and not os.path.exists(storage_state_path()):
+        await _ensure_browser()
+    if _context is not None:
+        if time.monotonic() - _last_browser_activity > BROWSER_IDLE_SECONDS:
+            await close_browser()
+        else:
+            await _deadline(save_session(), "save session")
     try:
-        page = await _ensure_browser()
+        client = InstagramHttpClient(cookies_from_storage_state(storage_state_path()))
+    except SessionNeedsAttention as e:
+        logger.warning(f"HTTP backend unavailable ({e}); polling through the browser")
+        return None
+    logger.info("Polling through the HTTP backend")
+    return client
+
+
+async def _poll_http_messages(
+    thread_key: str,
+    messages: list[dict],
+    label: str = "IG",
+    polled_at: Optional[float] = None,
+    thread_name: Optional[str] = None,
+) -> None:
+    await _adopt_after_switch(thread_key, messages, "http")
+    await _notify_new_messages(thread_key, messages, label, polled_at, thread_name=thread_name)
+
+
+async def _poll_http(client: InstagramHttpClient, inbox_mode: bool) -> None:
+    polled_at = time.time()
+    if inbox_mode:
+        threads = await client.inbox()
+        owned = await _claim_threads([t["key"] for t in threads])
+        for thread in threads:
+            if thread["key"] in owned:
+                await _poll_http_messages(
+                    thread["key"], thread["messages"], f"IG ({thread['name']})", polled_at, thread["name"]
+                )
+        return
+    thread_key = str(settings.ig_thread_url)
+    if thread_key in await _claim_threads([thread_key]):
+        messages = await client.thread_messages(thread_id_from_url(thread_key) or thread_key)
+        await _poll_http_messages(thread_key, messages, polled_at=polled_at)
+
+
+async def _open_monitor_page(inbox_mode: bool) -> Page:
+    page = await _ensure_browser()
+    if inbox_mode:
+        await open_inbox_and_wait_ready(page)
+    else:
         await open_thread_and_wait_ready(page)
+    return page
+
+
+async def _monitor_loop() -> None:
+    inbox_mode = settings.monitor_mode == "inbox"
+    http_client: Optional[InstagramHttpClient] = None
+    http_retry_at = 0.0
+    page: Optional[Page] = None
+    try:
+        if settings.monitor_backend == "http":
+            http_client = await _open_http_client()
+        if http_client is None:
+            page = await _open_monitor_page(inbox_mode)
 
         while await is_running():
+            _beat()
             # Jittered sleep to avoid regular pattern
             base = max(10, settings.poll_seconds)
             jitter = random.uniform(-0.2, 0.2) * base
             sleep_for = int(base + jitter)
 
             try:
-                latest = await _extract_latest_message_id_and_text(page)
-                if latest:
-                    latest_id, latest_text = latest
-                    last_seen = await get_last_seen_id()
-                    if last_seen != latest_id:
-                        await set_last_seen_id(latest_id)
-                        preview = latest_text if len(latest_text) <= 300 else latest_text[:297] + "..."
-                        send_sms(settings.owner_phone, f"IG: {preview}")
+                if http_client is not None:
+                    await _poll_http(http_client, inbox_mode)
+                    # The API answered, so the session works
+                    note_login_state(True)
+                else:
+                    # The remote browser shares this page; polls go ahead of its input and screenshots
+                    async with page_scheduler.slot(PRIORITY_MONITOR, "monitor poll"):
+                        if inbox_mode:
+                            await _poll_inbox(page)
+                        else:
+                            await _poll_thread(page)
+                        # A session that expires mid-run shows up here, not only at startup
+                        note_login_state(await _deadline(is_logged_in(page), "login check"))
+                    # Strategy latencies and hit rates move on every poll, not only on a switch
+                    events.publish("state", extraction=strategy_tuner.summary())
+                events.publish(
+                    "poll", backend="http" if http_client is not None else "browser",
+                    url=page.url if page is not None else None,
+                )
+            except SessionNeedsAttention as e:
+                # Logged out or challenged: the browser path tells the owner and waits for the login
+                logger.warning(f"HTTP session needs attention ({e}); falling back to the browser")
+                events.publish("error", error=f"HTTP session needs attention: {e}")
+                await http_client.aclose()
+                http_client = None
+                http_retry_at = time.monotonic() + HTTP_RETRY_SECONDS
+                page = await _open_monitor_page(inbox_mode)
+            except PageOperationTimeout:
+                # A hung page won't recover by itself; let the supervisor recycle it
+                raise
+            except SchedulerBusy as e:
+                logger.warning(f"Skipping this poll: {e}")
+            except Exception as e:
+                events.publish("error", error=str(e))
+                await asyncio.to_thread(send_sms, settings.owner_phone, f"IG Monitor error: {e}")
+
+            try:
+                await _flush_low_priority()
             except Exception as e:
-                send_sms(settings.owner_phone, f"IG Monitor error: {e}")
+                logger.warning(f"Low-priority digest failed: {e}")
+
+            # Back to the HTTP backend once the browser has a working login again
+            if (
+                http_client is None and settings.monitor_backend == "http"
+                and _logged_in and time.monotonic() > http_retry_at
+            ):
+                http_client = await _open_http_client()
+                http_retry_at = time.monotonic() + HTTP_RETRY_SECONDS
+                if http_client is not None:
+                    page = None
+
+            # Idle point between polls: prune profile caches if maintenance asked for it
+            # and nobody is driving the page through the remote browser right now
+            if _maintenance_due and time.monotonic() - _last_browser_activity > 60:
+                _beat()
+                await _prune_profile()
+                if http_client is None:
+                    page = await _open_monitor_page(inbox_mode)
+
+            if time.monotonic() - _last_session_save > SESSION_SAVE_INTERVAL_SECONDS:
+                try:
+                    await _deadline(save_session(), "save session")
+                except Exception as e:
+                    logger.warning(f"Periodic session save failed: {e}")
 
             await asyncio.sleep(sleep_for)
             
@@ -215,8 +853,110 @@ async def _monitor_loop() -> None:
             if random.randint(1, 10) == 1:
                 gc.collect()
     finally:
-        # Do not close persistent context to preserve session across runs
-        pass
+        # Do not close persistent context to preserve session across runs;
+        # the HTTP client's pooled connection is cheap to reopen
+        if http_client is not None:
+            await http_client.aclose()
+
+
+# Restart backoff for the supervised monitor loop (seconds)
+RESTART_BACKOFF_INITIAL = 2
+RESTART_BACKOFF_MAX = 120
+# A loop that survived this long counts as healthy again and resets the backoff
+HEALTHY_RUN_SECONDS = 300
+
+
+def _browser_alive() -> bool:
+    if _page is None or _page.is_closed():
+        return False
+    if _browser is not None and not _browser.is_connected():
+        return False
+    return True
+
+
+# How often the watchdog checks the loop heartbeat (seconds)
+WATCHDOG_INTERVAL_SECONDS = 15
+
+
+async def _run_watched() -> None:
+    """Run the monitor loop under the watchdog; raise MonitorStalled if its heartbeat goes stale"""
+    _beat(publish=True)
+    loop_task = asyncio.create_task(_monitor_loop(), name="ig-monitor-loop")
+    try:
+        while True:
+            done, _ = await asyncio.wait({loop_task}, timeout=WATCHDOG_INTERVAL_SECONDS)
+            if done:
+                return loop_task.result()
+            age = time.monotonic() - (_heartbeat or 0)
+            if age > _stale_after():
+                loop_task.cancel()
+                try:
+                    await loop_task
+                except (asyncio.CancelledError, Exception):
+                    pass
+                raise MonitorStalled(f"no heartbeat for {age:.0f}s")
+    finally:
+        if not loop_task.done():
+            loop_task.cancel()
+
+
+async def _discard_browser() -> None:
+    """Close a dead or wedged browser; if even that hangs, drop our references to it"""
+    global _browser, _context, _page
+    try:
+        await asyncio.wait_for(close_browser(), timeout=30)
+    except Exception as e:
+        logger.warning(f"Browser did not close cleanly ({e}); abandoning it")
+        _browser = None
+        _context = None
+        _page = None
+
+
+async def _recycle_or_discard() -> None:
+    """A hung page with the browser still up: in storage_state mode a new context is enough"""
+    logger.warning("Page is stuck; replacing the browser context")
+    try:
+        await asyncio.wait_for(recycle_context(), timeout=30)
+    except Exception as e:
+        logger.warning(f"Could not replace the browser context ({e}); relaunching the browser")
+        await _discard_browser()
+
+
+async def _supervise() -> None:
+    """
+    Run the monitor loop until monitoring is turned off, restarting it with
+    exponential backoff when it crashes or the watchdog finds it stuck. The
+    browser is only relaunched when it actually died (crashed renderer, closed
+    page, disconnected browser) or a page call hung.
+    """
+    backoff = RESTART_BACKOFF_INITIAL
+    while await is_running():
+        started = time.monotonic()
+        recycle = False
+        try:
+            await _run_watched()
+            return
+        except asyncio.CancelledError:
+            raise
+        except (MonitorStalled, PageOperationTimeout) as e:
+            logger.error(f"Monitor loop hung: {e}; recycling the page")
+            events.publish("error", error=f"Monitor loop hung: {e}")
+            recycle = True
+        except Exception as e:
+            logger.error(f"Monitor loop crashed: {e}", exc_info=True)
+            events.publish("error", error=f"Monitor loop crashed: {e}")
+
+        if time.monotonic() - started > HEALTHY_RUN_SECONDS:
+            backoff = RESTART_BACKOFF_INITIAL
+        if recycle and _browser_alive() and settings.session_mode == "storage_state":
+            await _recycle_or_discard()
+        elif recycle or (is_browser_open() and not _browser_alive()):
+            logger.warning("Browser is stuck or gone; it will be relaunched on restart")
+            await _discard_browser()
+        logger.info(f"Restarting monitor loop in {backoff}s")
+        events.publish("state", restarting_in=backoff)
+        await asyncio.sleep(backoff)
+        backoff = min(backoff * 2, RESTART_BACKOFF_MAX)
 
 
 def is_monitor_running() -> bool:
@@ -229,13 +969,21 @@ async def start_monitor() -> str:
         return "already_running"
     await set_running(True)
     loop = asyncio.get_running_loop()
-    _monitor_task = loop.create_task(_monitor_loop(), name="ig-monitor")
+    _monitor_task = loop.create_task(_supervise(), name="ig-monitor")
+    events.publish("state", running=True)
     return "started"
 
 
-async def stop_monitor() -> str:
+async def resume_monitor_if_enabled() -> Optional[str]:
+    """On startup: restart monitoring if it was running before the process went away"""
+    if await is_running():
+        logger.info("Monitor was running before restart; resuming")
+        return await start_monitor()
+    return None
+
+
+async def _cancel_monitor_task() -> None:
     global _monitor_task
-    await set_running(False)
     if _monitor_task and not _monitor_task.done():
         _monitor_task.cancel()
         try:
@@ -243,11 +991,47 @@ async def stop_monitor() -> str:
         except asyncio.CancelledError:
             pass
     _monitor_task = None
+
+
+async def stop_monitor() -> str:
+    await set_running(False)
+    await _cancel_monitor_task()
+    events.publish("state", running=False)
+    # Hand our leases back immediately instead of waiting for them to expire
+    await get_coordinator().leave()
     return "stopped"
 
 
+async def shutdown() -> None:
+    """
+    App shutdown: stop the loop without clearing the persisted running flag (so it
+    resumes after a restart), release leases, close the browser and stop the driver.
+    """
+    global _playwright
+    await _cancel_monitor_task()
+    if _launch_task is not None and not _launch_task.done():
+        _launch_task.cancel()
+        try:
+            await _launch_task
+        except BaseException:
+            pass
+    try:
+        await get_coordinator().leave()
+    except Exception as e:
+        logger.warning(f"Could not release leases on shutdown: {e}")
+    await close_browser()
+    if _playwright is not None:
+        try:
+            await _playwright.stop()
+        except Exception as e:
+            logger.warning(f"Error stopping Playwright driver: {e}")
+        _playwright = None
+
+
 async def get_browser_page() -> Page:
     """Get the browser page for remote interaction"""
+    global _last_browser_activity
+    _last_browser_activity = time.monotonic()
     return await _ensure_browser()
 
 
@@ -0,0 +1,131 @@
+import logging
+import os
+import shutil
+import time
+from typing import Dict, Optional
+
+from ig_monitor.config import get_settings
+
+
+logger = logging.getLogger(__name__)
+
+settings = get_settings()
+
+# Chromium cache directories that are rebuilt on demand. None of them hold
+# cookies, Local Storage or IndexedDB, so deleting them keeps the login.
+PRUNABLE_DIRS = (
+    "Cache",
+    "Code Cache",
+    "GPUCache",
+    "DawnCache",
+    "DawnGraphiteCache",
+    "DawnWebGPUCache",
+    "GraphiteDawnCache",
+    "GrShaderCache",
+    "ShaderCache",
+    os.path.join("Service Worker", "CacheStorage"),
+    os.path.join("Service Worker", "ScriptCache"),
+    os.path.join("Crashpad", "completed"),
+    os.path.join("Crashpad", "pending"),
+)
+
+# Latest usage report, served by the dashboard without walking the disk again
+last_report: Optional[Dict] = None
+
+
+def _dir_size(path: str) -> int:
+    total = 0
+    stack = [path]
+    while stack:
+        current = stack.pop()
+        try:
+            with os.scandir(current) as entries:
+                for entry in entries:
+                    try:
+                        if entry.is_dir(follow_symlinks=False):
+                            stack.append(entry.path)
+                        else:
+                            total += entry.stat(follow_symlinks=False).st_size
+                    except OSError:
+                        continue
+        except OSError:
+            continue
+    return total
+
+
+def _entry_size(path: str) -> int:
+    if os.path.isdir(path) and not os.path.islink(path):
+        return _dir_size(path)
+    try:
+        return os.path.getsize(path)
+    except OSError:
+        return 0
+
+
+def user_data_dir() -> str:
+    return os.path.join(settings.data_dir, settings.user_data_dir_name)
+
+
+def usage_report() -> Dict:
+    """
+    Sizes (bytes) of everything under DATA_DIR, with the browser profile broken
+    down per subdirectory (profile root and its Default/ profile). Blocking; run in a thread.
+    """
+    global last_report
+    profile_dir = user_data_dir()
+    profile: Dict[str, int] = {}
+    for base in (profile_dir, os.path.join(profile_dir, "Default")):
+        if not os.path.isdir(base):
+            continue
+        prefix = os.path.relpath(base, profile_dir)
+        for name in os.listdir(base):
+            if base == profile_dir and name == "Default":
+                continue
+            key = name if prefix == "." else os.path.join(prefix, name)
+            profile[key] = _entry_size(os.path.join(base, name))
+
+    other: Dict[str, int] = {}
+    if os.path.isdir(settings.data_dir):
+        for name in os.listdir(settings.data_dir):
+            if name != settings.user_data_dir_name:
+                other[name] = _entry_size(os.path.join(settings.data_dir, name))
+
+    profile_total = sum(profile.values())
+    last_report = {
+        "generated_at": time.time(),
+        "profile_total": profile_total,
+        "prunable": sum(size for name, size in profile.items() if _is_prunable(name)),
+        "profile": dict(sorted(profile.items(), key=lambda kv: kv[1], reverse=True)),
+        "data_dir": other,
+        "total": profile_total + sum(other.values()),
+    }
+    return last_report
+
+
+def _is_prunable(rel_path: str) -> bool:
+    """Whether a reported entry is deleted wholesale by prune_caches (for the estimate)"""
+    if rel_path.startswith("Default" + os.sep):
+        rel_path = rel_path[len("Default" + os.sep):]
+    return rel_path in PRUNABLE_DIRS
+
+
+def prune_caches() -> int:
+    """
+    Delete the cache directories of the profile. Must only run while no browser
+    has the profile open. Blocking; run in a thread. Returns bytes freed.
+    """
+    profile_dir = user_data_dir()
+    freed = 0
+    for base in (profile_dir, os.path.join(profile_dir, "Default")):
+        for rel in PRUNABLE_DIRS:
+            path = os.path.join(base, rel)
+            if os.path.isdir(path) and not os.path.islink(path):
+                size = _dir_size(path)
+                shutil.rmtree(path, ignore_errors=True)
+                freed += size
+    logger.info(f"Pruned {freed / 1e6:.1f} MB of browser profile caches")
+    return freed
+
+
+def over_budget(report: Dict) -> bool:
+    return report["profile_total"] > settings.profile_budget_mb * 1024 * 1024
@@ -0,0 +1,212 @@
+import json
+import logging
+import os
+import re
+from typing import Any, Dict, List, Optional, Tuple
+
+from ig_monitor.config import get_settings
+
+
+logger = logging.getLogger(__name__)
+
+settings = get_settings()
+
+# Priority levels, most urgent first. "high"/"normal" are texted right away,
+# "low" goes into the periodic digest, "drop" is never texted.
+PRIORITIES = ("high", "normal", "low", "drop")
+
+# Example rules file (DATA_DIR/rules.json or RULES_PATH):
+#
+# {
+#   "default_priority": "normal",
+#   "exclude_keywords": ["giveaway"],
+#   "deny_senders": ["spam_account"],
+#   "allow_senders": [],
+#   "include_keywords": [],
+#   "rules": [
+#     {"name": "urgent", "keywords": ["urgent", "call me"], "priority": "high"},
+#     {"name": "family", "senders": ["Mom"], "priority": "high"},
+#     {"name": "reactions", "keywords": ["[like]", "haha"], "priority": "low"}
+#   ]
+# }
+#
+# Keywords match case-insensitively on word boundaries, senders by exact
+# (case-insensitive) display name: the full name Instagram shows, or the
+# username when there is none. The HTTP backend maps user ids to the same
+# names; a sender it can't name is matched by user id. When several rules match, the
+# most urgent priority wins. Deny/exclude always drop; a non-empty allow list
+# or include list drops everything it doesn't match.
+#
+# The page doesn't always say who sent a message. Then the thread's name
+# stands in for the sender (a 1:1 thread is named after the other person). If
+# that is unknown too, sender lists can't match: the allow list is skipped
+# rather than dropping every unattributed message, and deny/sender rules don't
+# apply.
+
+
+_LIST_KEYS = ("exclude_keywords", "include_keywords", "allow_senders", "deny_senders")
+
+
+def _shape_problem(config: Any) -> Optional[str]:
+    """What is structurally wrong with a parsed rules file, or None"""
+    if not isinstance(config, dict):
+        return f"expected a JSON object, got {type(config).__name__}"
+    for key in _LIST_KEYS:
+        values = config.get(key, [])
+        if not isinstance(values, list) or not all(isinstance(v, str) for v in values):
+            return f"{key} must be a list of strings"
+    rules = config.get("rules", [])
+    if not isinstance(rules, list):
+        return "rules must be a list"
+    for index, rule in enumerate(rules):
+        if not isinstance(rule, dict):
+            return f"rule {index + 1} must be an object"
+        for key in ("keywords", "senders"):
+            values = rule.get(key, [])
+            if not isinstance(values, list) or not all(isinstance(v, str) for v in values):
+                return f"rule {index + 1}: {key} must be a list of strings"
+    return None
+
+
+def _norm(value: str) -> str:
+    return value.strip().casefold()
+
+
+class RuleSet:
+    """
+    Rules compiled into one combined regex over all keywords plus hash lookups
+    for senders, so evaluating a message costs one scan whatever the rule count.
+    """
+
+    def __init__(self, config: Optional[Dict[str, Any]] = None):
+        config = config or {}
+        self.default_priority = config.get("default_priority", "normal")
+        if self.default_priority not in PRIORITIES:
+            raise ValueError(f"Unknown default_priority: {self.default_priority}")
+
+        # keyword -> rule indexes; rule -1 is the exclude list, -2 the include list
+        keyword_rules: Dict[str, set] = {}
+        self._sender_rules: Dict[str, set] = {}
+        self._rules: List[Tuple[str, str]] = []
+        for index, rule in enumerate(config.get("rules", [])):
+            priority = rule.get("priority", "normal")
+            if priority not in PRIORITIES:
+                raise ValueError(f"Rule {rule.get('name', index)}: unknown priority {priority}")
+            self._rules.append((rule.get("name") or f"rule {index + 1}", priority))
+            for keyword in rule.get("keywords", []):
+                keyword_rules.setdefault(_norm(keyword), set()).add(index)
+            for sender in rule.get("senders", []):
+                self._sender_rules.setdefault(_norm(sender), set()).add(index)
+        for keyword in config.get("exclude_keywords", []):
+            keyword_rules.setdefault(_norm(keyword), set()).add(-1)
+        for keyword in config.get("include_keywords", []):
+            keyword_rules.setdefault(_norm(keyword), set()).add(-2)
+        keyword_rules.pop("", None)
+
+        self._has_include = bool(config.get("include_keywords"))
+        self._allow = {_norm(s) for s in config.get("allow_senders", [])}
+        self._deny = {_norm(s) for s in config.get("deny_senders", [])}
+
+        # A combined alternation only reports the longest keyword starting at a
+        # position, so fold shorter keywords that are whole-word prefixes of a
+        # longer one into the longer one's rule set.
+        by_length = sorted(keyword_rules, key=len, reverse=True)
+        self._keyword_rules = {}
+        for keyword in by_length:
+            rules = set(keyword_rules[keyword])
+            for other in keyword_rules:
+                if len(other) < len(keyword) and keyword.startswith(other) and not keyword[len(other)].isalnum():
+                    rules |= keyword_rules[other]
+            self._keyword_rules[keyword] = rules
+
+        # Lookahead so overlapping keywords at different positions are all found;
+        # word boundaries only where the keyword itself starts/ends with a word char
+        alternatives = [
+            (r"\b" if k[0].isalnum() else "") + re.escape(k) + (r"\b" if k[-1].isalnum() else "")
+            for k in by_length
+        ]
+        self._pattern = re.compile("(?=(" + "|".join(alternatives) + "))", re.IGNORECASE) if alternatives else None
+
+    def __len__(self) -> int:
+        return len(self._rules)
+
+    def _matched_rules(self, text: str, sender: Optional[str]) -> set:
+        matched: set = set()
+        if self._pattern is not None:
+            for match in self._pattern.finditer(text):
+                matched |= self._keyword_rules.get(_norm(match.group(1)), set())
+        if sender:
+            matched |= self._sender_rules.get(_norm(sender), set())
+        return matched
+
+    def evaluate(self, text: str, sender: Optional[str] = None, thread_name: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Priority for a message: {"priority": ..., "rule": name of the deciding rule or None}.
+        thread_name stands in for an unknown sender.
+        """
+        sender = sender or thread_name
+        sender_key = _norm(sender) if sender else None
+        if sender_key in self._deny:
+            return {"priority": "drop", "rule": "deny_senders"}
+        if self._allow and sender_key is not None and sender_key not in self._allow:
+            return {"priority": "drop", "rule": "allow_senders"}
+
+        matched = self._matched_rules(text, sender)
+        if -1 in matched:
+            return {"priority": "drop", "rule": "exclude_keywords"}
+        if self._has_include and -2 not in matched:
+            return {"priority": "drop", "rule": "include_keywords"}
+
+        best = None
+        # Ties go to the rule listed first
+        for index in sorted(matched):
+            if index < 0:
+                continue
+            name, priority = self._rules[index]
+            if best is None or PRIORITIES.index(priority) < PRIORITIES.index(best[1]):
+                best = (name, priority)
+        if best is None:
+            return {"priority": self.default_priority, "rule": None}
+        return {"priority": best[1], "rule": best[0]}
+
+
+def rules_path() -> str:
+    return settings.rules_path or os.path.join(settings.data_dir, "rules.json")
+
+
+_ruleset = RuleSet()
+_loaded_mtime: Optional[float] = None
+
+
+def get_rules() -> RuleSet:
+    """The compiled rules, recompiled when the rules file changes (no file: everything is normal)"""
+    global _ruleset, _loaded_mtime
+    path = rules_path()
+    try:
+        mtime = os.stat(path).st_mtime
+    except OSError:
+        mtime = None
+    if mtime != _loaded_mtime:
+        _loaded_mtime = mtime
+        if mtime is None:
+            _ruleset = RuleSet()
+        else:
+            try:
+                with open(path, "r", encoding="utf-8") as fh:
+                    config = json.load(fh)
+                problem = _shape_problem(config)
+                if problem:
+                    # Valid JSON but not rules: evaluating it would fail on every message
+                    logger.error(f"Invalid rules file {path}: {problem}; using the default rules")
+                    _ruleset = RuleSet()
+                else:
+                    _ruleset = RuleSet(config)
+                    logger.info(f"Loaded {len(_ruleset)} notification rules from {path}")
+            except (OSError, ValueError) as e:
+                # Keep the previous rules rather than texting everything (or nothing)
+                logger.error(f"Invalid rules file {path}: {e}")
+    return _ruleset
+
+
+def evaluate(text: str, sender: Optional[str] = None, thread_name: Optional[str] = None) -> Dict[str, Any]:
+    return get_rules().evaluate(text, sender, thread_name)
@@ -0,0 +1,212 @@
+"""
+On-demand sampling CPU profiler for the running process.
+
+A background thread reads every thread's Python stack (sys._current_frames)
+INTERVAL_SECONDS apart for the requested time, without tracing hooks, so the
+cost is a few microseconds per sample and nothing at all outside a profile.
+On an event loop thread the stack is tagged with the asyncio task that was
+running (e.g. "task:ig-monitor-loop"), so the monitor loop, browser handlers
+and requests can be told apart. Samples of threads that were only waiting
+(idle event loop, parked executor threads) are counted but left out of the
+stacks.
+
+The result is in the "collapsed stacks" format (one "frame;frame;frame count"
+line per distinct stack), which flamegraph tools read, and render_svg() draws
+a self-contained flamegraph from it.
+"""
+import asyncio
+import html
+import os
+import sys
+import threading
+import time
+import zlib
+from typing import Any, Dict, List, Optional
+
+
+# Sampling period; ~100 samples per second per thread
+INTERVAL_SECONDS = 0.01
+# Longest profile one request can ask for
+MAX_SECONDS = 30
+
+# Innermost frames that mean the thread is blocked, not using CPU
+IDLE_FRAMES = {
+    ("selectors.py", "select"),
+    ("threading.py", "wait"),
+    ("threading.py", "_wait_for_tstate_lock"),
+    ("queue.py", "get"),
+    ("thread.py", "_worker"),
+    ("socket.py", "accept"),
+}
+
+_lock = asyncio.Lock()
+
+
+class ProfilerBusy(RuntimeError):
+    """Another profile is already running in this process"""
+
+
+def _frame_label(code) -> str:
+    return f"{getattr(code, 'co_qualname', code.co_name)} ({os.path.basename(code.co_filename)})"
+
+
+def _running_tasks() -> Dict[int, asyncio.Task]:
+    """Thread id -> the asyncio task running on that thread's event loop right now"""
+    tasks = {}
+    for loop, task in list(getattr(asyncio.tasks, "_current_tasks", {}).items()):
+        thread_id = getattr(loop, "_thread_id", None)
+        if thread_id is not None and task is not None:
+            tasks[thread_id] = task
+    return tasks
+
+
+def _task_label(task: asyncio.Task) -> str:
+    name = task.get_name()
+    if name.startswith("Task-"):
+        # Unnamed (e.g. a request handled by uvicorn): say what it runs instead
+        coro = task.get_coro()
+        name = getattr(coro, "__qualname__", None) or name
+    # ";" separates frames in the collapsed format
+    return f"task:{name.replace(';', ',')}"
+
+
+def _stack(frame, thread_name: str, task: Optional[asyncio.Task]) -> Optional[List[str]]:
+    """Outermost-first frame labels, or None if the thread is idle"""
+    codes = []
+    while frame is not None:
+        codes.append(frame.f_code)
+        frame = frame.f_back
+    codes.reverse()
+    if not codes or (os.path.basename(codes[-1].co_filename), codes[-1].co_name) in IDLE_FRAMES:
+        return None
+    stack = [f"thread:{thread_name}"]
+    for code in codes:
+        stack.append(_frame_label(code))
+        # The running task's coroutine frames follow the loop's Handle._run
+        if task is not None and code.co_name == "_run" and code.co_filename.endswith(os.path.join("asyncio", "events.py")):
+            stack.append(_task_label(task))
+    return stack
+
+
+class _Sampler(threading.Thread):
+    def __init__(self, interval: float):
+        super().__init__(name="cpu-sampler", daemon=True)
+        self.interval = interval
+        self.stop = threading.Event()
+        self.stacks: Dict[str, int] = {}
+        self.samples = 0
+        self.idle = 0
+
+    def run(self) -> None:
+        own = threading.get_ident()
+        while not self.stop.wait(self.interval):
+            names = {t.ident: t.name for t in threading.enumerate()}
+            tasks = _running_tasks()
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own:
+                    continue
+                stack = _stack(frame, names.get(thread_id, str(thread_id)), tasks.get(thread_id))
+                self.samples += 1
+                if stack is None:
+                    self.idle += 1
+                    continue
+                key = ";".join(stack)
+                self.stacks[key] = self.stacks.get(key, 0) + 1
+
+
+async def profile(seconds: float, interval: float = INTERVAL_SECONDS) -> Dict[str, Any]:
+    """Sample every thread for seconds (capped at MAX_SECONDS); one profile at a time"""
+    if _lock.locked():
+        raise ProfilerBusy("A profile is already running")
+    seconds = min(max(float(seconds), interval), MAX_SECONDS)
+    async with _lock:
+        sampler = _Sampler(interval)
+        started = time.perf_counter()
+        sampler.start()
+        try:
+            await asyncio.sleep(seconds)
+        finally:
+            sampler.stop.set()
+            await asyncio.to_thread(sampler.join)
+        return {
+            "pid": os.getpid(),
+            "seconds": round(time.perf_counter() - started, 3),
+            "interval": interval,
+            "samples": sampler.samples,
+            "idle": sampler.idle,
+            "stacks": sampler.stacks,
+        }
+
+
+def collapsed(stacks: Dict[str, int]) -> str:
+    """The collapsed-stacks text flamegraph.pl, speedscope and friends read"""
+    return "".join(f"{stack} {count}\n" for stack, count in sorted(stacks.items()))
+
+
+# Flamegraph geometry (px)
+SVG_WIDTH = 1200
+FRAME_HEIGHT = 16
+# Frames narrower than this are left out
+MIN_FRAME_WIDTH = 0.5
+
+
+def _tree(stacks: Dict[str, int]) -> Dict[str, Any]:
+    root: Dict[str, Any] = {"value": 0, "children": {}}
+    for stack, count in stacks.items():
+        root["value"] += count
+        node = root
+        for name in stack.split(";"):
+            node = node["children"].setdefault(name, {"value": 0, "children": {}})
+            node["value"] += count
+    return root
+
+
+def _depth(node: Dict[str, Any]) -> int:
+    return 1 + max((_depth(child) for child in node["children"].values()), default=0)
+
+
+def _color(name: str) -> str:
+    if name.startswith(("task:", "thread:")):
+        return "rgb(120,160,220)"
+    # Stable warm colours, so the same frame looks the same in every profile
+    h = zlib.crc32(name.encode("utf-8"))
+    return f"rgb({205 + h % 50},{80 + (h >> 8) % 120},{(h >> 16) % 60})"
+
+
+def render_svg(stacks: Dict[str, int], title: str = "CPU profile") -> str:
+    """A flamegraph (root at the bottom) as a standalone SVG with hover tooltips"""
+    root = _tree(stacks)
+    total = root["value"] or 1
+    height = (_depth(root) + 1) * FRAME_HEIGHT + 30
+    scale = SVG_WIDTH / total
+    parts = [
+        f'<svg xmlns="http://www.w3.org/2000/svg" width="{SVG_WIDTH}" height="{height}" '
+        f'font-family="Verdana, sans-serif" font-size="11">',
+        '<rect width="100%" height="100%" fill="#f8f8f8"/>',
+        f'<text x="{SVG_WIDTH / 2}" y="18" text-anchor="middle" font-size="14">'
+        f'{html.escape(title)} ({root["value"]} samples)</text>',
+    ]
+
+    def draw(node: Dict[str, Any], x: float, depth: int) -> None:
+        for name, child in sorted(node["children"].items()):
+            width = child["value"] * scale
+            if width >= MIN_FRAME_WIDTH:
+                y = height - (depth + 1) * FRAME_HEIGHT
+                label = html.escape(name)
+                percent = 100 * child["value"] / total
+                parts.append(
+                    f'<g><title>{label} ({child["value"]} samples, {percent:.1f}%)</title>'
+                    f'<rect x="{x:.1f}" y="{y}" width="{width:.1f}" height="{FRAME_HEIGHT - 1}" '
+                    f'fill="{_color(name)}" rx="2"/>'
+                )
+                chars = int((width - 6) / 7)
+                if chars >= 3:
+                    text = name if len(name) <= chars else name[:chars - 2] + ".."
+                    parts.append(f'<text x="{x + 3:.1f}" y="{y + FRAME_HEIGHT - 4}">{html.escape(text)}</text>')
+                parts.append("</g>")
+                draw(child, x, depth + 1)
+            x += width
+
+    draw(root, 0.0, 0)
+    parts.append("</svg>")
+    return "\n".join(parts)
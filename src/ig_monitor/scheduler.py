@@ -0,0 +1,145 @@
+import asyncio
+import heapq
+import itertools
+import logging
+import math
+import time
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Dict, List, Optional, Tuple
+
+
+logger = logging.getLogger(__name__)
+
+# Page operation priorities, lower runs first
+PRIORITY_MONITOR = 0
+PRIORITY_INPUT = 1
+PRIORITY_SCREENSHOT = 2
+
+# Admission limits: operations allowed to wait per priority. Only the newest
+# screenshot is worth taking, so a new one replaces the one still waiting.
+MAX_WAITING = {PRIORITY_MONITOR: 4, PRIORITY_INPUT: 16, PRIORITY_SCREENSHOT: 1}
+# Longest an operation may wait for the page before it is turned away (seconds)
+MAX_WAIT_SECONDS = {PRIORITY_MONITOR: 120.0, PRIORITY_INPUT: 20.0, PRIORITY_SCREENSHOT: 8.0}
+
+
+class SchedulerBusy(Exception):
+    """The page is too busy to take this operation; try again after retry_after seconds"""
+
+    def __init__(self, message: str, retry_after: float):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class PageScheduler:
+    """
+    Gives the shared page to one operation at a time, highest priority first
+    (monitor extraction > remote-browser input > screenshots), FIFO within a
+    priority. Waiting operations are bounded instead of piling up.
+    """
+
+    def __init__(self):
+        self._busy = False
+        self._holder = ""
+        # (task, priority, kind) of the slot() block holding the page
+        self._owner: Optional[Tuple[asyncio.Task, int, str]] = None
+        self._waiting: List[Tuple[int, int, asyncio.Future, str]] = []
+        self._seq = itertools.count()
+        # Moving average of how long an operation holds the page, for Retry-After
+        self._avg_hold = 1.0
+        self.stats: Dict[str, int] = {"granted": 0, "rejected": 0, "superseded": 0, "timed_out": 0}
+
+    def queue_depth(self) -> int:
+        return sum(1 for entry in self._waiting if not entry[2].done())
+
+    def retry_after(self) -> int:
+        return max(1, math.ceil(self._avg_hold * (self.queue_depth() + 1)))
+
+    def _reject(self, future: asyncio.Future, reason: str) -> None:
+        if not future.done():
+            future.set_exception(SchedulerBusy(reason, self.retry_after()))
+
+    def _grant_next(self) -> None:
+        while self._waiting:
+            _, _, future, kind = heapq.heappop(self._waiting)
+            if not future.done():
+                self._holder = kind
+                future.set_result(None)
+                return
+        self._busy = False
+        self._holder = ""
+
+    async def _acquire(self, priority: int, kind: str) -> None:
+        if not self._busy:
+            self._busy = True
+            self._holder = kind
+            return
+
+        waiting = [e for e in self._waiting if e[0] == priority and not e[2].done()]
+        if priority == PRIORITY_SCREENSHOT:
+            for entry in waiting:
+                self.stats["superseded"] += 1
+                self._reject(entry[2], "superseded by a newer screenshot")
+        elif len(waiting) >= MAX_WAITING[priority]:
+            self.stats["rejected"] += 1
+            raise SchedulerBusy(f"page busy ({self._holder}); {len(waiting)} {kind} operations waiting", self.retry_after())
+
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiting, (priority, next(self._seq), future, kind))
+        try:
+            await asyncio.wait_for(asyncio.shield(future), timeout=MAX_WAIT_SECONDS[priority])
+        except asyncio.TimeoutError:
+            if future.done() and not future.cancelled() and future.exception() is None:
+                # Granted just as the wait timed out: pass the page on
+                self._grant_next()
+            self.stats["timed_out"] += 1
+            self._reject(future, "timed out")
+            raise SchedulerBusy(f"waited {MAX_WAIT_SECONDS[priority]:.0f}s for the page ({self._holder})", self.retry_after()) from None
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled() and future.exception() is None:
+                self._grant_next()
+            else:
+                future.cancel()
+            raise
+
+    @asynccontextmanager
+    async def slot(self, priority: int, kind: str) -> AsyncIterator[None]:
+        """Hold the page for the duration of the block"""
+        await self._acquire(priority, kind)
+        task = asyncio.current_task()
+        self._owner = (task, priority, kind)
+        self.stats["granted"] += 1
+        started = time.monotonic()
+        try:
+            yield
+        finally:
+            # Not held any more if released() couldn't take the page back
+            if self._owner is not None and self._owner[0] is task:
+                self._owner = None
+                self._avg_hold = 0.8 * self._avg_hold + 0.2 * (time.monotonic() - started)
+                self._grant_next()
+
+    @asynccontextmanager
+    async def released(self) -> AsyncIterator[None]:
+        """
+        Inside a slot() block: let waiting operations have the page for the
+        duration of this block (e.g. while waiting for someone to log in through
+        the remote browser), then take it back at the same priority. Does
+        nothing if this task doesn't hold the page. Raises SchedulerBusy if the
+        page can't be taken back in time.
+        """
+        task = asyncio.current_task()
+        if self._owner is None or self._owner[0] is not task:
+            yield
+            return
+        _, priority, kind = self._owner
+        self._owner = None
+        self._grant_next()
+        try:
+            yield
+        finally:
+            await self._acquire(priority, kind)
+            self._owner = (task, priority, kind)
+
+
+# Shared by the monitor loop and the remote browser endpoints
+page_scheduler = PageScheduler()
@@ -0,0 +1,106 @@
+import asyncio
+import logging
+import time
+from typing import Dict, Optional
+
+from playwright.async_api import Page, Request
+
+from ig_monitor.config import get_settings
+
+
+logger = logging.getLogger(__name__)
+
+settings = get_settings()
+
+# Requests in flight longer than this are treated as long-polls/streams and don't
+# count against network quiet (otherwise IG's realtime connections never settle).
+LONG_REQUEST_SECONDS = 2.0
+
+# Resolves once the DOM has had no mutations for quietMs, or after maxMs at the latest.
+SETTLE_JS = """
+([quietMs, maxMs]) => new Promise((resolve) => {
+    const start = performance.now();
+    let last = start;
+    const root = document.documentElement || document;
+    const observer = new MutationObserver(() => { last = performance.now(); });
+    observer.observe(root, { subtree: true, childList: true, attributes: true, characterData: true });
+    const tick = () => {
+        const now = performance.now();
+        if (now - last >= quietMs || now - start >= maxMs) {
+            observer.disconnect();
+            resolve({ settled: now - last >= quietMs, waited: now - start });
+        } else {
+            setTimeout(tick, Math.min(quietMs - (now - last), maxMs - (now - start)));
+        }
+    };
+    setTimeout(tick, quietMs);
+})
+"""
+
+
+class _NetworkTracker:
+    """Counts in-flight requests for one page and when the network last changed."""
+
+    def __init__(self, page: Page):
+        self._inflight: Dict[Request, float] = {}
+        self.last_activity = time.monotonic()
+        page.on("request", self._on_start)
+        page.on("requestfinished", self._on_end)
+        page.on("requestfailed", self._on_end)
+
+    def _on_start(self, request: Request) -> None:
+        now = time.monotonic()
+        self._inflight[request] = now
+        self.last_activity = now
+
+    def _on_end(self, request: Request) -> None:
+        self._inflight.pop(request, None)
+        self.last_activity = time.monotonic()
+
+    def quiet_seconds(self) -> float:
+        """Seconds the network has been idle (0 while short-lived requests are pending)"""
+        now = time.monotonic()
+        if any(now - started < LONG_REQUEST_SECONDS for started in self._inflight.values()):
+            return 0.0
+        return now - self.last_activity
+
+
+_trackers: Dict[int, _NetworkTracker] = {}
+
+
+def track_network(page: Page) -> None:
+    """Start counting requests for page; call right after creating it"""
+    if id(page) not in _trackers:
+        _trackers[id(page)] = _NetworkTracker(page)
+        page.on("close", lambda _: _trackers.pop(id(page), None))
+
+
+async def wait_for_settle(page: Page, quiet_ms: Optional[int] = None, max_ms: Optional[int] = None) -> bool:
+    """
+    Wait until the page has had no DOM mutations and no new/pending requests for
+    quiet_ms, giving up after max_ms. Returns True if it settled, False on the cap.
+    """
+    quiet_ms = settings.settle_quiet_ms if quiet_ms is None else quiet_ms
+    max_ms = settings.settle_max_ms if max_ms is None else max_ms
+    track_network(page)
+    tracker = _trackers[id(page)]
+    quiet = quiet_ms / 1000
+    deadline = time.monotonic() + max_ms / 1000
+
+    while True:
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            return False
+        try:
+            dom = await page.evaluate(SETTLE_JS, [quiet_ms, int(remaining * 1000)])
+        except Exception as e:
+            # Execution context destroyed mid-wait means a navigation happened: not settled yet
+            logger.debug(f"Settle check interrupted: {e}")
+            await asyncio.sleep(min(quiet, max(0.0, deadline - time.monotonic())))
+            continue
+        if not dom.get("settled"):
+            return False
+        network_quiet = tracker.quiet_seconds()
+        if network_quiet >= quiet:
+            return True
+        await asyncio.sleep(min(quiet - network_quiet, max(0.0, deadline - time.monotonic())))
@@ -1,8 +1,11 @@
 import logging
+import unicodedata
+from typing import Dict, List, Optional
 
 import boto3
 
 from ig_monitor.config import get_settings
+from ig_monitor import events
 
 logger = logging.getLogger(__name__)
 
@@ -16,18 +19,202 @@ _sns = boto3.client(
 )
 
 
-def send_sms(to_number: str, body: str) -> None:
+# GSM 03.38 default alphabet (one septet each) and its extension table (escape + char)
+GSM7_BASIC = set(
+    "@£$¥èéùìòÇ\nØø\rÅåΔ_ΦΓΛΩΠΨΣΘΞÆæßÉ !\"#¤%&'()*+,-./0123456789:;<=>?"
+    "¡ABCDEFGHIJKLMNOPQRSTUVWXYZÄÖÑÜ§¿abcdefghijklmnopqrstuvwxyzäöñüà"
+)
+GSM7_EXTENDED = set("^{}\\[~]|€\f")
+
+# Capacity per segment: single message / each part of a concatenated message
+GSM7_SEGMENT = (160, 153)
+UCS2_SEGMENT = (70, 67)
+
+# Typographic characters phones and IG love, mapped to GSM-7 look-alikes.
+# Applied always: the meaning is unchanged and it often avoids UCS-2 entirely.
+_PUNCTUATION = {
+    "\u2018": "'", "\u2019": "'", "\u201a": "'", "\u201b": "'", "\u2032": "'", "`": "'", "\u00b4": "'",
+    "\u201c": '"', "\u201d": '"', "\u201e": '"', "\u201f": '"', "\u2033": '"', "\u00ab": '"', "\u00bb": '"',
+    "\u2010": "-", "\u2011": "-", "\u2013": "-", "\u2014": "-", "\u2015": "-", "\u2212": "-",
+    "\u2026": "...", "\u2022": "*", "\u00b7": "*", "\t": " ",
+    "\u00a0": " ", "\u2002": " ", "\u2003": " ", "\u2009": " ", "\u202f": " ",
+}
+# Invisible characters (zero-width spaces/joiners, emoji variation selectors, BOM)
+# that would force UCS-2 for nothing
+_INVISIBLE = {"\u200b", "\u200c", "\u200d", "\u2060", "\ufe0e", "\ufe0f", "\ufeff"}
+
+
+def _septets(ch: str) -> int:
+    return 2 if ch in GSM7_EXTENDED else 1
+
+
+def _utf16_units(ch: str) -> int:
+    return 2 if ord(ch) > 0xFFFF else 1
+
+
+def is_gsm7(text: str) -> bool:
+    return all(ch in GSM7_BASIC or ch in GSM7_EXTENDED for ch in text)
+
+
+def _costs(text: str, gsm7: bool) -> List[int]:
+    return [_septets(ch) if gsm7 else _utf16_units(ch) for ch in text]
+
+
+def _segments(costs: List[int], capacity: tuple) -> int:
+    """Segments needed; characters (escape pairs, surrogate pairs) never straddle two parts"""
+    total = sum(costs)
+    if total <= capacity[0]:
+        return 1 if costs else 0
+    segments, used = 1, 0
+    for cost in costs:
+        if used + cost > capacity[1]:
+            segments += 1
+            used = 0
+        used += cost
+    return segments
+
+
+def count_segments(text: str) -> int:
+    gsm7 = is_gsm7(text)
+    return _segments(_costs(text, gsm7), GSM7_SEGMENT if gsm7 else UCS2_SEGMENT)
+
+
+def _clean(text: str) -> str:
+    text = "".join(_PUNCTUATION.get(ch, ch) for ch in text if ch not in _INVISIBLE)
+    return text.strip()
+
+
+def transliterate(text: str) -> str:
+    """Lossy GSM-7 version of text: accents stripped, anything else unrepresentable becomes '?'"""
+    out = []
+    for ch in text:
+        if ch in GSM7_BASIC or ch in GSM7_EXTENDED:
+            out.append(ch)
+            continue
+        base = "".join(c for c in unicodedata.normalize("NFKD", ch) if not unicodedata.combining(c))
+        if base and is_gsm7(base):
+            out.append(base)
+        elif out and out[-1] == "?":
+            # One marker for a run of emoji / symbols
+            continue
+        else:
+            out.append("?")
+    return "".join(out)
+
+
+def _truncate(text: str, gsm7: bool, max_segments: int) -> str:
+    capacity = GSM7_SEGMENT if gsm7 else UCS2_SEGMENT
+    budget = capacity[0] if max_segments == 1 else capacity[1] * max_segments
+    ellipsis = "..." if gsm7 else "\u2026"
+    costs = _costs(text, gsm7)
+    if _segments(costs, capacity) <= max_segments:
+        return text
+    # Keep as many whole characters as fit before the ellipsis
+    limit = budget - sum(_costs(ellipsis, gsm7))
+    used, cut = 0, 0
+    for i, cost in enumerate(costs):
+        if used + cost > limit:
+            break
+        used += cost
+        cut = i + 1
+    head = text[:cut]
+    # Prefer ending on a word boundary if one is close to the cut
+    space = head.rfind(" ")
+    if space >= cut - 15 and space > 0:
+        head = head[:space]
+    head = head.rstrip()
+    # The rule above ignores where segment parts split; shrink until the result really fits
+    while head and _segments(_costs(head + ellipsis, gsm7), capacity) > max_segments:
+        head = head[:-1]
+    return head + ellipsis
+
+
+def encode_for_sms(body: str, max_segments: int = 0, mode: str = "auto") -> Dict:
+    """
+    Pick the cheapest faithful encoding for body and cut it to max_segments (0 = no cap).
+    mode "auto" transliterates to GSM-7 only when that saves segments, "always"
+    whenever the text isn't GSM-7, "never" keeps every character (UCS-2 if needed).
+    """
+    text = _clean(body)
+    transliterated = False
+    if not is_gsm7(text) and mode != "never":
+        lossy = transliterate(text)
+        if mode == "always":
+            text, transliterated = lossy, True
+        else:
+            budget = max_segments or None
+            ucs2_segments = count_segments(_truncate(text, False, budget) if budget else text)
+            gsm_segments = count_segments(_truncate(lossy, True, budget) if budget else lossy)
+            # Keep the original unless it costs more segments, or the same segments with
+            # less of the message when both have to be cut
+            ucs2_cut = budget is not None and count_segments(text) > budget
+            if gsm_segments < ucs2_segments or (ucs2_cut and gsm_segments == ucs2_segments):
+                text, transliterated = lossy, True
+
+    gsm7 = is_gsm7(text)
+    truncated = False
+    if max_segments:
+        cut = _truncate(text, gsm7, max_segments)
+        truncated = cut != text
+        text = cut
+    return {
+        "text": text,
+        "encoding": "GSM-7" if gsm7 else "UCS-2",
+        "segments": count_segments(text),
+        "transliterated": transliterated,
+        "truncated": truncated,
+    }
+
+
+# Counters since startup, shown on the dashboard
+_metrics: Dict = {
+    "notifications": 0,
+    "segments": 0,
+    "gsm7": 0,
+    "ucs2": 0,
+    "transliterated": 0,
+    "truncated": 0,
+    "segments_histogram": {},
+}
+
+
+def sms_metrics() -> Dict:
+    metrics = dict(_metrics, segments_histogram=dict(_metrics["segments_histogram"]))
+    sent = metrics["notifications"]
+    metrics["segments_per_notification"] = round(metrics["segments"] / sent, 2) if sent else None
+    return metrics
+
+
+def _record(encoded: Dict) -> None:
+    _metrics["notifications"] += 1
+    _metrics["segments"] += encoded["segments"]
+    _metrics["gsm7" if encoded["encoding"] == "GSM-7" else "ucs2"] += 1
+    _metrics["transliterated"] += int(encoded["transliterated"])
+    _metrics["truncated"] += int(encoded["truncated"])
+    histogram = _metrics["segments_histogram"]
+    histogram[encoded["segments"]] = histogram.get(encoded["segments"], 0) + 1
+
+
+def send_sms(to_number: str, body: str, max_segments: Optional[int] = None) -> None:
     """
-    Send a one-way SMS notification using AWS SNS.
+    Send a one-way SMS notification using AWS SNS, encoded to fit max_segments
+    (default SMS_MAX_SEGMENTS).
     """
+    if max_segments is None:
+        max_segments = _settings.sms_max_segments
+    encoded = encode_for_sms(body, max_segments, _settings.sms_transliterate)
     try:
-        logger.info(f"Attempting to send SMS to {to_number}: {body[:120]}...")
+        logger.info(
+            f"Attempting to send SMS to {to_number} ({encoded['segments']} {encoded['encoding']} "
+            f"segment(s)): {encoded['text'][:120]}..."
+        )
         response = _sns.publish(
             PhoneNumber=to_number,
-            Message=body,
+            Message=encoded["text"],
         )
+        _record(encoded)
+        events.publish("state", sms=sms_metrics())
         logger.info(f"SMS sent successfully. MessageId: {response.get('MessageId')}")
     except Exception as e:
         logger.error(f"Failed to send SMS to {to_number}: {e}", exc_info=True)
         raise
-
@@ -0,0 +1,333 @@
+import asyncio
+import gzip
+import hashlib
+import hmac
+import json
+import logging
+import os
+import re
+import secrets
+import statistics
+import time
+from html import escape
+from html.parser import HTMLParser
+from typing import Any, Dict, List, Optional
+
+from playwright.async_api import Page
+
+from ig_monitor.config import get_settings
+
+
+logger = logging.getLogger(__name__)
+
+settings = get_settings()
+
+SNAPSHOT_VERSION = 1
+
+# The thread's message container, as rendered
+SNAPSHOT_JS = """
+() => {
+    const main = document.querySelector("[role='main']");
+    return main ? { html: main.outerHTML, width: window.innerWidth, height: window.innerHeight } : null;
+}
+"""
+
+# Attributes kept verbatim: structure the extractor (or a future one) relies on
+_KEEP_ATTRS = {"role", "dir", "class", "tabindex", "type", "aria-hidden", "aria-live", "width", "height"}
+# Attributes whose words are pseudonymized but kept
+_MASK_ATTRS = {"aria-label", "alt", "title", "href", "placeholder", "datetime"}
+# Labels (not message text) where UI words stay readable
+_LABEL_ATTRS = {"aria-label", "alt"}
+# Id prefixes the extractor matches on ([id^='mid.']); the rest of an id is masked
+_ID_PREFIXES = ("mid.",)
+# Dropped with their content
+_DROP_ELEMENTS = {"script", "style", "noscript", "template"}
+_VOID_ELEMENTS = {"area", "base", "br", "col", "embed", "hr", "img", "input", "link", "meta", "source", "track", "wbr"}
+
+# UI vocabulary left readable in labels and button text, so labels like
+# "<name>'s profile picture" keep their shape. Body text is masked entirely.
+_UI_WORDS = {
+    "s", "profile", "picture", "photo", "sent", "you", "seen", "reply", "replied", "to", "liked", "a",
+    "message", "messages", "reel", "story", "video", "audio", "attachment", "reacted", "direct", "t",
+    "unsent", "edited", "active", "now", "ago", "today", "yesterday", "am", "pm",
+}
+_WORD = re.compile(r"\w+", re.UNICODE)
+
+
+class Masker:
+    """
+    Replaces every word with a pseudonym of the same length and character
+    classes (letters keep case, digits stay digits), keyed by a secret that is
+    never written to disk. The same word always maps to the same pseudonym, so
+    text, senders and ids stay consistent between the DOM and the expected output.
+    """
+
+    def __init__(self, key: Optional[bytes] = None):
+        self._key = key or secrets.token_bytes(16)
+        self._cache: Dict[str, str] = {}
+
+    def _word(self, word: str, label: bool) -> str:
+        if label and word.lower() in _UI_WORDS:
+            return word
+        cached = self._cache.get(word)
+        if cached is not None:
+            return cached
+        digest = hmac.new(self._key, word.encode("utf-8"), hashlib.sha256).digest()
+        while len(digest) < len(word):
+            digest += hashlib.sha256(digest).digest()
+        out = []
+        for ch, byte in zip(word, digest):
+            if ch.isdigit():
+                out.append(chr(ord("0") + byte % 10))
+            elif ch.isalpha():
+                letter = chr(ord("a") + byte % 26)
+                out.append(letter.upper() if ch.isupper() else letter)
+            else:
+                out.append("_")
+        masked = "".join(out)
+        if len(self._cache) < 50000:
+            self._cache[word] = masked
+        return masked
+
+    def text(self, value: Optional[str], label: bool = False) -> Optional[str]:
+        """Mask every word; label=True leaves UI words readable"""
+        if value is None:
+            return None
+        return _WORD.sub(lambda m: self._word(m.group(0), label), value)
+
+
+class _Sanitizer(HTMLParser):
+    def __init__(self, masker: Masker):
+        super().__init__(convert_charrefs=True)
+        self.masker = masker
+        self.out: List[str] = []
+        self._dropping = 0
+        # One entry per open element: whether it is a button
+        self._open: List[bool] = []
+        self._buttons = 0
+
+    def handle_starttag(self, tag: str, attrs: List) -> None:
+        if self._dropping or tag in _DROP_ELEMENTS:
+            if tag in _DROP_ELEMENTS:
+                self._dropping += 1
+            return
+        self.out.append(self._tag(tag, attrs))
+        if tag not in _VOID_ELEMENTS:
+            button = tag == "button" or ("role", "button") in attrs
+            self._open.append(button)
+            self._buttons += button
+
+    def handle_startendtag(self, tag: str, attrs: List) -> None:
+        if not self._dropping and tag not in _DROP_ELEMENTS:
+            self.out.append(self._tag(tag, attrs))
+
+    def handle_endtag(self, tag: str) -> None:
+        if tag in _DROP_ELEMENTS:
+            self._dropping = max(0, self._dropping - 1)
+            return
+        if not self._dropping and tag not in _VOID_ELEMENTS:
+            self.out.append(f"</{tag}>")
+            if self._open:
+                self._buttons -= self._open.pop()
+
+    def handle_data(self, data: str) -> None:
+        if not self._dropping:
+            self.out.append(escape(self.masker.text(data, label=self._buttons > 0), quote=False))
+
+    def _id(self, value: str) -> str:
+        prefix = next((p for p in _ID_PREFIXES if value.startswith(p)), "")
+        return prefix + self.masker.text(value[len(prefix):])
+
+    def _tag(self, tag: str, attrs: List) -> str:
+        parts = [tag]
+        for name, value in attrs:
+            if value is None:
+                value = ""
+            if name in _MASK_ATTRS:
+                value = self.masker.text(value, label=name in _LABEL_ATTRS)
+            elif name == "id" or name.startswith("data-"):
+                # Message ids and data attributes can carry user content
+                value = self._id(value)
+            elif name not in _KEEP_ATTRS:
+                continue
+            parts.append(f'{name}="{escape(value)}"')
+        return "<" + " ".join(parts) + ">"
+
+
+def sanitize_html(html: str, masker: Masker) -> str:
+    """Drop scripts, styles, images and unknown attributes; pseudonymize all text, ids and data-* values"""
+    sanitizer = _Sanitizer(masker)
+    sanitizer.feed(html)
+    sanitizer.close()
+    return "".join(sanitizer.out)
+
+
+def snapshot_dir() -> str:
+    return settings.snapshot_dir or os.path.join(settings.data_dir, "snapshots")
+
+
+class SnapshotStore:
+    """Gzipped JSON snapshots in a directory, oldest deleted beyond budget_bytes"""
+
+    def __init__(self, path: str, budget_bytes: int):
+        self.path = path
+        self.budget_bytes = budget_bytes
+
+    def write(self, name: str, snapshot: Dict[str, Any]) -> str:
+        os.makedirs(self.path, exist_ok=True)
+        target = os.path.join(self.path, name)
+        tmp = target + ".tmp"
+        with gzip.open(tmp, "wt", encoding="utf-8", compresslevel=6) as fh:
+            json.dump(snapshot, fh, ensure_ascii=False)
+        os.replace(tmp, target)
+        self.enforce_budget()
+        return target
+
+    def files(self) -> List[str]:
+        if not os.path.isdir(self.path):
+            return []
+        names = [n for n in os.listdir(self.path) if n.endswith(".json.gz")]
+        return sorted(os.path.join(self.path, n) for n in names)
+
+    def enforce_budget(self) -> int:
+        """Delete the oldest snapshots until the store fits its budget; returns files removed"""
+        entries = [(os.path.getmtime(p), os.path.getsize(p), p) for p in self.files()]
+        entries.sort()
+        total = sum(size for _, size, _ in entries)
+        removed = 0
+        while entries and total > self.budget_bytes:
+            _, size, path = entries.pop(0)
+            os.remove(path)
+            total -= size
+            removed += 1
+        return removed
+
+
+def load_snapshot(path: str) -> Dict[str, Any]:
+    with gzip.open(path, "rt", encoding="utf-8") as fh:
+        return json.load(fh)
+
+
+class Recorder:
+    """Saves a sanitized snapshot of the thread DOM whenever it changed since the last poll"""
+
+    def __init__(self, store: SnapshotStore, masker: Optional[Masker] = None):
+        self.store = store
+        self.masker = masker or Masker()
+        self._last_digest: Dict[str, str] = {}
+
+    def _build(self, raw: Dict[str, Any], thread_key: str, messages: List[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+        html = sanitize_html(raw["html"], self.masker)
+        digest = hashlib.sha1(html.encode("utf-8")).hexdigest()
+        if self._last_digest.get(thread_key) == digest:
+            return None
+        self._last_digest[thread_key] = digest
+        return {
+            "version": SNAPSHOT_VERSION,
+            "recorded_at": time.time(),
+            "thread": hashlib.sha1(thread_key.encode("utf-8")).hexdigest()[:12],
+            "viewport": {"width": raw.get("width"), "height": raw.get("height")},
+            "html": html,
+            # What the extractor returned live, for accuracy checks on replay
+            "expected": [
+                {
+                    "text": self.masker.text(m["text"]),
+                    # Senders and time labels come from aria-label/alt, masked as labels
+                    "sender": self.masker.text(m.get("sender"), label=True),
+                    "timestamp": self.masker.text(m.get("timestamp"), label=True),
+                }
+                for m in messages
+            ],
+        }
+
+    async def record(self, page: Page, thread_key: str, messages: List[Dict[str, Any]]) -> Optional[str]:
+        raw = await page.evaluate(SNAPSHOT_JS)
+        if not raw:
+            return None
+        # Parsing a few MB of HTML is too slow for the event loop
+        snapshot = await asyncio.to_thread(self._build, raw, thread_key, messages)
+        if snapshot is None:
+            return None
+        name = f"{int(snapshot['recorded_at'] * 1000)}-{snapshot['thread']}.json.gz"
+        return await asyncio.to_thread(self.store.write, name, snapshot)
+
+
+_recorder: Optional[Recorder] = None
+
+
+def get_recorder() -> Recorder:
+    global _recorder
+    if _recorder is None:
+        _recorder = Recorder(SnapshotStore(snapshot_dir(), settings.snapshot_budget_mb * 1024 * 1024))
+    return _recorder
+
+
+def _score(expected: List[Dict[str, Any]], got: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """Compare extracted rows with the recorded ones (matched by text, in order)"""
+    remaining = list(expected)
+    matched = senders = timestamps = 0
+    for row in got:
+        for i, exp in enumerate(remaining):
+            if exp["text"] == row.get("text"):
+                matched += 1
+                senders += int(exp.get("sender") == row.get("sender"))
+                timestamps += int(exp.get("timestamp") == row.get("timestamp"))
+                del remaining[i]
+                break
+    return {
+        "expected": len(expected),
+        "extracted": len(got),
+        "matched": matched,
+        "precision": matched / len(got) if got else (1.0 if not expected else 0.0),
+        "recall": matched / len(expected) if expected else 1.0,
+        "sender_accuracy": senders / matched if matched else None,
+        "timestamp_accuracy": timestamps / matched if matched else None,
+    }
+
+
+async def replay(page: Page, paths: List[str], repeats: int = 5) -> Dict[str, Any]:
+    """
+    Load each snapshot into page (offline, via set_content) and run the extractor
+    on it. Reports per-snapshot accuracy against the recorded output and the
+    median extraction time.
+    """
+    from ig_monitor.extract import MESSAGES_JS, MAX_GROUP_EXTENSION, TAIL_ROWS, assign_message_ids
+
+    results = []
+    for path in paths:
+        snapshot = load_snapshot(path)
+        viewport = snapshot.get("viewport") or {}
+        if viewport.get("width") and viewport.get("height"):
+            await page.set_viewport_size({"width": viewport["width"], "height": viewport["height"]})
+        await page.set_content(f"<!DOCTYPE html><html><body>{snapshot['html']}</body></html>")
+        limit = max(TAIL_ROWS, len(snapshot["expected"]))
+        timings = []
+        rows: List[Dict[str, Any]] = []
+        for _ in range(repeats):
+            started = time.perf_counter()
+            rows = assign_message_ids("replay", await page.evaluate(MESSAGES_JS, [limit, MAX_GROUP_EXTENSION]))
+            timings.append((time.perf_counter() - started) * 1000)
+        result = _score(snapshot["expected"], rows)
+        result.update({
+            "file": os.path.basename(path),
+            "extract_ms": statistics.median(timings),
+            "html_bytes": len(snapshot["html"]),
+            # The extractor found nothing and the monitor would be on its legacy fallback
+            "needs_fallback": not rows,
+        })
+        results.append(result)
+
+    def _mean(key: str) -> Optional[float]:
+        values = [r[key] for r in results if r[key] is not None]
+        return sum(values) / len(values) if values else None
+
+    return {
+        "snapshots": len(results),
+        "precision": _mean("precision"),
+        "recall": _mean("recall"),
+        "sender_accuracy": _mean("sender_accuracy"),
+        "timestamp_accuracy": _mean("timestamp_accuracy"),
+        "extract_ms_median": statistics.median([r["extract_ms"] for r in results]) if results else None,
+        "needs_fallback": sum(r["needs_fallback"] for r in results),
+        "results": results,
+    }
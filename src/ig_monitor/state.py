@@ -1,11 +1,28 @@
+import asyncio
+import fcntl
+import hashlib
+import json
+import logging
 import os
+import time
+import uuid
+from abc import ABC, abstractmethod
+from contextlib import asynccontextmanager
+
 import aiosqlite
-from typing import Optional, Tuple
+from typing import Dict, List, Optional, Tuple
 from ig_monitor.config import get_settings
 
 
+logger = logging.getLogger(__name__)
+
 _settings = get_settings()
 DB_PATH = os.path.join(_settings.data_dir, _settings.state_db_name)
+# With the SQL coordination backend the seen-sets live in the shared database too,
+# so the node that takes a thread over knows what the previous owner already sent
+SEEN_DB_PATH: Optional[str] = (
+    _settings.coordination_db_path if _settings.coordination_backend == "sql" else None
+)
 
 
 SCHEMA_SQL = """
@@ -15,12 +32,42 @@ CREATE TABLE IF NOT EXISTS app_state (
 );
 """
 
+SEEN_SCHEMA_SQL = """
+CREATE TABLE IF NOT EXISTS seen_messages (
+    thread_key TEXT NOT NULL,
+    message_id TEXT NOT NULL,
+    seen_at REAL NOT NULL,
+    PRIMARY KEY (thread_key, message_id)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS seen_messages_seen_at ON seen_messages(seen_at);
+"""
+
+# Seen message ids older than this are dropped at startup
+SEEN_RETENTION_SECONDS = 90 * 24 * 3600
+
+# Version of the way extract.assign_message_ids derives ids; bump it when they
+# change, so threads seen under the old ids are adopted once instead of re-sent
+MESSAGE_ID_SCHEME = 2
+
+
+def _seen_db() -> str:
+    return SEEN_DB_PATH or DB_PATH
+
 
 async def init_state() -> None:
     os.makedirs(_settings.data_dir, exist_ok=True)
     async with aiosqlite.connect(DB_PATH) as db:
-        await db.execute(SCHEMA_SQL)
+        await db.executescript(SCHEMA_SQL)
+        await db.commit()
+    async with aiosqlite.connect(_seen_db(), timeout=10) as db:
+        await db.executescript(SEEN_SCHEMA_SQL)
+        await db.execute("DELETE FROM seen_messages WHERE seen_at < ?", (time.time() - SEEN_RETENTION_SECONDS,))
         await db.commit()
+        if await _get("message_id_scheme") != str(MESSAGE_ID_SCHEME):
+            async with db.execute("SELECT DISTINCT thread_key FROM seen_messages") as cursor:
+                threads = {row[0] for row in await cursor.fetchall()}
+            await set_readopt_threads(list(threads | set(await get_readopt_threads())))
+            await _set("message_id_scheme", str(MESSAGE_ID_SCHEME))
 
 
 async def _get(key: str) -> Optional[str]:
@@ -39,14 +86,64 @@ async def _set(key: str, value: str) -> None:
         await db.commit()
 
 
-async def get_last_seen_id() -> Optional[str]:
+async def get_last_seen_id(thread_key: Optional[str] = None) -> Optional[str]:
+    """Last notified message; per thread in inbox mode, the configured thread otherwise."""
+    if thread_key:
+        value = await _get(f"last_seen_id:{thread_key}")
+        # Before per-thread keys the configured thread's id was stored unkeyed
+        if value is None and thread_key == str(_settings.ig_thread_url):
+            value = await _get("last_seen_id")
+        return value
     return await _get("last_seen_id")
 
 
-async def set_last_seen_id(message_id: str) -> None:
+async def set_last_seen_id(message_id: str, thread_key: Optional[str] = None) -> None:
+    if thread_key:
+        await _set(f"last_seen_id:{thread_key}", message_id)
+    # The unkeyed value is what the dashboard shows: the most recent notification overall
     await _set("last_seen_id", message_id)
 
 
+async def filter_unseen(thread_key: str, message_ids: List[str]) -> List[str]:
+    """Return the ids (in the given order) not yet in the thread's seen-set"""
+    if not message_ids:
+        return []
+    placeholders = ",".join("?" * len(message_ids))
+    async with aiosqlite.connect(_seen_db(), timeout=10) as db:
+        async with db.execute(
+            f"SELECT message_id FROM seen_messages WHERE thread_key=? AND message_id IN ({placeholders})",
+            (thread_key, *message_ids),
+        ) as cursor:
+            seen = {row[0] for row in await cursor.fetchall()}
+    return [m for m in message_ids if m not in seen]
+
+
+async def mark_seen(thread_key: str, message_ids: List[str]) -> None:
+    now = time.time()
+    async with aiosqlite.connect(_seen_db(), timeout=10) as db:
+        await db.executemany(
+            "INSERT OR IGNORE INTO seen_messages(thread_key, message_id, seen_at) VALUES(?, ?, ?)",
+            [(thread_key, m, now) for m in message_ids],
+        )
+        await db.commit()
+
+
+async def has_seen_any(thread_key: str) -> bool:
+    async with aiosqlite.connect(_seen_db(), timeout=10) as db:
+        async with db.execute("SELECT 1 FROM seen_messages WHERE thread_key=? LIMIT 1", (thread_key,)) as cursor:
+            return await cursor.fetchone() is not None
+
+
+async def get_readopt_threads() -> List[str]:
+    """Threads whose seen-set holds ids from an older MESSAGE_ID_SCHEME"""
+    raw = await _get("readopt_threads")
+    return json.loads(raw) if raw else []
+
+
+async def set_readopt_threads(thread_keys: List[str]) -> None:
+    await _set("readopt_threads", json.dumps(sorted(thread_keys)))
+
+
 async def is_running() -> bool:
     return (await _get("is_running")) == "1"
 
@@ -55,6 +152,35 @@ async def set_running(running: bool) -> None:
     await _set("is_running", "1" if running else "0")
 
 
+async def get_inbox_snapshot() -> Dict[str, list]:
+    """Inbox entry signatures from the previous pass, keyed by thread"""
+    raw = await _get("inbox_snapshot")
+    return json.loads(raw) if raw else {}
+
+
+async def set_inbox_snapshot(snapshot: Dict[str, list]) -> None:
+    await _set("inbox_snapshot", json.dumps(snapshot))
+
+
+async def get_profile_last_prune() -> float:
+    """Unix time of the last browser profile cache prune (0 if never)"""
+    return float(await _get("profile_last_prune") or 0)
+
+
+async def set_profile_last_prune(ts: float) -> None:
+    await _set("profile_last_prune", str(ts))
+
+
+async def get_extraction_strategy() -> Optional[Dict]:
+    """The message extraction strategy in use and its measured figures"""
+    raw = await _get("extraction_strategy")
+    return json.loads(raw) if raw else None
+
+
+async def set_extraction_strategy(choice: Dict) -> None:
+    await _set("extraction_strategy", json.dumps(choice))
+
+
 async def get_last_login_ts() -> Optional[str]:
     return await _get("last_login_ts")
 
@@ -63,3 +189,328 @@ async def set_last_login_ts(ts_iso: str) -> None:
     await _set("last_login_ts", ts_iso)
 
 
+# ---------------------------------------------------------------------------
+# Multi-node coordination
+#
+# Each instance heartbeats into a shared backend and claims the threads it is
+# responsible for through expiring leases. Ownership is decided by rendezvous
+# hashing over the live nodes, so when a node joins or dies the threads are
+# rebalanced without any central assignment; the lease guarantees that at most
+# one node polls (and notifies for) a given thread at a time.
+# ---------------------------------------------------------------------------
+
+
+class LeaseBackend(ABC):
+    """Storage for node heartbeats and thread leases shared between instances."""
+
+    @abstractmethod
+    async def heartbeat(self, node_id: str, ttl: int) -> None:
+        ...
+
+    @abstractmethod
+    async def live_nodes(self) -> List[str]:
+        ...
+
+    @abstractmethod
+    async def acquire(self, resource: str, node_id: str, ttl: int) -> bool:
+        """Take or renew the lease on resource. Returns False if another node holds it."""
+
+    @abstractmethod
+    async def release(self, resource: str, node_id: str) -> None:
+        ...
+
+    @abstractmethod
+    async def leave(self, node_id: str) -> None:
+        """Drop the node heartbeat and every lease it holds."""
+
+
+class FileLeaseBackend(LeaseBackend):
+    """Lease table kept in a JSON file guarded by an exclusive file lock.
+
+    Works for any number of processes sharing the same filesystem (the default
+    single-host deployment).
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.lock_path = path + ".lock"
+
+    def _locked(self, fn):
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        with open(self.lock_path, "a") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                try:
+                    with open(self.path, "r", encoding="utf-8") as fh:
+                        data = json.load(fh)
+                except (FileNotFoundError, ValueError):
+                    data = {}
+                data.setdefault("nodes", {})
+                data.setdefault("leases", {})
+                result, changed = fn(data, time.time())
+                if changed:
+                    tmp_path = self.path + ".tmp"
+                    with open(tmp_path, "w", encoding="utf-8") as fh:
+                        json.dump(data, fh)
+                    os.replace(tmp_path, self.path)
+                return result
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    async def heartbeat(self, node_id: str, ttl: int) -> None:
+        def op(data, now):
+            data["nodes"][node_id] = now + ttl
+            return None, True
+
+        await asyncio.to_thread(self._locked, op)
+
+    async def live_nodes(self) -> List[str]:
+        def op(data, now):
+            return sorted(n for n, expires in data["nodes"].items() if expires > now), False
+
+        return await asyncio.to_thread(self._locked, op)
+
+    async def acquire(self, resource: str, node_id: str, ttl: int) -> bool:
+        def op(data, now):
+            lease = data["leases"].get(resource)
+            if lease and lease["owner"] != node_id and lease["expires"] > now:
+                return False, False
+            data["leases"][resource] = {"owner": node_id, "expires": now + ttl}
+            return True, True
+
+        return await asyncio.to_thread(self._locked, op)
+
+    async def release(self, resource: str, node_id: str) -> None:
+        def op(data, now):
+            lease = data["leases"].get(resource)
+            if lease and lease["owner"] == node_id:
+                del data["leases"][resource]
+                return None, True
+            return None, False
+
+        await asyncio.to_thread(self._locked, op)
+
+    async def leave(self, node_id: str) -> None:
+        def op(data, now):
+            data["nodes"].pop(node_id, None)
+            for resource in [r for r, l in data["leases"].items() if l["owner"] == node_id]:
+                del data["leases"][resource]
+            return None, True
+
+        await asyncio.to_thread(self._locked, op)
+
+
+LEASE_SCHEMA_SQL = """
+CREATE TABLE IF NOT EXISTS nodes (
+    node_id TEXT PRIMARY KEY,
+    expires_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS leases (
+    resource TEXT PRIMARY KEY,
+    owner TEXT NOT NULL,
+    expires_at REAL NOT NULL
+);
+"""
+
+
+class SqlLeaseBackend(LeaseBackend):
+    """Lease table in a SQL database shared by all instances.
+
+    Acquisition is a single conditional upsert, so it is atomic under the
+    database's own locking.
+    """
+
+    def __init__(self, db_path: str):
+        self.db_path = db_path
+        self._initialized = False
+
+    @asynccontextmanager
+    async def _connect(self):
+        async with aiosqlite.connect(self.db_path, timeout=10) as db:
+            if not self._initialized:
+                await db.executescript(LEASE_SCHEMA_SQL)
+                await db.commit()
+                self._initialized = True
+            yield db
+
+    async def heartbeat(self, node_id: str, ttl: int) -> None:
+        async with self._connect() as db:
+            await db.execute(
+                "INSERT INTO nodes(node_id, expires_at) VALUES(?, ?) "
+                "ON CONFLICT(node_id) DO UPDATE SET expires_at=excluded.expires_at",
+                (node_id, time.time() + ttl),
+            )
+            await db.commit()
+
+    async def live_nodes(self) -> List[str]:
+        async with self._connect() as db:
+            async with db.execute(
+                "SELECT node_id FROM nodes WHERE expires_at > ? ORDER BY node_id", (time.time(),)
+            ) as cursor:
+                return [row[0] for row in await cursor.fetchall()]
+
+    async def acquire(self, resource: str, node_id: str, ttl: int) -> bool:
+        now = time.time()
+        async with self._connect() as db:
+            cursor = await db.execute(
+                "INSERT INTO leases(resource, owner, expires_at) VALUES(?, ?, ?) "
+                "ON CONFLICT(resource) DO UPDATE SET owner=excluded.owner, expires_at=excluded.expires_at "
+                "WHERE leases.owner=excluded.owner OR leases.expires_at <= ?",
+                (resource, node_id, now + ttl, now),
+            )
+            await db.commit()
+            return cursor.rowcount > 0
+
+    async def release(self, resource: str, node_id: str) -> None:
+        async with self._connect() as db:
+            await db.execute("DELETE FROM leases WHERE resource=? AND owner=?", (resource, node_id))
+            await db.commit()
+
+    async def leave(self, node_id: str) -> None:
+        async with self._connect() as db:
+            await db.execute("DELETE FROM leases WHERE owner=?", (node_id,))
+            await db.execute("DELETE FROM nodes WHERE node_id=?", (node_id,))
+            await db.commit()
+
+
+def _preferred_node(resource: str, nodes: List[str]) -> str:
+    """Rendezvous (highest random weight) hashing: stable owner per resource."""
+    return max(nodes, key=lambda n: hashlib.sha1(f"{n}|{resource}".encode("utf-8")).digest())
+
+
+class Coordinator:
+    """Claims this node's share of the monitored threads through the lease backend."""
+
+    def __init__(self, backend: LeaseBackend, node_id: str, ttl: int):
+        self.backend = backend
+        self.node_id = node_id
+        self.ttl = ttl
+
+    async def claim(self, resources: List[str]) -> List[str]:
+        """Heartbeat, then take/renew leases on the resources this node should own.
+
+        Resources that now hash to another live node are released so the new
+        owner can pick them up on its next round.
+        """
+        await self.backend.heartbeat(self.node_id, self.ttl)
+        nodes = await self.backend.live_nodes()
+        if self.node_id not in nodes:
+            nodes.append(self.node_id)
+
+        owned = []
+        for resource in resources:
+            if _preferred_node(resource, nodes) == self.node_id:
+                if await self.backend.acquire(resource, self.node_id, self.ttl):
+                    owned.append(resource)
+            else:
+                await self.backend.release(resource, self.node_id)
+        return owned
+
+    async def leave(self) -> None:
+        await self.backend.leave(self.node_id)
+
+
+# Filesystems a database can be shared between hosts on
+NETWORK_FILESYSTEMS = {"nfs", "nfs4", "cifs", "smb3", "smbfs", "ceph", "glusterfs", "9p", "fuse.sshfs", "lustre", "gpfs"}
+
+
+def _filesystem_type(path: str) -> Optional[str]:
+    """Type of the filesystem path is on (longest mount point match), if /proc/self/mounts says"""
+    path = os.path.realpath(path)
+    best, fs_type = "", None
+    try:
+        with open("/proc/self/mounts", encoding="utf-8") as fh:
+            for line in fh:
+                fields = line.split()
+                if len(fields) < 3:
+                    continue
+                mount_point = fields[1].replace("\\040", " ")
+                inside = path == mount_point or path.startswith(mount_point.rstrip("/") + "/")
+                if inside and len(mount_point) >= len(best):
+                    best, fs_type = mount_point, fields[2]
+    except OSError:
+        return None
+    return fs_type
+
+
+def _warn_if_local(db_path: str) -> None:
+    if not _settings.coordination_db_path:
+        logger.warning(
+            "COORDINATION_BACKEND=sql without COORDINATION_DB_PATH uses this instance's own state "
+            f"database ({db_path}); other hosts can't see its leases"
+        )
+        return
+    fs_type = _filesystem_type(os.path.dirname(os.path.abspath(db_path)) or ".")
+    if fs_type is not None and fs_type not in NETWORK_FILESYSTEMS:
+        logger.warning(
+            f"COORDINATION_DB_PATH {db_path} is on a local {fs_type} filesystem; "
+            "failover only works between processes on this host"
+        )
+
+
+def _claim_node_id(directory: str) -> Tuple[str, object]:
+    """
+    A node id that survives restarts: reuse an id whose previous process is gone,
+    otherwise mint a new one. Each id is a lock file held (flock) for the life of
+    the process, so concurrent processes sharing the directory never get the same id.
+    Returns the id and the open lock file, which must stay open.
+    """
+    os.makedirs(directory, exist_ok=True)
+    names = sorted(n for n in os.listdir(directory) if n.endswith(".lock"))
+    for name in names + [f"{uuid.uuid4().hex[:12]}.lock"]:
+        lock_file = open(os.path.join(directory, name), "a")
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            lock_file.close()
+            continue
+        return name[:-len(".lock")], lock_file
+    raise RuntimeError(f"Could not claim a node id in {directory}")
+
+
+def _claim_profile_dir(data_dir: str, name: str) -> object:
+    """
+    Reserve the Chromium profile directory for this instance. Replicas sharing
+    DATA_DIR (the file backend's setup) would otherwise share one user_data_dir,
+    and Chromium's profile lock makes the second launch fail. Returns the open
+    lock file, which must stay open.
+    """
+    os.makedirs(data_dir, exist_ok=True)
+    lock_file = open(os.path.join(data_dir, f"{name}.owner.lock"), "a")
+    try:
+        fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except OSError:
+        lock_file.close()
+        raise RuntimeError(
+            f"The browser profile {os.path.join(data_dir, name)} is in use by another instance; "
+            "give each replica its own USER_DATA_DIR_NAME or set SESSION_MODE=storage_state"
+        ) from None
+    return lock_file
+
+
+_coordinator: Optional[Coordinator] = None
+# Lock file that reserves this process's node id
+_node_id_lock: Optional[object] = None
+# Lock file that reserves the browser profile directory (SESSION_MODE=profile)
+_profile_lock: Optional[object] = None
+
+
+def get_coordinator() -> Coordinator:
+    """The coordinator for this process; raises if its browser profile is taken by another replica"""
+    global _coordinator, _node_id_lock, _profile_lock
+    if _settings.session_mode == "profile" and _profile_lock is None:
+        _profile_lock = _claim_profile_dir(_settings.data_dir, _settings.user_data_dir_name)
+    if _coordinator is None:
+        if _settings.coordination_backend == "sql":
+            db_path = _settings.coordination_db_path or DB_PATH
+            _warn_if_local(db_path)
+            backend: LeaseBackend = SqlLeaseBackend(db_path)
+        elif _settings.coordination_backend == "file":
+            backend = FileLeaseBackend(os.path.join(_settings.data_dir, "leases.json"))
+        else:
+            raise ValueError(f"Unknown COORDINATION_BACKEND: {_settings.coordination_backend}")
+        node_id = _settings.node_id
+        if not node_id:
+            node_id, _node_id_lock = _claim_node_id(os.path.join(_settings.data_dir, "node-ids"))
+        _coordinator = Coordinator(backend, node_id, _settings.lease_ttl_seconds)
+    return _coordinator
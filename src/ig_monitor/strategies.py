@@ -0,0 +1,222 @@
+"""
+Self-tuning choice between several ways of reading the open thread.
+
+Instagram's markup changes without notice, so rather than one hard-coded
+selector the monitor keeps an ordered list of candidate strategies. The active
+one runs on every poll; when it returns nothing usable the next candidates are
+tried in order and the first that works takes over. Every EXPLORE_EVERY polls
+one other candidate is also run and checked against the active one's result,
+which builds latency and hit-rate figures for all of them, and the fastest
+candidate with a good hit rate is promoted. The choice (and the figures) is
+persisted in app_state so a restart begins with the winner.
+"""
+import logging
+import time
+from collections import deque
+from typing import Any, Dict, List, Optional
+
+from playwright.async_api import Error as PlaywrightError, Page
+
+from ig_monitor import events, state
+from ig_monitor.extract import extract_last_bubble, extract_messages
+
+
+logger = logging.getLogger(__name__)
+
+# Candidates in order of preference. "partial" strategies only see the newest
+# message, without the sender, time label or position its id needs to match
+# the full strategies' ids; they keep the figures going when nothing else
+# works, but report no messages and are never promoted on speed.
+STRATEGIES = (
+    {"name": "rows", "container": "[role='main']", "rows": None, "incremental": True},
+    {"name": "rows-rescan", "container": "[role='main']", "rows": None, "incremental": False},
+    {"name": "grid-rows", "container": "[role='grid']", "rows": ["[role='row']"], "incremental": True},
+    {"name": "page-message-ids", "container": "body", "rows": ["[data-message-id], [id^='mid.']"], "incremental": True},
+    {"name": "last-bubble", "partial": True},
+)
+
+# Run one other candidate alongside the active one every this many polls
+EXPLORE_EVERY = 10
+# Recent outcomes kept per strategy for its hit rate
+HIT_WINDOW = 20
+# A strategy needs this many outcomes and this hit rate before it can be promoted
+MIN_SAMPLES = 5
+MIN_HIT_RATE = 0.9
+# ...and must be this much faster than the active one
+PROMOTE_MARGIN = 0.2
+# Weight of the newest latency sample in the moving average
+LATENCY_ALPHA = 0.2
+# Longer "messages" mean the row selector matched a container, not a bubble
+MAX_MESSAGE_CHARS = 2000
+
+
+def valid_messages(messages: Optional[List[Dict[str, Any]]]) -> bool:
+    """Non-empty, and every row looks like one message rather than a whole pane"""
+    if not messages:
+        return False
+    return all(isinstance(m.get("text"), str) and 0 < len(m["text"]) <= MAX_MESSAGE_CHARS for m in messages)
+
+
+def _page_gone(page: Page, error: Exception) -> bool:
+    """The page or browser died or hung; no other strategy can do better, so the supervisor must see it"""
+    # monitor imports this module
+    from ig_monitor.monitor import PageOperationTimeout
+    if isinstance(error, PageOperationTimeout) or page.is_closed():
+        return True
+    return isinstance(error, PlaywrightError) and "closed" in str(error).lower()
+
+
+class StrategyTuner:
+    def __init__(self, strategies: tuple = STRATEGIES, explore_every: int = EXPLORE_EVERY):
+        self.strategies = {s["name"]: s for s in strategies}
+        self.order = [s["name"] for s in strategies]
+        self.explore_every = explore_every
+        self.current = self.order[0]
+        self.stats: Dict[str, Dict[str, Any]] = {
+            name: {"latency_ms": None, "hits": deque(maxlen=HIT_WINDOW)} for name in self.order
+        }
+        self._loaded = False
+        self._polls = 0
+        self._explore_index = 0
+
+    async def _load(self) -> None:
+        if self._loaded:
+            return
+        self._loaded = True
+        saved = await state.get_extraction_strategy()
+        if not saved:
+            return
+        for name, figures in (saved.get("stats") or {}).items():
+            if name in self.stats:
+                self.stats[name]["latency_ms"] = figures.get("latency_ms")
+                self.stats[name]["hits"].extend(bool(h) for h in figures.get("hits", []))
+        if saved.get("strategy") in self.strategies:
+            self.current = saved["strategy"]
+            logger.info(f"Extraction strategy restored: {self.current}")
+
+    async def _save(self) -> None:
+        await state.set_extraction_strategy({
+            "strategy": self.current,
+            "stats": {
+                name: {"latency_ms": s["latency_ms"], "hits": [int(h) for h in s["hits"]]}
+                for name, s in self.stats.items()
+            },
+        })
+
+    def hit_rate(self, name: str) -> Optional[float]:
+        hits = self.stats[name]["hits"]
+        return sum(hits) / len(hits) if hits else None
+
+    def summary(self) -> Dict[str, Any]:
+        return {
+            "strategy": self.current,
+            "candidates": {
+                name: {
+                    "latency_ms": round(s["latency_ms"], 2) if s["latency_ms"] is not None else None,
+                    "hit_rate": self.hit_rate(name),
+                    "samples": len(s["hits"]),
+                }
+                for name, s in self.stats.items()
+            },
+        }
+
+    async def _run(self, name: str, page: Page, thread_key: str) -> Optional[List[Dict[str, Any]]]:
+        """Messages from one strategy, or None if it failed; latency is recorded either way"""
+        strategy = self.strategies[name]
+        started = time.perf_counter()
+        try:
+            if strategy.get("partial"):
+                messages = await extract_last_bubble(page, thread_key)
+            else:
+                messages = await extract_messages(
+                    page,
+                    thread_key,
+                    container=strategy["container"],
+                    row_selectors=strategy["rows"],
+                    incremental=strategy["incremental"],
+                )
+        except Exception as e:
+            if _page_gone(page, e):
+                raise
+            logger.debug(f"Extraction strategy {name} failed: {e}")
+            messages = None
+        elapsed = (time.perf_counter() - started) * 1000
+        figures = self.stats[name]
+        previous = figures["latency_ms"]
+        figures["latency_ms"] = elapsed if previous is None else previous + LATENCY_ALPHA * (elapsed - previous)
+        return messages if valid_messages(messages) else None
+
+    async def _switch(self, name: str, reason: str) -> None:
+        logger.info(f"Extraction strategy {self.current} -> {name}: {reason}")
+        self.current = name
+        await self._save()
+        events.publish("state", extraction=self.summary())
+
+    async def extract(self, page: Page, thread_key: str) -> List[Dict[str, Any]]:
+        """
+        Trailing messages of the open thread (oldest first) from the best working
+        strategy. While only a partial strategy works nothing is returned; the
+        full strategies are tried first on every poll, and once one works again
+        it reports what arrived in the meantime.
+        """
+        await self._load()
+        self._polls += 1
+        tried = []
+        if not self.strategies[self.current].get("partial"):
+            messages = await self._attempt(self.current, page, thread_key)
+            if messages is not None:
+                if self._polls % self.explore_every == 0:
+                    await self._explore(page, thread_key, messages)
+                return messages
+            tried.append(self.current)
+        for name in self.order:
+            if name in tried:
+                continue
+            messages = await self._attempt(name, page, thread_key)
+            if messages is None:
+                continue
+            if tried:
+                await self._switch(name, f"{self.current} returned no valid messages")
+            elif name != self.current:
+                await self._switch(name, "a full strategy works again")
+            return [] if self.strategies[name].get("partial") else messages
+        # Nothing works (page not ready, thread empty): keep the current choice
+        return []
+
+    async def _attempt(self, name: str, page: Page, thread_key: str) -> Optional[List[Dict[str, Any]]]:
+        messages = await self._run(name, page, thread_key)
+        self.stats[name]["hits"].append(messages is not None)
+        return messages
+
+    async def _explore(self, page: Page, thread_key: str, messages: List[Dict[str, Any]]) -> None:
+        candidates = [n for n in self.order if n != self.current and not self.strategies[n].get("partial")]
+        if not candidates:
+            return
+        name = candidates[self._explore_index % len(candidates)]
+        self._explore_index += 1
+        result = await self._run(name, page, thread_key)
+        agrees = result is not None and [m["text"] for m in result] == [m["text"] for m in messages]
+        self.stats[name]["hits"].append(agrees)
+        await self._maybe_promote()
+
+    def _eligible(self, name: str) -> bool:
+        figures = self.stats[name]
+        return (
+            not self.strategies[name].get("partial")
+            and figures["latency_ms"] is not None
+            and len(figures["hits"]) >= MIN_SAMPLES
+            and self.hit_rate(name) >= MIN_HIT_RATE
+        )
+
+    async def _maybe_promote(self) -> None:
+        eligible = [n for n in self.order if n != self.current and self._eligible(n)]
+        if not eligible:
+            return
+        best = min(eligible, key=lambda n: self.stats[n]["latency_ms"])
+        best_ms = self.stats[best]["latency_ms"]
+        current_ms = self.stats[self.current]["latency_ms"]
+        if current_ms is not None and best_ms < current_ms * (1 - PROMOTE_MARGIN):
+            await self._switch(best, f"{best_ms:.1f} ms vs {current_ms:.1f} ms")
+
+
+strategy_tuner = StrategyTuner()
@@ -0,0 +1,727 @@
+"""
+Ownership of the browser and the monitor loop, either in the web process or in
+a dedicated worker process.
+
+BROWSER_WORKER=inline (default): the web app owns the browser, as it always has.
+
+BROWSER_WORKER=process: the browser, the monitor loop and SMS sending live in
+`python -m ig_monitor.worker`. The first web worker that needs it starts it,
+under a file lock, so `uvicorn --workers N` shares one. The web tier talks to it
+over a Unix socket (WORKER_SOCKET, default DATA_DIR/browser-worker.sock). Each
+line is one JSON message, and one connection carries many requests at once
+({"id", "op", "args"} -> {"id", "result"} or {"id", "error"}). The worker also
+pushes {"event": ...} lines, which the web tier republishes to its dashboard
+streams. Screenshot bytes don't go through the socket: the worker writes them
+into a ring of shared-memory slots and replies with where to read them.
+
+Either way the web app only uses get_browser() and the operations below, so a
+stalled browser can only hold up the requests that need it.
+"""
+import asyncio
+import base64
+import fcntl
+import itertools
+import json
+import logging
+import os
+import signal
+import socket
+import struct
+import subprocess
+import sys
+import time
+from multiprocessing import resource_tracker, shared_memory
+from typing import Any, Awaitable, Callable, Dict, Optional, Set
+
+from ig_monitor import events, heap, monitor, profile, sampler
+from ig_monitor.config import get_settings
+from ig_monitor.latency import latency_tracker
+from ig_monitor.scheduler import page_scheduler, PRIORITY_INPUT, PRIORITY_SCREENSHOT, SchedulerBusy
+from ig_monitor.settle import wait_for_settle
+from ig_monitor.sms import sms_metrics
+from ig_monitor.state import init_state, get_coordinator, get_last_seen_id, get_last_login_ts
+from ig_monitor.strategies import strategy_tuner
+
+
+settings = get_settings()
+logger = logging.getLogger(__name__)
+
+SCROLL_DIRECTIONS = ("up", "down", "pageUp", "pageDown")
+# Whole screenshot operation, including a navigation away from a blank page
+SCREENSHOT_TIMEOUT_SECONDS = 20
+
+# Longest JSON line either side accepts
+MAX_LINE_BYTES = 4 * 1024 * 1024
+# The web tier gives up on a worker call after this long
+CALL_TIMEOUT_SECONDS = 60
+# How long a newly spawned worker has to start listening
+WORKER_START_SECONDS = 30
+# Shared-memory screenshot ring: slots in flight at once, and the largest PNG a slot holds
+SHM_SLOTS = 4
+SHM_SLOT_BYTES = 4 * 1024 * 1024
+# Per-slot header: write sequence (odd while being written) and PNG size
+_SLOT_HEADER = struct.Struct("<QI")
+
+
+class WorkerUnavailable(RuntimeError):
+    """The browser worker process can't be reached (or started)"""
+
+
+class WorkerError(RuntimeError):
+    """An operation failed inside the browser worker"""
+
+
+def socket_path() -> str:
+    return settings.worker_socket or os.path.join(settings.data_dir, "browser-worker.sock")
+
+
+# --- Operations: run wherever the browser lives ---
+
+async def _screenshot() -> bytes:
+    async def _take_screenshot() -> bytes:
+        page = await monitor.get_browser_page()
+
+        # Only navigate if page is truly blank
+        current_url = page.url
+        if not current_url or "about:" in current_url:
+            # Page is blank - try to navigate but don't block on it
+            try:
+                logger.info("Page is blank, attempting navigation...")
+                # Use shorter timeout and don't wait for full load
+                await asyncio.wait_for(
+                    page.goto("https://www.instagram.com", wait_until="domcontentloaded", timeout=5000),
+                    timeout=6.0
+                )
+                # Give it a moment to render
+                await wait_for_settle(page, max_ms=3000)
+            except (asyncio.TimeoutError, Exception) as nav_error:
+                logger.warning(f"Navigation skipped or failed: {type(nav_error).__name__}: {nav_error}")
+                # Continue to screenshot anyway - might be a blank/loading page
+
+        # Try to screenshot whatever is there - even if blank or loading
+        try:
+            return await asyncio.wait_for(
+                page.screenshot(full_page=False, clip={"x": 0, "y": 0, "width": 800, "height": 600}),
+                timeout=5.0
+            )
+        except Exception as screenshot_error:
+            logger.warning(f"Screenshot capture failed: {screenshot_error}, trying without clip...")
+            return await page.screenshot(full_page=False, timeout=5000)
+
+    # Lowest priority: waits behind monitor polls and input, and a newer
+    # screenshot request replaces this one while it is still waiting
+    async with page_scheduler.slot(PRIORITY_SCREENSHOT, "screenshot"):
+        return await asyncio.wait_for(_take_screenshot(), timeout=SCREENSHOT_TIMEOUT_SECONDS)
+
+
+async def _login_check() -> Dict[str, Any]:
+    async with page_scheduler.slot(PRIORITY_INPUT, "login check"):
+        page = await monitor.get_browser_page()
+        logged_in = await monitor.is_logged_in(page)
+    if monitor.note_login_state(logged_in) and logged_in:
+        # Login completed through the remote browser: persist the session right away
+        await monitor.save_session()
+    events.update_status(url=page.url)
+    return {"logged_in": logged_in, "url": page.url}
+
+
+async def _navigate(url: str, wait_until: str = "networkidle") -> Dict[str, Any]:
+    async with page_scheduler.slot(PRIORITY_INPUT, "navigate"):
+        page = await monitor.get_browser_page()
+        await page.goto(url, wait_until=wait_until)
+    return {"url": page.url}
+
+
+async def _open_thread() -> Dict[str, Any]:
+    async with page_scheduler.slot(PRIORITY_INPUT, "open thread"):
+        page = await monitor.get_browser_page()
+        await page.goto(settings.ig_thread_url, wait_until="networkidle")
+    return {"url": page.url}
+
+
+async def _click(x: int, y: int, settle: bool = True) -> Dict[str, Any]:
+    async with page_scheduler.slot(PRIORITY_INPUT, "click"):
+        page = await monitor.get_browser_page()
+        await page.mouse.click(x, y)
+        if settle:
+            await wait_for_settle(page)  # Wait for any navigation/updates
+    return {}
+
+
+async def _type(text: str) -> Dict[str, Any]:
+    async with page_scheduler.slot(PRIORITY_INPUT, "type"):
+        page = await monitor.get_browser_page()
+        await page.keyboard.type(text, delay=50)
+    return {}
+
+
+async def _key(key: str, settle: bool = True) -> Dict[str, Any]:
+    async with page_scheduler.slot(PRIORITY_INPUT, "key"):
+        page = await monitor.get_browser_page()
+        await page.keyboard.press(key)
+        if settle:
+            await wait_for_settle(page)
+    return {}
+
+
+async def _scroll(direction: str, settle: bool = True) -> Dict[str, Any]:
+    if direction not in SCROLL_DIRECTIONS:
+        raise ValueError(f"Invalid direction: {direction}. Use 'up', 'down', 'pageUp', or 'pageDown'")
+    async with page_scheduler.slot(PRIORITY_INPUT, "scroll"):
+        page = await monitor.get_browser_page()
+        # Get viewport height from JavaScript (more reliable)
+        viewport_height = await page.evaluate("window.innerHeight")
+        if not viewport_height or viewport_height == 0:
+            viewport_height = 600  # Fallback
+
+        if direction == "up":
+            await page.evaluate("window.scrollBy(0, -300)")
+        elif direction == "down":
+            await page.evaluate("window.scrollBy(0, 300)")
+        elif direction == "pageUp":
+            await page.evaluate(f"window.scrollBy(0, -{viewport_height})")
+        elif direction == "pageDown":
+            await page.evaluate(f"window.scrollBy(0, {viewport_height})")
+        if settle:
+            await wait_for_settle(page, max_ms=1000)  # Wait for scroll animation / lazy loading
+    return {"direction": direction}
+
+
+async def _settle() -> Dict[str, Any]:
+    """Let the page react to a burst of input; returns where it ended up"""
+    page = await monitor.get_browser_page()
+    await wait_for_settle(page)
+    return {"url": page.url}
+
+
+async def _start() -> Dict[str, Any]:
+    return {"status": await monitor.start_monitor()}
+
+
+async def _stop() -> Dict[str, Any]:
+    return {"status": await monitor.stop_monitor()}
+
+
+async def _prune() -> Dict[str, Any]:
+    return {"result": await monitor.run_profile_maintenance(force=True)}
+
+
+async def _disk(refresh: bool = False) -> Dict[str, Any]:
+    report = profile.last_report
+    if refresh or report is None:
+        report = await asyncio.to_thread(profile.usage_report)
+        events.publish("disk", total=report["total"], profile_total=report["profile_total"])
+    return report
+
+
+async def _status() -> Dict[str, Any]:
+    """Everything the web tier shows that only the browser owner knows"""
+    disk = profile.last_report
+    return {
+        "state_ready": _state_ready,
+        "running": monitor.is_monitor_running(),
+        "heartbeat_age_seconds": monitor.heartbeat_age(),
+        "browser": monitor.browser_launch_status(),
+        "session": monitor.session_status(),
+        "disk_total": disk["total"] if disk else None,
+        "profile_total": disk["profile_total"] if disk else None,
+        "sms": sms_metrics(),
+        "extraction": strategy_tuner.summary(),
+        "latency": latency_tracker.summary(),
+    }
+
+
+async def _cpu_profile(seconds: float) -> Dict[str, Any]:
+    """Sample this process (the one running the browser and monitor loop)"""
+    return await sampler.profile(seconds)
+
+
+async def _heap(limit: int = 20) -> Dict[str, Any]:
+    """Python heap diffs of this process, plus the monitor page's CDP figures if it is open"""
+    return await heap.report(monitor.open_page(), limit)
+
+
+async def _heap_stop() -> Dict[str, Any]:
+    return {"stopped": heap.stop_tracing()}
+
+
+def _live_status() -> Dict[str, Any]:
+    """Snapshot fields events keep current afterwards, read from the owner's own objects"""
+    disk = profile.last_report
+    return {
+        "running": monitor.is_monitor_running(),
+        "disk_total": disk["total"] if disk else None,
+        "profile_total": disk["profile_total"] if disk else None,
+        "sms": sms_metrics(),
+        "extraction": strategy_tuner.summary(),
+        "latency": latency_tracker.summary(),
+    }
+
+
+async def _snapshot(refresh: bool = False) -> Dict[str, Any]:
+    """The owner's event-fed status snapshot; refresh=True re-reads the persisted and live values first"""
+    if refresh:
+        events.update_status(
+            last_seen_id=await get_last_seen_id(), last_login_ts=await get_last_login_ts(), **_live_status()
+        )
+    return events.status_snapshot()
+
+
+OPERATIONS: Dict[str, Callable[..., Awaitable[Any]]] = {
+    "login_check": _login_check,
+    "navigate": _navigate,
+    "open_thread": _open_thread,
+    "click": _click,
+    "type": _type,
+    "key": _key,
+    "scroll": _scroll,
+    "settle": _settle,
+    "start": _start,
+    "stop": _stop,
+    "prune": _prune,
+    "disk": _disk,
+    "status": _status,
+    "snapshot": _snapshot,
+    "cpu_profile": _cpu_profile,
+    "heap": _heap,
+    "heap_stop": _heap_stop,
+}
+
+
+# --- Owner lifecycle: the process that holds the browser ---
+
+_owner_tasks: Set[asyncio.Task] = set()
+_state_ready = False
+
+
+async def start_owner() -> None:
+    """Open the state database, warm up the browser and resume monitoring"""
+    global _state_ready
+    # Fails here, before anything launches, if another replica uses this browser profile
+    get_coordinator()
+    # The browser launch doesn't need the state database; start it first so the two overlap
+    _owner_tasks.add(asyncio.create_task(monitor.warm_up_browser(), name="browser-warmup"))
+    await init_state()
+    _state_ready = True
+    # Seed the in-memory status snapshot; the monitor keeps it current from here on
+    events.update_status(
+        last_seen_id=await get_last_seen_id(), last_login_ts=await get_last_login_ts(), **_live_status()
+    )
+    _owner_tasks.add(asyncio.create_task(monitor.profile_maintenance_loop(), name="profile-maintenance"))
+    await monitor.resume_monitor_if_enabled()
+
+
+async def stop_owner() -> None:
+    for task in _owner_tasks:
+        task.cancel()
+    _owner_tasks.clear()
+    await monitor.shutdown()
+
+
+class InlineBrowser:
+    """The browser lives in this process (BROWSER_WORKER=inline)"""
+
+    async def start(self) -> None:
+        await start_owner()
+
+    async def close(self) -> None:
+        await stop_owner()
+
+    async def call(self, op: str, **args: Any) -> Any:
+        return await OPERATIONS[op](**args)
+
+    async def screenshot(self) -> bytes:
+        return await _screenshot()
+
+    async def health(self) -> Dict[str, Any]:
+        age = monitor.heartbeat_age()
+        return {
+            "monitor_running": monitor.is_monitor_running(),
+            "heartbeat_age_seconds": age,
+            "healthy": age is None or age <= monitor._stale_after(),
+        }
+
+
+# --- Worker process side ---
+
+# Segments created by a ScreenshotRing in this process
+_ring_segments: Set[str] = set()
+
+
+class ScreenshotRing:
+    """
+    Shared-memory slots screenshots are handed over in. Each slot carries a
+    sequence number that is odd while it is being written, so a reader can tell
+    (by checking it before and after copying) that it got the bytes it was told about.
+    """
+
+    def __init__(self, slots: int = SHM_SLOTS, slot_bytes: int = SHM_SLOT_BYTES):
+        self.slots = slots
+        self.slot_bytes = slot_bytes
+        self.slot_size = _SLOT_HEADER.size + slot_bytes
+        self.shm = shared_memory.SharedMemory(create=True, size=slots * self.slot_size)
+        _ring_segments.add(self.shm.name)
+        self._next = 0
+        self._seq = [0] * slots
+
+    def put(self, data: bytes) -> Optional[Dict[str, Any]]:
+        """Write data into the next slot; None if it doesn't fit"""
+        if len(data) > self.slot_bytes:
+            return None
+        index = self._next
+        self._next = (index + 1) % self.slots
+        offset = index * self.slot_size
+        buf = self.shm.buf
+        seq = self._seq[index] + 1
+        _SLOT_HEADER.pack_into(buf, offset, seq, 0)
+        start = offset + _SLOT_HEADER.size
+        buf[start:start + len(data)] = data
+        seq += 1
+        _SLOT_HEADER.pack_into(buf, offset, seq, len(data))
+        self._seq[index] = seq
+        return {"name": self.shm.name, "offset": offset, "seq": seq, "size": len(data)}
+
+    def close(self) -> None:
+        _ring_segments.discard(self.shm.name)
+        self.shm.close()
+        self.shm.unlink()
+
+
+def attach_segment(name: str) -> shared_memory.SharedMemory:
+    """Open a segment the worker owns without this process's resource tracker unlinking it on exit"""
+    if sys.version_info >= (3, 13):
+        return shared_memory.SharedMemory(name=name, track=False)
+    # Older versions register every attach with the tracker. A ring in this process
+    # (worker and client in one test process) shares the entry and removes it itself.
+    shm = shared_memory.SharedMemory(name=name)
+    if name not in _ring_segments:
+        resource_tracker.unregister(f"/{name}", "shared_memory")
+    return shm
+
+
+def read_screenshot(shm: shared_memory.SharedMemory, ref: Dict[str, Any]) -> Optional[bytes]:
+    """Copy a screenshot out of the ring; None if the slot was reused in the meantime"""
+    offset = ref["offset"]
+    if _SLOT_HEADER.unpack_from(shm.buf, offset)[0] != ref["seq"]:
+        return None
+    start = offset + _SLOT_HEADER.size
+    data = bytes(shm.buf[start:start + ref["size"]])
+    if _SLOT_HEADER.unpack_from(shm.buf, offset)[0] != ref["seq"]:
+        return None
+    return data
+
+
+def _error_reply(e: BaseException) -> Dict[str, Any]:
+    if isinstance(e, SchedulerBusy):
+        return {"kind": "busy", "message": str(e), "retry_after": e.retry_after}
+    if isinstance(e, sampler.ProfilerBusy):
+        return {"kind": "profiler_busy", "message": str(e)}
+    if isinstance(e, ValueError):
+        return {"kind": "invalid", "message": str(e)}
+    if isinstance(e, asyncio.TimeoutError):
+        return {"kind": "timeout", "message": str(e) or "operation timed out"}
+    return {"kind": "error", "message": str(e)}
+
+
+def _raise_error(error: Dict[str, Any]) -> None:
+    kind, message = error.get("kind"), error.get("message", "")
+    if kind == "busy":
+        raise SchedulerBusy(message, error.get("retry_after", 1))
+    if kind == "profiler_busy":
+        raise sampler.ProfilerBusy(message)
+    if kind == "invalid":
+        raise ValueError(message)
+    if kind == "timeout":
+        raise asyncio.TimeoutError(message)
+    raise WorkerError(message)
+
+
+class WorkerServer:
+    def __init__(self, path: str):
+        self.path = path
+        self.screenshots: Optional[ScreenshotRing] = None
+        self._server: Optional[asyncio.AbstractServer] = None
+
+    async def start(self) -> None:
+        if os.path.exists(self.path):
+            os.unlink(self.path)
+        self.screenshots = ScreenshotRing()
+        self._server = await asyncio.start_unix_server(self._serve, path=self.path, limit=MAX_LINE_BYTES)
+
+    async def close(self) -> None:
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+        if self.screenshots is not None:
+            self.screenshots.close()
+        if os.path.exists(self.path):
+            os.unlink(self.path)
+
+    async def _serve(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        write_lock = asyncio.Lock()
+        tasks: Set[asyncio.Task] = set()
+
+        async def send(message: Dict[str, Any]) -> None:
+            async with write_lock:
+                writer.write(json.dumps(message).encode("utf-8") + b"\n")
+                await writer.drain()
+
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                request = json.loads(line)
+                if request.get("op") == "subscribe":
+                    coro = self._forward_events(send)
+                else:
+                    coro = self._handle(request, send)
+                # Named after the operation so CPU profiles can tell them apart
+                task = asyncio.create_task(coro, name=f"worker-{request.get('op')}")
+                tasks.add(task)
+                task.add_done_callback(tasks.discard)
+        except (ConnectionError, ValueError) as e:
+            logger.warning(f"Worker connection dropped: {e}")
+        finally:
+            for task in list(tasks):
+                task.cancel()
+            writer.close()
+
+    async def _forward_events(self, send: Callable[[Dict[str, Any]], Awaitable[None]]) -> None:
+        with events.subscribe() as queue:
+            while True:
+                await send({"event": await queue.get()})
+
+    async def _handle(self, request: Dict[str, Any], send: Callable[[Dict[str, Any]], Awaitable[None]]) -> None:
+        reply: Dict[str, Any] = {"id": request.get("id")}
+        op = request.get("op")
+        try:
+            if op == "screenshot":
+                data = await _screenshot()
+                ref = self.screenshots.put(data)
+                reply["result"] = {"shm": ref} if ref else {"png": base64.b64encode(data).decode("ascii")}
+            elif op in OPERATIONS:
+                reply["result"] = await OPERATIONS[op](**(request.get("args") or {}))
+            else:
+                raise ValueError(f"Unknown operation: {op}")
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            if not isinstance(e, (SchedulerBusy, sampler.ProfilerBusy, ValueError, asyncio.TimeoutError)):
+                logger.error(f"Worker operation {op} failed: {e}", exc_info=True)
+            reply["error"] = _error_reply(e)
+        await send(reply)
+
+
+def _can_connect(path: str) -> bool:
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        try:
+            sock.connect(path)
+            return True
+        except OSError:
+            return False
+
+
+async def run_worker(path: Optional[str] = None, stop: Optional[asyncio.Event] = None) -> None:
+    """Serve the browser to web workers until SIGTERM/SIGINT (or until stop is set)"""
+    path = path or socket_path()
+    if _can_connect(path):
+        logger.info(f"A browser worker is already listening on {path}")
+        return
+    if stop is None:
+        stop = asyncio.Event()
+        loop = asyncio.get_running_loop()
+        for sig in (signal.SIGTERM, signal.SIGINT):
+            loop.add_signal_handler(sig, stop.set)
+    server = WorkerServer(path)
+    await server.start()
+    logger.info(f"Browser worker {os.getpid()} listening on {path}")
+    try:
+        await start_owner()
+        await stop.wait()
+    finally:
+        await stop_owner()
+        await server.close()
+
+
+# --- Web tier side ---
+
+_spawned: list = []
+
+
+def _spawn_worker(path: str) -> None:
+    """Start the worker unless another web worker already has (blocking; run in a thread)"""
+    with open(path + ".lock", "w") as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        try:
+            if _can_connect(path):
+                return
+            logger.info("Starting the browser worker process")
+            src_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+            env = dict(os.environ, WORKER_SOCKET=path)
+            env["PYTHONPATH"] = os.pathsep.join(p for p in (src_dir, env.get("PYTHONPATH")) if p)
+            # Its own session: it keeps running (and monitoring) when this web worker exits
+            proc = subprocess.Popen([sys.executable, "-m", "ig_monitor.worker"], env=env, start_new_session=True)
+            _spawned.append(proc)
+            deadline = time.monotonic() + WORKER_START_SECONDS
+            while time.monotonic() < deadline:
+                if proc.poll() is not None:
+                    raise WorkerUnavailable(f"Browser worker exited with status {proc.returncode}")
+                if _can_connect(path):
+                    return
+                time.sleep(0.1)
+            raise WorkerUnavailable(f"Browser worker did not start listening within {WORKER_START_SECONDS}s")
+        finally:
+            fcntl.flock(lock, fcntl.LOCK_UN)
+
+
+class WorkerClient:
+    """The browser lives in the worker process (BROWSER_WORKER=process); one multiplexed connection to it"""
+
+    def __init__(self, path: Optional[str] = None, spawn: bool = True):
+        self.path = path or socket_path()
+        self.spawn = spawn
+        self._writer: Optional[asyncio.StreamWriter] = None
+        self._reader_task: Optional[asyncio.Task] = None
+        self._pending: Dict[int, asyncio.Future] = {}
+        self._ids = itertools.count(1)
+        self._connect_lock = asyncio.Lock()
+        self._write_lock = asyncio.Lock()
+        self._segments: Dict[str, shared_memory.SharedMemory] = {}
+
+    @property
+    def connected(self) -> bool:
+        return self._writer is not None and not self._writer.is_closing()
+
+    async def start(self) -> None:
+        await self._connect()
+
+    async def _connect(self) -> None:
+        async with self._connect_lock:
+            if self.connected:
+                return
+            try:
+                reader, writer = await asyncio.open_unix_connection(self.path, limit=MAX_LINE_BYTES)
+            except OSError:
+                if not self.spawn:
+                    raise WorkerUnavailable(f"No browser worker listening on {self.path}") from None
+                await asyncio.to_thread(_spawn_worker, self.path)
+                reader, writer = await asyncio.open_unix_connection(self.path, limit=MAX_LINE_BYTES)
+            self._writer = writer
+            self._reader_task = asyncio.create_task(self._read(reader), name="browser-worker-reader")
+            await self._send({"op": "subscribe"})
+        # Catch up on what happened before we subscribed
+        events.update_status(**await self.call("snapshot"))
+
+    async def _send(self, message: Dict[str, Any]) -> None:
+        async with self._write_lock:
+            self._writer.write(json.dumps(message).encode("utf-8") + b"\n")
+            await self._writer.drain()
+
+    async def _read(self, reader: asyncio.StreamReader) -> None:
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                message = json.loads(line)
+                if "event" in message:
+                    events.forward(message["event"])
+                    continue
+                future = self._pending.pop(message.get("id"), None)
+                if future is not None and not future.done():
+                    future.set_result(message)
+        except (ConnectionError, ValueError) as e:
+            logger.warning(f"Lost the browser worker connection: {e}")
+        finally:
+            self._writer = None
+            for future in self._pending.values():
+                if not future.done():
+                    future.set_exception(WorkerUnavailable("Browser worker connection lost"))
+            self._pending.clear()
+
+    async def call(self, op: str, **args: Any) -> Any:
+        if not self.connected:
+            await self._connect()
+        request_id = next(self._ids)
+        future = asyncio.get_running_loop().create_future()
+        self._pending[request_id] = future
+        try:
+            await self._send({"id": request_id, "op": op, "args": args})
+            reply = await asyncio.wait_for(future, timeout=CALL_TIMEOUT_SECONDS)
+        finally:
+            self._pending.pop(request_id, None)
+        if "error" in reply:
+            _raise_error(reply["error"])
+        return reply.get("result")
+
+    def _segment(self, name: str) -> shared_memory.SharedMemory:
+        shm = self._segments.get(name)
+        if shm is None:
+            shm = attach_segment(name)
+            self._segments[name] = shm
+        return shm
+
+    async def screenshot(self) -> bytes:
+        for _ in range(3):
+            result = await self.call("screenshot")
+            if "png" in result:
+                return base64.b64decode(result["png"])
+            data = read_screenshot(self._segment(result["shm"]["name"]), result["shm"])
+            if data is not None:
+                return data
+        raise WorkerError("Screenshot slot was reused before it could be read")
+
+    async def health(self) -> Dict[str, Any]:
+        """
+        Cheap: never waits on the worker. The heartbeat age comes from the last
+        heartbeat_at the worker published, so it keeps growing if the worker
+        stops publishing altogether.
+        """
+        snapshot = events.status_snapshot()
+        running = snapshot.get("running")
+        heartbeat_at = snapshot.get("heartbeat_at")
+        age = time.time() - heartbeat_at if running and heartbeat_at is not None else None
+        return {
+            "worker_connected": self.connected,
+            "monitor_running": running,
+            "heartbeat_age_seconds": age,
+            "healthy": age is None or age <= monitor._stale_after(),
+        }
+
+    async def close(self) -> None:
+        if self._writer is not None:
+            self._writer.close()
+        if self._reader_task is not None:
+            self._reader_task.cancel()
+            try:
+                await self._reader_task
+            except (asyncio.CancelledError, Exception):
+                pass
+        for shm in self._segments.values():
+            shm.close()
+        self._segments.clear()
+
+
+_browser = None
+
+
+def get_browser():
+    """InlineBrowser or WorkerClient, depending on BROWSER_WORKER"""
+    global _browser
+    if _browser is None:
+        _browser = WorkerClient() if settings.browser_worker == "process" else InlineBrowser()
+    return _browser
+
+
+def main() -> None:
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
+        handlers=[logging.StreamHandler(sys.stdout)]
+    )
+    asyncio.run(run_worker())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,51 @@
+"""
+Shared test setup: make the service package importable and give its settings
+harmless values, so modules that read settings at import time can be tested.
+"""
+import os
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(__file__)), "src"))
+
+os.environ.setdefault("AWS_REGION", "us-east-1")
+os.environ.setdefault("AWS_ACCESS_KEY_ID", "test")
+os.environ.setdefault("AWS_SECRET_ACCESS_KEY", "test")
+os.environ.setdefault("OWNER_PHONE", "+15550000000")
+os.environ.setdefault("IG_THREAD_URL", "https://www.instagram.com/direct/t/340282366841710300949128/")
+os.environ.setdefault("DATA_DIR", tempfile.mkdtemp(prefix="ig-monitor-tests-"))
+
+import pytest  # noqa: E402
+
+from ig_monitor import monitor, settle, state  # noqa: E402
+from tests.fakes import FakeClock, FakeInstagram  # noqa: E402
+
+
+@pytest.fixture
+def reset_browser():
+    """Drop whatever browser the monitor module holds once the test is over"""
+    yield
+    monitor.set_browser_factory(None)
+    monitor._browser = None
+    monitor._context = None
+    monitor._page = None
+    monitor._logged_in = None
+    monitor._launch_task = None
+    monitor._launched_once = False
+
+
+@pytest.fixture
+def fake_ig(tmp_path, monkeypatch, reset_browser):
+    """
+    A scripted Instagram behind the monitor's browser, with the monitor and the
+    settle detector on its virtual clock and a state database of its own. The
+    texts the monitor sends are collected in ig.sent.
+    """
+    monkeypatch.setattr(state, "DB_PATH", str(tmp_path / "state.db"))
+    clock = FakeClock()
+    ig = FakeInstagram(clock)
+    monitor.set_browser_factory(ig.new_context)
+    ig.sent = []
+    monkeypatch.setattr(monitor, "send_sms", lambda to, body: ig.sent.append(body))
+    with clock.patch(monitor, settle):
+        yield ig
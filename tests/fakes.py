@@ -0,0 +1,332 @@
+"""
+In-memory stand-ins for the Playwright objects the monitor uses, driven by a
+scripted Instagram and a fake clock, so the monitor loop can be unit tested and
+profiled without a browser:
+
+    clock = FakeClock()
+    ig = FakeInstagram(clock)
+    ig.add_message("1", "hello", at=30)
+    monitor.set_browser_factory(ig.new_context)
+    with clock.patch(monitor, settle):
+        ...
+
+Only the API surface this project calls is implemented; evaluate() understands
+the project's own scripts (MESSAGES_JS, INBOX_JS, ...) and nothing else.
+"""
+import asyncio
+import json
+import re
+import time
+import types
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, Iterator, List, Optional
+
+from playwright.async_api import TimeoutError as PlaywrightTimeoutError
+
+from ig_monitor.extract import LAST_BUBBLE_JS, MESSAGES_JS
+from ig_monitor.inbox import CLICK_ENTRY_JS, INBOX_JS
+from ig_monitor.settle import SETTLE_JS
+
+
+BASE_URL = "https://www.instagram.com"
+LOGIN_URL = BASE_URL + "/accounts/login/"
+INBOX_URL = BASE_URL + "/direct/inbox/"
+
+# A valid 1x1 PNG, returned by every screenshot
+PNG_1X1 = (
+    b"\x89PNG\r\n\x1a\n\x00\x00\x00\rIHDR\x00\x00\x00\x01\x00\x00\x00\x01\x08\x06\x00\x00\x00\x1f\x15\xc4\x89"
+    b"\x00\x00\x00\nIDATx\x9cc\x00\x01\x00\x00\x05\x00\x01\r\n-\xdb\x00\x00\x00\x00IEND\xaeB`\x82"
+)
+
+
+class FakeClock:
+    """Virtual time: sleeping advances it instantly instead of waiting"""
+
+    def __init__(self, start: float = 1_000_000.0):
+        self.now = start
+        self.epoch_offset = time.time() - start
+        self.slept = 0.0
+
+    def monotonic(self) -> float:
+        return self.now
+
+    def time(self) -> float:
+        return self.now + self.epoch_offset
+
+    def advance(self, seconds: float) -> None:
+        self.now += max(0.0, seconds)
+
+    async def sleep(self, seconds: float, result: Any = None) -> Any:
+        self.advance(seconds)
+        self.slept += max(0.0, seconds)
+        # Still yield to the event loop so other tasks run
+        await asyncio.sleep(0)
+        return result
+
+    @contextmanager
+    def patch(self, *modules: types.ModuleType) -> Iterator["FakeClock"]:
+        """Make the given modules' time.monotonic/time.time/asyncio.sleep use this clock"""
+        fake_time = _Proxy(time, monotonic=self.monotonic, time=self.time)
+        fake_asyncio = _Proxy(asyncio, sleep=self.sleep)
+        saved = []
+        for module in modules:
+            for name, fake in (("time", fake_time), ("asyncio", fake_asyncio)):
+                if getattr(module, name, None) is not None:
+                    saved.append((module, name, getattr(module, name)))
+                    setattr(module, name, fake)
+        try:
+            yield self
+        finally:
+            for module, name, original in saved:
+                setattr(module, name, original)
+
+
+class _Proxy:
+    """A module look-alike with a few attributes overridden"""
+
+    def __init__(self, module: types.ModuleType, **overrides: Callable):
+        self._module = module
+        self.__dict__.update(overrides)
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self._module, name)
+
+
+def _thread_id(url: str) -> Optional[str]:
+    match = re.search(r"/direct/t/([^/?#]+)", url or "")
+    return match.group(1) if match else None
+
+
+class FakeInstagram:
+    """
+    The scripted server side: conversations with message timelines. A message
+    becomes visible once the clock reaches its 'at' time.
+    """
+
+    def __init__(self, clock: Optional[FakeClock] = None, logged_in: bool = True):
+        self.clock = clock or FakeClock()
+        self.logged_in = logged_in
+        self.threads: Dict[str, Dict[str, Any]] = {}
+        self.contexts: List["FakeContext"] = []
+        self.evaluations = 0
+
+    def add_thread(self, thread_id: str, name: Optional[str] = None) -> None:
+        self.threads.setdefault(thread_id, {"name": name or f"User {thread_id}", "messages": [], "read_at": None})
+
+    def add_message(
+        self,
+        thread_id: str,
+        text: str,
+        at: Optional[float] = None,
+        sender: str = "friend",
+        item_id: Optional[str] = None,
+    ) -> None:
+        """Schedule a message; 'at' is seconds from the clock's current time (default: now)"""
+        self.add_thread(thread_id)
+        messages = self.threads[thread_id]["messages"]
+        messages.append({
+            "at": self.clock.now + (at or 0.0),
+            "text": text,
+            "sender": sender,
+            "item_id": item_id,
+        })
+        messages.sort(key=lambda m: m["at"])
+
+    def visible_messages(self, thread_id: str) -> List[Dict[str, Any]]:
+        thread = self.threads.get(thread_id)
+        if thread is None:
+            return []
+        return [m for m in thread["messages"] if m["at"] <= self.clock.now]
+
+    def log_in(self) -> None:
+        """Complete the login; pages on the login form continue to where they were headed"""
+        self.logged_in = True
+        for context in self.contexts:
+            for page in context.pages:
+                if page.url.startswith(LOGIN_URL):
+                    page.url = page.after_login or INBOX_URL
+
+    def log_out(self) -> None:
+        self.logged_in = False
+
+    async def new_context(self) -> "FakeContext":
+        """Browser factory for monitor.set_browser_factory"""
+        context = FakeContext(self)
+        self.contexts.append(context)
+        return context
+
+
+class FakeMouse:
+    def __init__(self, page: "FakePage"):
+        self._page = page
+
+    async def click(self, x: float, y: float, **kwargs: Any) -> None:
+        self._page.input_log.append(("click", x, y))
+
+
+class FakeKeyboard:
+    def __init__(self, page: "FakePage"):
+        self._page = page
+
+    async def type(self, text: str, delay: float = 0, **kwargs: Any) -> None:
+        self._page.input_log.append(("type", text))
+
+    async def press(self, key: str, **kwargs: Any) -> None:
+        self._page.input_log.append(("press", key))
+
+
+class FakeElement:
+    def __init__(self, text: str):
+        self._text = text
+
+    async def inner_text(self) -> str:
+        return self._text
+
+
+class FakePage:
+    def __init__(self, context: "FakeContext"):
+        self.context = context
+        self.ig = context.ig
+        self.url = "about:blank"
+        self.after_login: Optional[str] = None
+        self.mouse = FakeMouse(self)
+        self.keyboard = FakeKeyboard(self)
+        self.input_log: List[tuple] = []
+        self.init_scripts: List[str] = []
+        self._handlers: Dict[str, List[Callable]] = {}
+        self._closed = False
+
+    def on(self, event: str, handler: Callable) -> None:
+        self._handlers.setdefault(event, []).append(handler)
+
+    def is_closed(self) -> bool:
+        return self._closed
+
+    async def close(self) -> None:
+        if not self._closed:
+            self._closed = True
+            for handler in self._handlers.get("close", []):
+                handler(self)
+
+    async def add_init_script(self, script: str) -> None:
+        self.init_scripts.append(script)
+
+    async def goto(self, url: str, wait_until: Optional[str] = None, timeout: Optional[float] = None) -> None:
+        url = str(url)
+        if url.startswith(BASE_URL) and not self.ig.logged_in:
+            self.after_login = url
+            url = LOGIN_URL
+        self.url = url
+        thread_id = _thread_id(url)
+        if thread_id in self.ig.threads:
+            self.ig.threads[thread_id]["read_at"] = self.ig.clock.now
+
+    def _has(self, selector: str) -> bool:
+        if selector == "[role='main']":
+            return self.ig.logged_in and self.url.startswith(BASE_URL) and not self.url.startswith(LOGIN_URL)
+        return False
+
+    async def wait_for_selector(self, selector: str, timeout: Optional[float] = None, **kwargs: Any) -> Optional[FakeElement]:
+        if self._has(selector):
+            return FakeElement("")
+        # Nothing will change while we wait; account for the time a real wait would take
+        await self.ig.clock.sleep((timeout if timeout is not None else 30000) / 1000)
+        raise PlaywrightTimeoutError(f"Timeout {timeout}ms exceeded waiting for {selector}")
+
+    def _current_messages(self) -> List[Dict[str, Any]]:
+        if not self._has("[role='main']"):
+            return []
+        return self.ig.visible_messages(_thread_id(self.url) or "")
+
+    async def query_selector_all(self, selector: str) -> List[FakeElement]:
+        return [FakeElement(m["text"]) for m in self._current_messages()]
+
+    async def evaluate(self, script: str, arg: Any = None) -> Any:
+        self.ig.evaluations += 1
+        if script == MESSAGES_JS:
+            limit = arg[0] if arg else 10
+            messages = self._current_messages()
+            start = max(0, len(messages) - limit)
+            return [
+                {
+                    "text": m["text"],
+                    "dom_id": m["item_id"],
+                    "timestamp": datetime.fromtimestamp(m["at"] + self.ig.clock.epoch_offset, timezone.utc).isoformat(),
+                    "sender": m["sender"],
+                    "index": i,
+                }
+                for i, m in enumerate(messages[start:], start)
+            ]
+        if script == LAST_BUBBLE_JS:
+            messages = self._current_messages()
+            return messages[-1]["text"] if messages else None
+        if script == SETTLE_JS:
+            return {"settled": True, "waited": 0}
+        if script == INBOX_JS:
+            return self._inbox_entries()
+        if script == CLICK_ENTRY_JS:
+            if arg not in self.ig.threads or not self._has("[role='main']"):
+                return False
+            await self.goto(f"{BASE_URL}/direct/t/{arg}/")
+            return True
+        if script == "window.innerHeight":
+            return 768
+        if script.startswith("window.scrollBy"):
+            self.input_log.append(("scroll", script))
+            return None
+        raise NotImplementedError(f"FakePage.evaluate does not know this script: {script[:60]!r}")
+
+    def _inbox_entries(self) -> List[Dict[str, Any]]:
+        if not self._has("[role='main']"):
+            return []
+        entries = []
+        for thread_id, thread in self.ig.threads.items():
+            messages = self.ig.visible_messages(thread_id)
+            if not messages:
+                continue
+            last = messages[-1]
+            entries.append({
+                "key": thread_id,
+                "href": f"/direct/t/{thread_id}/",
+                "name": thread["name"],
+                "snippet": last["text"][:200],
+                "timestamp": str(last["at"]),
+                "unread": thread["read_at"] is None or last["at"] > thread["read_at"],
+            })
+        return entries
+
+    async def screenshot(self, **kwargs: Any) -> bytes:
+        return PNG_1X1
+
+
+class FakeContext:
+    def __init__(self, ig: FakeInstagram):
+        self.ig = ig
+        self.pages: List[FakePage] = []
+        self.closed = False
+
+    async def new_page(self) -> FakePage:
+        page = FakePage(self)
+        self.pages.append(page)
+        return page
+
+    async def cookies(self) -> List[Dict[str, Any]]:
+        if not self.ig.logged_in:
+            return []
+        return [
+            {"name": "sessionid", "value": "fake-session", "domain": ".instagram.com", "path": "/"},
+            {"name": "csrftoken", "value": "fake-csrf", "domain": ".instagram.com", "path": "/"},
+        ]
+
+    async def storage_state(self, path: Optional[str] = None) -> Dict[str, Any]:
+        state = {"cookies": await self.cookies(), "origins": []}
+        if path:
+            with open(path, "w", encoding="utf-8") as fh:
+                json.dump(state, fh)
+        return state
+
+    async def close(self) -> None:
+        self.closed = True
+        for page in self.pages:
+            await page.close()
@@ -0,0 +1,141 @@
+"""
+Endpoint tests against a recording stand-in for the browser owner.
+"""
+
+import asyncio
+import json
+
+import pytest
+from fastapi.testclient import TestClient
+from starlette.websockets import WebSocketDisconnect
+
+import app as app_module
+from ig_monitor import events
+from ig_monitor.scheduler import SchedulerBusy
+
+
+class RecordingBrowser:
+    """Answers browser.call() like the worker would and records each operation"""
+
+    def __init__(self, busy=()):
+        self.calls = []
+        self.busy = set(busy)
+        self.healthy = True
+
+    async def call(self, op, **args):
+        self.calls.append((op, args))
+        if op in self.busy:
+            raise SchedulerBusy("page busy", retry_after=2)
+        if op in ("navigate", "settle"):
+            return {"url": args.get("url", "https://www.instagram.com/")}
+        return {}
+
+    async def health(self):
+        return {"healthy": self.healthy}
+
+
+@pytest.fixture
+def browser(monkeypatch):
+    recording = RecordingBrowser()
+    monkeypatch.setattr(app_module, "browser", recording)
+    monkeypatch.setattr(app_module.settings, "app_secret_token", "s3cret")
+    return recording
+
+
+def _receive_until_idle(ws):
+    replies = []
+    while True:
+        reply = ws.receive_json()
+        replies.append(reply)
+        if reply.get("idle"):
+            return replies
+
+
+def test_websocket_runs_inputs_in_order_and_acks_each(browser):
+    client = TestClient(app_module.app)
+    with client.websocket_connect("/browser/ws?token=s3cret") as ws:
+        ws.send_json({"id": 1, "type": "click", "x": 10, "y": 20})
+        ws.send_json({"id": 2, "type": "type", "text": "hello"})
+        ws.send_json({"id": 3, "type": "key", "key": "Enter"})
+        replies = _receive_until_idle(ws)
+        while len([r for r in replies if "ack" in r]) < 3:
+            replies += _receive_until_idle(ws)
+
+    acks = [r for r in replies if "ack" in r]
+    assert [a["ack"] for a in acks] == [1, 2, 3] and all(a["ok"] for a in acks)
+    inputs = [(op, args) for op, args in browser.calls if op != "settle"]
+    assert inputs == [
+        ("click", {"x": 10, "y": 20, "settle": False}),
+        ("type", {"text": "hello"}),
+        ("key", {"key": "Enter", "settle": False}),
+    ]
+    # Settling (and the client's screenshot refresh) happens per burst, not per input
+    assert replies[-1]["idle"] and browser.calls[-1][0] == "settle"
+
+
+def test_websocket_reports_bad_and_refused_inputs(browser):
+    browser.busy.add("scroll")
+    client = TestClient(app_module.app)
+    with client.websocket_connect("/browser/ws?token=s3cret") as ws:
+        ws.send_json({"id": "a", "type": "wiggle"})
+        first = ws.receive_json()
+        _receive_until_idle(ws)
+        ws.send_json({"id": "b", "type": "scroll", "direction": "down"})
+        second = ws.receive_json()
+
+    assert first["ack"] == "a" and not first["ok"] and "Unknown input type" in first["error"]
+    assert second["ack"] == "b" and not second["ok"] and second["retry_after"] == 2
+
+
+def test_websocket_requires_the_token(browser):
+    client = TestClient(app_module.app)
+    with pytest.raises(WebSocketDisconnect) as closed:
+        with client.websocket_connect("/browser/ws?token=wrong") as ws:
+            ws.receive_json()
+    assert closed.value.code == 1008
+    assert browser.calls == []
+
+
+def test_healthz_fails_while_the_heartbeat_is_stale(browser):
+    client = TestClient(app_module.app)
+    assert client.get("/healthz").json()["status"] == "ok"
+    browser.healthy = False
+    response = client.get("/healthz")
+    assert response.status_code == 503 and response.json()["status"] == "stale"
+
+
+def test_dashboard_status_answers_from_the_snapshot(browser):
+    events.update_status(running=True, sms={"sent": 3}, logged_in=False)
+    events.publish("disk", total=2048, profile_total=1024)
+    client = TestClient(app_module.app)
+    status = client.get("/dashboard/status?token=s3cret").json()
+    assert (status["running"], status["sms"], status["logged_in"]) == (True, {"sent": 3}, False)
+    assert (status["disk_total"], status["profile_total"]) == (2048, 1024)
+    assert browser.calls == []
+
+
+def test_dashboard_events_stream_snapshot_then_changes(browser, monkeypatch):
+    monkeypatch.setattr(app_module, "SSE_KEEPALIVE_SECONDS", 0.05)
+
+    async def go():
+        response = await app_module.dashboard_events(token="s3cret")
+        stream = response.body_iterator
+        chunks = [await stream.__anext__()]
+        events.publish("message", id="m1", text="hi")
+        chunks.append(await stream.__anext__())
+        # Nothing happening: a comment line keeps proxies from closing the stream
+        chunks.append(await stream.__anext__())
+        subscribed = events.subscriber_count()
+        await stream.aclose()
+        return response, chunks, subscribed
+
+    response, chunks, subscribed = asyncio.run(go())
+    assert response.media_type == "text/event-stream"
+    assert chunks[0].startswith("event: snapshot\ndata: ")
+    assert json.loads(chunks[0].split("data: ", 1)[1])["thread_url"]
+    assert chunks[1].startswith("event: message\n")
+    assert json.loads(chunks[1].split("data: ", 1)[1])["data"] == {"id": "m1", "text": "hi"}
+    assert chunks[2] == ": keepalive\n\n"
+    # Closing the stream unsubscribes it
+    assert subscribed == 1 and events.subscriber_count() == 0
+    assert browser.calls == []
@@ -0,0 +1,144 @@
+"""
+Tests for the thread leases and node coordination, against both lease backends.
+"""
+
+import asyncio
+
+import pytest
+
+from ig_monitor import state
+from tests.fakes import FakeClock
+
+
+TTL = 60
+
+
+@pytest.fixture(params=["file", "sql"])
+def backend(request, tmp_path):
+    clock = FakeClock()
+    if request.param == "file":
+        lease_backend = state.FileLeaseBackend(str(tmp_path / "leases.json"))
+    else:
+        lease_backend = state.SqlLeaseBackend(str(tmp_path / "coordination.db"))
+    lease_backend.clock = clock
+    with clock.patch(state):
+        yield lease_backend
+
+
+def test_acquire_renew_and_steal_after_expiry(backend):
+    async def go():
+        assert await backend.acquire("t1", "a", TTL)
+        assert not await backend.acquire("t1", "b", TTL)
+        # The holder renews its own lease
+        backend.clock.advance(TTL - 1)
+        assert await backend.acquire("t1", "a", TTL)
+        backend.clock.advance(TTL - 1)
+        assert not await backend.acquire("t1", "b", TTL)
+        # a stopped renewing: once the lease expires b takes over
+        backend.clock.advance(2)
+        assert await backend.acquire("t1", "b", TTL)
+        assert not await backend.acquire("t1", "a", TTL)
+
+    asyncio.run(go())
+
+
+def test_release_and_leave_free_leases(backend):
+    async def go():
+        await backend.heartbeat("a", TTL)
+        assert await backend.acquire("t1", "a", TTL)
+        assert await backend.acquire("t2", "a", TTL)
+        await backend.release("t1", "b")  # not b's to release
+        assert not await backend.acquire("t1", "b", TTL)
+        await backend.release("t1", "a")
+        assert await backend.acquire("t1", "b", TTL)
+
+        await backend.leave("a")
+        assert await backend.live_nodes() == []
+        assert await backend.acquire("t2", "b", TTL)
+
+    asyncio.run(go())
+
+
+def test_threads_split_by_preferred_node_and_fail_over(backend):
+    threads = [f"thread-{i}" for i in range(12)]
+
+    async def go():
+        a = state.Coordinator(backend, "node-a", TTL)
+        b = state.Coordinator(backend, "node-b", TTL)
+        await a.backend.heartbeat("node-a", TTL)
+        await b.backend.heartbeat("node-b", TTL)
+        owned_a = set(await a.claim(threads))
+        owned_b = set(await b.claim(threads))
+        assert owned_a | owned_b == set(threads) and not owned_a & owned_b
+        assert owned_a == {t for t in threads if state._preferred_node(t, ["node-a", "node-b"]) == "node-a"}
+        assert owned_a and owned_b
+
+        # b dies: once its heartbeat and leases expire, a owns everything
+        for _ in range(3):
+            backend.clock.advance(TTL / 2)
+            await a.claim(threads)
+        assert set(await a.claim(threads)) == set(threads)
+
+    asyncio.run(go())
+
+
+def test_node_id_survives_restart_but_is_unique_per_process(tmp_path):
+    directory = str(tmp_path / "node-ids")
+    first, first_lock = state._claim_node_id(directory)
+    second, second_lock = state._claim_node_id(directory)
+    assert first != second
+
+    # The first process exits; its replacement picks up the same id (and its leases)
+    first_lock.close()
+    restarted, restarted_lock = state._claim_node_id(directory)
+    assert restarted == first
+    second_lock.close()
+    restarted_lock.close()
+
+
+def test_backend_interface_is_abstract():
+    with pytest.raises(TypeError):
+        state.LeaseBackend()
+
+
+def test_seen_set_is_shared_through_the_coordination_database(tmp_path, monkeypatch):
+    monkeypatch.setattr(state, "SEEN_DB_PATH", str(tmp_path / "coordination.db"))
+
+    async def go():
+        monkeypatch.setattr(state, "DB_PATH", str(tmp_path / "node-a.db"))
+        await state.init_state()
+        await state.mark_seen("t1", ["m1", "m2"])
+        # The node that takes the thread over has its own state database
+        monkeypatch.setattr(state, "DB_PATH", str(tmp_path / "node-b.db"))
+        await state.init_state()
+        assert await state.has_seen_any("t1")
+        assert await state.filter_unseen("t1", ["m1", "m2", "m3"]) == ["m3"]
+
+    asyncio.run(go())
+
+
+def test_warns_when_the_sql_backend_is_not_shared(tmp_path, monkeypatch, caplog):
+    monkeypatch.setattr(state._settings, "coordination_db_path", None)
+    state._warn_if_local(state.DB_PATH)
+    assert "without COORDINATION_DB_PATH" in caplog.text
+
+    caplog.clear()
+    monkeypatch.setattr(state._settings, "coordination_db_path", str(tmp_path / "shared.db"))
+    monkeypatch.setattr(state, "_filesystem_type", lambda path: "ext4")
+    state._warn_if_local(str(tmp_path / "shared.db"))
+    assert "local ext4 filesystem" in caplog.text
+
+    caplog.clear()
+    monkeypatch.setattr(state, "_filesystem_type", lambda path: "nfs4")
+    state._warn_if_local(str(tmp_path / "shared.db"))
+    assert caplog.text == ""
+
+
+def test_replicas_sharing_data_dir_need_their_own_profile(tmp_path):
+    first = state._claim_profile_dir(str(tmp_path), "user_data_dir")
+    with pytest.raises(RuntimeError, match="USER_DATA_DIR_NAME"):
+        state._claim_profile_dir(str(tmp_path), "user_data_dir")
+    # A per-node profile name is fine
+    second = state._claim_profile_dir(str(tmp_path), "user_data_dir-b")
+    first.close()
+    second.close()
@@ -0,0 +1,57 @@
+"""
+Per-engine launch and context option tests.
+"""
+
+import pytest
+
+from ig_monitor import engines
+
+
+def test_default_chromium_launch_is_playwrights_default():
+    options = engines.launch_options("chromium", headless=True)
+    assert options == {"headless": True, "args": engines.CHROMIUM_ARGS}
+    assert "channel" not in engines.launch_options("chromium", headless=False)
+
+
+def test_new_headless_is_opt_in_and_needs_a_recent_playwright(monkeypatch):
+    monkeypatch.setattr(engines, "_playwright_version", lambda: (1, 49))
+    assert engines.launch_options("chromium-new-headless", headless=True)["channel"] == "chromium"
+    # Headed runs are full Chromium anyway
+    assert "channel" not in engines.launch_options("chromium-new-headless", headless=False)
+
+    monkeypatch.setattr(engines, "_playwright_version", lambda: (1, 47))
+    with pytest.raises(ValueError, match="needs Playwright >= 1.49"):
+        engines.launch_options("chromium-new-headless", headless=True)
+
+
+def test_headless_shell_is_asked_for_by_channel(monkeypatch):
+    monkeypatch.setattr(engines, "_playwright_version", lambda: (1, 49))
+    for headless in (True, False):
+        options = engines.launch_options("chromium-headless-shell", headless=headless)
+        # Not left to Playwright's default, which is the same launch as "chromium"
+        assert options["channel"] == "chromium-headless-shell"
+        assert options["headless"] is True
+    assert options != engines.launch_options("chromium", headless=True)
+
+    monkeypatch.setattr(engines, "_playwright_version", lambda: (1, 47))
+    with pytest.raises(ValueError, match="chromium-headless-shell needs Playwright >= 1.49"):
+        engines.launch_options("chromium-headless-shell", headless=True)
+
+
+def test_other_engines():
+    firefox = engines.launch_options("firefox", headless=True)
+    assert firefox["firefox_user_prefs"]["dom.webdriver.enabled"] is False
+    assert engines.launch_options("webkit", headless=False) == {"headless": False}
+
+
+def test_chrome_fingerprint_only_on_chromium():
+    for engine in ("chromium", "chromium-headless-shell", "chromium-new-headless"):
+        assert engines.context_options(engine)["user_agent"] == engines.CHROME_USER_AGENT
+        assert "permissions" in engines.stealth_script(engine)
+    for engine in ("firefox", "webkit"):
+        assert "user_agent" not in engines.context_options(engine)
+
+
+def test_unknown_engine_is_rejected():
+    with pytest.raises(ValueError, match="Unknown BROWSER_ENGINE"):
+        engines.launch_options("chrome", headless=True)
@@ -0,0 +1,101 @@
+"""
+Event bus tests: the status snapshot and fan-out to dashboard subscribers.
+"""
+
+import asyncio
+
+import pytest
+
+from ig_monitor import events, monitor, state
+from ig_monitor.http_backend import thread_id_from_url
+
+
+@pytest.fixture(autouse=True)
+def clean_status(monkeypatch):
+    monkeypatch.setattr(events, "_status", {})
+
+
+def test_events_fold_into_the_status_snapshot():
+    events.publish("state", running=True, url="https://www.instagram.com/direct/inbox/")
+    events.publish("login", logged_in=False)
+    events.publish("message", id="m1", text="hi")
+    events.publish("error", error="boom", detail="ignored")
+    events.publish("poll", url="https://www.instagram.com/direct/t/1/")
+
+    snapshot = events.status_snapshot()
+    assert snapshot["running"] is True and snapshot["logged_in"] is False
+    assert snapshot["last_message"]["text"] == "hi" and "ts" in snapshot["last_message"]
+    assert snapshot["last_error"]["error"] == "boom"
+    assert snapshot["url"] == "https://www.instagram.com/direct/t/1/"
+    # A copy: callers can't change the snapshot
+    snapshot["running"] = False
+    assert events.status_snapshot()["running"] is True
+
+
+def test_subscribers_get_every_event_until_they_leave():
+    async def go():
+        with events.subscribe() as first, events.subscribe() as second:
+            assert events.subscriber_count() == 2
+            events.publish("lease", thread="t1", owned=True)
+            for queue in (first, second):
+                event = queue.get_nowait()
+                assert event["type"] == "lease" and event["data"] == {"thread": "t1", "owned": True}
+        assert events.subscriber_count() == 0
+        # Nobody listening: publishing still updates the snapshot
+        events.publish("state", running=False)
+        assert events.status_snapshot()["running"] is False
+
+    asyncio.run(go())
+
+
+def test_slow_subscriber_loses_oldest_events(monkeypatch):
+    monkeypatch.setattr(events, "MAX_QUEUED_EVENTS", 3)
+
+    async def go():
+        with events.subscribe() as queue:
+            for i in range(5):
+                events.publish("state", n=i)
+            return [queue.get_nowait()["data"]["n"] for _ in range(queue.qsize())]
+
+    assert asyncio.run(go()) == [2, 3, 4]
+
+
+def test_publishing_from_a_worker_thread_hands_over_to_the_loop(monkeypatch):
+    delivered_on = []
+    real_forward = events.forward
+
+    def forward(event):
+        delivered_on.append(asyncio.get_running_loop())
+        real_forward(event)
+    monkeypatch.setattr(events, "forward", forward)
+
+    async def go():
+        with events.subscribe() as queue:
+            await asyncio.to_thread(events.publish, "state", sms={"sent": 1})
+            event = await asyncio.wait_for(queue.get(), 1)
+        assert delivered_on == [asyncio.get_running_loop()]
+        return event
+
+    assert asyncio.run(go())["data"] == {"sms": {"sent": 1}}
+    assert events.status_snapshot()["sms"] == {"sent": 1}
+
+
+def test_monitor_publishes_new_messages(fake_ig, monkeypatch):
+    fake_ig.add_message(thread_id_from_url(str(monitor.settings.ig_thread_url)), "hello")
+
+    async def once():
+        once.calls += 1
+        return once.calls <= 1
+    once.calls = 0
+    monkeypatch.setattr(monitor, "is_running", once)
+
+    async def go():
+        await state.init_state()
+        with events.subscribe() as queue:
+            await monitor._monitor_loop()
+            return [queue.get_nowait() for _ in range(queue.qsize())]
+
+    published = asyncio.run(go())
+    messages = [e["data"] for e in published if e["type"] == "message"]
+    assert [m["text"] for m in messages] == ["hello"]
+    assert events.status_snapshot()["last_message"]["text"] == "hello"
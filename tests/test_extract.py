@@ -0,0 +1,69 @@
+"""
+Message id tests: the id each extracted row gets must not change between polls.
+"""
+
+from ig_monitor.extract import assign_message_ids
+
+
+THREAD = "https://www.instagram.com/direct/t/1/"
+
+
+def _rows(*specs):
+    """(text, timestamp label[, sender[, dom_id]]) tuples as MESSAGES_JS returns them"""
+    rows = []
+    for spec in specs:
+        text, timestamp, sender, dom_id = spec + ("friend", None)[len(spec) - 2:]
+        rows.append({"text": text, "timestamp": timestamp, "sender": sender, "dom_id": dom_id})
+    return rows
+
+
+def _context(text, sender="friend"):
+    """The row before the window's first separator, as MESSAGES_JS puts it first"""
+    return [{"text": text, "sender": sender, "context": True}]
+
+
+def _ids(rows, network=None):
+    return [r["id"] for r in assign_message_ids(THREAD, rows, network)]
+
+
+def test_dom_and_payload_ids_come_first():
+    rows = _rows(("hi", "t", "friend", "mid.1"), ("ok", "t"), ("ok", "t"))
+    network = {"ok": [{"item_id": "10"}, {"item_id": "11"}, {"item_id": "12"}]}
+    # The newest "ok"s on screen are the newest in the payload
+    assert _ids(rows, network) == ["dom:mid.1", "ig:11", "ig:12"]
+    # Not enough payload items to line up: hash instead of guessing
+    assert _ids(_rows(("ok", "t"), ("ok", "t")), {"ok": [{"item_id": "12"}]})[0].startswith("h:")
+
+
+def test_relative_time_labels_do_not_change_ids():
+    today = _ids(_rows(("hello", "Today 3:45 PM"), ("see you", "Today 3:45 PM")))
+    tomorrow = _ids(_rows(("hello", "Yesterday 3:45 PM"), ("see you", "Yesterday 3:45 PM")))
+    assert today == tomorrow
+    assert _ids(_rows(("hello", "2m"))) == _ids(_rows(("hello", "1h")))
+
+
+def test_duplicates_keep_their_ids_as_the_window_moves():
+    first = _ids(_rows(("ok", "3:40 PM"), ("ok", "3:40 PM"), ("ok", "3:45 PM")))
+    # One more message; the oldest rows of the earlier group drop out of the
+    # window, but the window starts at a separator, so counting restarts there,
+    # and the message before the separator still comes along as context
+    later = _ids(_context("ok") + _rows(("ok", "3:45 PM"), ("ok", "3:45 PM")))
+    assert len(later) == 2
+    assert later[0] == first[2]
+    assert later[1] not in first
+
+
+def test_same_text_in_different_groups_or_threads_differs():
+    ids = _ids(_rows(("ok", "3:40 PM"), ("ok", "3:45 PM"), ("ok", "3:45 PM", "me")))
+    assert len(set(ids)) == 3
+    other_thread = assign_message_ids("https://www.instagram.com/direct/t/2/", _rows(("ok", "3:40 PM")))
+    assert other_thread[0]["id"] != ids[0]
+
+
+def test_same_text_under_recurring_labels_differs():
+    # Relative labels carry no stable time, and a time of day recurs on another day
+    for earlier, later in (("2h", "5m"), ("Yesterday 3:45 PM", "Today 3:45 PM")):
+        ids = _ids(_rows(("ok", earlier), ("see you", earlier), ("ok", later)))
+        assert ids[0] != ids[2]
+        # The second "ok" keeps its id once the first one has left the window
+        assert _ids(_context("see you") + _rows(("ok", later)))[0] == ids[2]
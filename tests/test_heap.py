@@ -0,0 +1,76 @@
+"""
+Tests for the heap diagnostics.
+"""
+
+import asyncio
+import os
+
+from ig_monitor import heap
+
+
+class FakeCDPSession:
+    def __init__(self):
+        self.detached = False
+
+    async def send(self, method, params=None):
+        if method == "Performance.getMetrics":
+            return {"metrics": [
+                {"name": "JSHeapUsedSize", "value": 12_000_000.0},
+                {"name": "Nodes", "value": 4200.0},
+                {"name": "JSEventListeners", "value": 310.0},
+                {"name": "LayoutCount", "value": 7.0},
+            ]}
+        return {}
+
+    async def detach(self):
+        self.detached = True
+
+
+class FakeCDPContext:
+    def __init__(self, session=None):
+        self.session = session
+
+    async def new_cdp_session(self, page):
+        if self.session is None:
+            raise RuntimeError("CDP session is only available in Chromium")
+        return self.session
+
+
+class FakeCDPPage:
+    url = "https://www.instagram.com/direct/t/1/"
+
+    def __init__(self, context):
+        self.context = context
+
+
+def test_reports_growth_since_last_and_start():
+    try:
+        first = asyncio.run(heap.report())
+        assert first["python"]["since_last"] == [] and first["browser"] is None
+        kept = [bytearray(1000) for _ in range(2000)]  # noqa: F841 - kept alive for the snapshot
+        second = asyncio.run(heap.report(limit=5))
+        top = second["python"]["since_last"][0]
+        assert top["site"].startswith(os.path.abspath(__file__)) and top["size_diff"] > 1_000_000
+        assert second["python"]["by_origin_since_start"]["other"]["size_diff"] > 1_000_000
+        assert len(heap.history) >= 2
+    finally:
+        assert heap.stop_tracing()
+
+
+def test_origin_of_allocation_sites():
+    assert heap.origin(heap.__file__) == "ig_monitor"
+    assert heap.origin(os.path.join(os.sep, "venv", "site-packages", "playwright", "_impl", "_connection.py")) == "playwright"
+    assert heap.origin(asyncio.__file__) == "other"
+
+
+def test_page_figures_over_cdp():
+    session = FakeCDPSession()
+    figures = asyncio.run(heap.browser_report(FakeCDPPage(FakeCDPContext(session))))
+    assert figures == {
+        "js_heap_used": 12_000_000, "dom_nodes": 4200, "js_event_listeners": 310,
+        "url": "https://www.instagram.com/direct/t/1/",
+    }
+    assert session.detached
+
+    figures = asyncio.run(heap.browser_report(FakeCDPPage(FakeCDPContext())))
+    assert figures["error"].startswith("CDP unavailable")
@@ -0,0 +1,125 @@
+"""
+Tests for the browserless HTTP backend against a local stub of IG's web API.
+"""
+
+import asyncio
+import http.server
+import json
+import threading
+from urllib.parse import urlparse
+
+import pytest
+
+from ig_monitor.http_backend import (
+    IG_APP_ID,
+    InstagramHttpClient,
+    SessionNeedsAttention,
+    cookies_from_storage_state,
+)
+from ig_monitor.rules import RuleSet
+
+
+WEB_ID = "340282366841710300949128"
+API_ID = "17842000000000001"
+COOKIES = {"sessionid": "abc", "csrftoken": "tok"}
+
+
+class StubInstagram(http.server.BaseHTTPRequestHandler):
+    logged_in = True
+    requests = []
+
+    def do_GET(self):
+        StubInstagram.requests.append((self.path, dict(self.headers)))
+        path = urlparse(self.path).path
+        if not self.logged_in:
+            self._send(200, {"message": "login_required", "status": "fail"})
+        elif path == "/api/v1/direct_v2/inbox/":
+            self._send(200, {"inbox": {"threads": [{
+                "thread_id": API_ID,
+                "thread_v2_id": WEB_ID,
+                "thread_title": "Alice",
+                "users": [{"pk": 7, "username": "alice.smith", "full_name": "Alice"}],
+                "items": [
+                    {"item_id": "2", "user_id": 7, "timestamp": 2, "item_type": "media_share"},
+                    {"item_id": "1", "user_id": 7, "timestamp": 1, "item_type": "text", "text": "hi"},
+                ],
+            }]}})
+        elif path == f"/api/v1/direct_v2/threads/{API_ID}/":
+            self._send(200, {"thread": {"items": [
+                {"item_id": "4", "user_id": 9, "timestamp": 4, "item_type": "text", "text": "unnamed"},
+                {"item_id": "3", "user_id": 7, "timestamp": 3, "item_type": "text", "text": "newest"},
+                {"item_id": "2", "user_id": 7, "timestamp": 2, "item_type": "text", "text": "older"},
+            ]}})
+        else:
+            self._send(404, {"status": "fail"})
+
+    def _send(self, status, payload):
+        body = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def stub_url():
+    StubInstagram.logged_in = True
+    StubInstagram.requests = []
+    server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), StubInstagram)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield f"http://127.0.0.1:{server.server_address[1]}"
+    server.shutdown()
+
+
+def _run(stub_url, calls):
+    async def go():
+        client = InstagramHttpClient(COOKIES, base_url=stub_url)
+        try:
+            return await calls(client)
+        finally:
+            await client.aclose()
+    return asyncio.run(go())
+
+
+def test_inbox_maps_web_ids_and_messages(stub_url):
+    threads = _run(stub_url, lambda c: c.inbox())
+    assert threads[0]["key"] == WEB_ID
+    assert threads[0]["name"] == "Alice"
+    assert [m["id"] for m in threads[0]["messages"]] == ["ig:1", "ig:2"]
+    assert threads[0]["messages"][1]["text"] == "[media share]"
+
+
+def test_thread_messages_resolve_api_id_and_send_session_headers(stub_url):
+    messages = _run(stub_url, lambda c: c.thread_messages(WEB_ID))
+    assert [(m["id"], m["text"]) for m in messages] == [("ig:2", "older"), ("ig:3", "newest"), ("ig:4", "unnamed")]
+    path, headers = StubInstagram.requests[-1]
+    assert path.startswith(f"/api/v1/direct_v2/threads/{API_ID}/")
+    assert headers["X-IG-App-ID"] == IG_APP_ID
+    assert headers["X-CSRFToken"] == "tok"
+    assert "sessionid=abc" in headers["Cookie"]
+
+
+def test_senders_are_display_names_like_the_browser_paths(stub_url):
+    threads = _run(stub_url, lambda c: c.inbox())
+    assert {m["sender"] for m in threads[0]["messages"]} == {"Alice"}
+    # Names learned from the inbox carry over to thread fetches; unknown users keep their id
+    messages = _run(stub_url, lambda c: c.thread_messages(WEB_ID))
+    assert [m["sender"] for m in messages] == ["Alice", "Alice", "9"]
+    assert RuleSet({"allow_senders": ["alice"]}).evaluate("hi", sender=messages[0]["sender"])["priority"] == "normal"
+
+
+def test_login_required_needs_attention(stub_url):
+    StubInstagram.logged_in = False
+    with pytest.raises(SessionNeedsAttention):
+        _run(stub_url, lambda c: c.inbox())
+
+
+def test_missing_session_cookie_needs_attention(tmp_path):
+    state = tmp_path / "storage_state.json"
+    state.write_text(json.dumps({"cookies": [{"name": "csrftoken", "value": "tok", "domain": ".instagram.com"}]}))
+    with pytest.raises(SessionNeedsAttention):
+        InstagramHttpClient(cookies_from_storage_state(str(state)))
@@ -0,0 +1,136 @@
+"""
+Inbox mode tests: the entry diff and a monitor loop watching every thread from the DM list.
+"""
+
+import asyncio
+
+import pytest
+
+from ig_monitor import monitor, rules, state
+from ig_monitor.inbox import changed_entries, entry_signature
+
+
+def _entry(key, snippet="hi", timestamp="1m", unread=False):
+    return {"key": key, "name": f"User {key}", "snippet": snippet, "timestamp": timestamp, "unread": unread}
+
+
+def _baseline(*entries):
+    return {e["key"]: list(entry_signature(e)) for e in entries}
+
+
+def test_only_changed_entries_are_reported():
+    previous = _baseline(_entry("a"), _entry("b"), _entry("c"))
+    entries = [
+        _entry("a"),
+        _entry("b", snippet="new text", timestamp="now", unread=True),
+        _entry("c", timestamp="now"),
+    ]
+    assert [e["key"] for e in changed_entries(entries, previous)] == ["b", "c"]
+
+
+def test_unknown_entries_need_an_unread_marker():
+    entries = [_entry("old"), _entry("new", unread=True)]
+    assert [e["key"] for e in changed_entries(entries, {})] == ["new"]
+
+
+def test_reading_a_thread_is_not_a_new_message():
+    previous = _baseline(_entry("a", unread=True))
+    assert changed_entries([_entry("a", unread=False)], previous) == []
+    # but the same text arriving again does show up as unread
+    assert changed_entries([_entry("a", unread=True, timestamp="now")], previous)
+
+
+@pytest.fixture
+def inbox_ig(fake_ig, monkeypatch):
+    monkeypatch.setattr(monitor.settings, "monitor_mode", "inbox")
+    return fake_ig
+
+
+def test_inbox_mode_opens_only_threads_with_news(inbox_ig, monkeypatch):
+    inbox_ig.add_thread("100", name="Alice")
+    inbox_ig.add_thread("200", name="Bob")
+    inbox_ig.add_message("100", "hi from alice")
+    inbox_ig.add_message("200", "hi from bob")
+    inbox_ig.add_message("200", "bob again", at=500)
+
+    opened = []
+    real_open_entry = monitor.open_entry
+
+    async def open_entry(page, key):
+        opened.append(key)
+        return await real_open_entry(page, key)
+    monkeypatch.setattr(monitor, "open_entry", open_entry)
+
+    async def limited_running():
+        limited_running.calls += 1
+        return limited_running.calls <= 12
+    limited_running.calls = 0
+    monkeypatch.setattr(monitor, "is_running", limited_running)
+
+    async def go():
+        await state.init_state()
+        await monitor._monitor_loop()
+    asyncio.run(go())
+
+    # First pass: both threads show unread and are opened once; afterwards only
+    # Bob's thread changes
+    assert opened.count("100") == 1
+    assert opened.count("200") == 2
+    assert inbox_ig.sent == ["IG (Alice): hi from alice", "IG (Bob): hi from bob", "IG (Bob): bob again"]
+
+
+def test_thread_name_stands_in_for_an_unknown_sender(inbox_ig, tmp_path, monkeypatch):
+    rules_file = tmp_path / "rules.json"
+    rules_file.write_text('{"allow_senders": ["Alice"]}')
+    monkeypatch.setattr(rules.settings, "rules_path", str(rules_file))
+    inbox_ig.add_thread("100", name="Alice")
+    inbox_ig.add_thread("200", name="Bob")
+    inbox_ig.add_message("100", "from alice", sender=None)
+    inbox_ig.add_message("200", "from bob", sender=None)
+
+    async def once():
+        once.calls += 1
+        return once.calls <= 1
+    once.calls = 0
+    monkeypatch.setattr(monitor, "is_running", once)
+
+    async def go():
+        await state.init_state()
+        await monitor._monitor_loop()
+    asyncio.run(go())
+
+    assert inbox_ig.sent == ["IG (Alice): from alice"]
+
+
+def test_entries_not_handled_this_pass_stay_changed(inbox_ig, monkeypatch):
+    inbox_ig.add_thread("100", name="Alice")
+    inbox_ig.add_thread("200", name="Bob")
+    inbox_ig.add_message("100", "hi from alice")
+    inbox_ig.add_message("200", "hi from bob")
+    passes = []
+
+    async def claim(keys):
+        # Another node holds Bob's thread on the first pass
+        return set(keys) - {"200"} if len(passes) == 1 else set(keys)
+    monkeypatch.setattr(monitor, "_claim_threads", claim)
+
+    real_open_entry = monitor.open_entry
+
+    async def open_entry(page, key):
+        # ...and on the second pass it fails to open
+        if key == "200" and len(passes) == 2:
+            return False
+        return await real_open_entry(page, key)
+    monkeypatch.setattr(monitor, "open_entry", open_entry)
+
+    async def three_passes():
+        passes.append(True)
+        return len(passes) <= 3
+    monkeypatch.setattr(monitor, "is_running", three_passes)
+
+    async def go():
+        await state.init_state()
+        await monitor._monitor_loop()
+    asyncio.run(go())
+
+    assert inbox_ig.sent == ["IG (Alice): hi from alice", "IG (Bob): hi from bob"]
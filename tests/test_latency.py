@@ -0,0 +1,63 @@
+"""
+Tests for the notification latency stamps and percentiles.
+"""
+
+from ig_monitor import events
+from ig_monitor.latency import LatencyTracker, parse_ig_timestamp, percentile
+
+
+def test_parses_api_and_page_timestamps():
+    assert parse_ig_timestamp("1700000000123456") == 1700000000.123456
+    assert parse_ig_timestamp(1700000000123) == 1700000000.123
+    assert parse_ig_timestamp("2023-11-14T22:13:20.000Z") == 1700000000.0
+    assert parse_ig_timestamp("2h") is None
+    assert parse_ig_timestamp(None) is None
+
+
+def test_nearest_rank_percentiles():
+    values = list(range(1, 101))
+    assert [percentile(values, p) for p in (50, 95, 99)] == [50, 95, 99]
+    assert percentile([7], 99) == 7
+    assert percentile([], 50) is None
+
+
+def test_seen_falls_back_to_poll_start():
+    stamps = LatencyTracker.start({"id": "ig:a", "timestamp": "Yesterday"}, 100.0, 101.0)
+    assert stamps["seen_source"] == "poll" and stamps["seen"] == 100.0
+    # A timestamp from the future (clock skew) isn't trusted either
+    stamps = LatencyTracker.start({"id": "ig:b", "timestamp": 500}, 100.0, 101.0)
+    assert stamps["seen_source"] == "poll"
+    stamps = LatencyTracker.start({"id": "ig:c", "timestamp": 90}, 100.0, 101.0)
+    assert stamps["seen_source"] == "ig" and stamps["seen"] == 90.0
+
+
+def test_page_group_labels_are_not_send_times():
+    # A page row's timestamp is its group's separator, possibly minutes older than the message
+    for message_id in ("dom:mid.1", "h:3f2a"):
+        stamps = LatencyTracker.start({"id": message_id, "timestamp": 90}, 100.0, 101.0)
+        assert stamps["seen_source"] == "poll" and stamps["seen"] == 100.0
+
+
+def test_slo_breach_alerts_once_then_recovers():
+    tracker = LatencyTracker(window=4, slo_seconds=60)
+    with events.subscribe() as queue:
+        for e2e in (10, 120, 130):
+            tracker.record({"seen": 0, "extracted": 5, "committed": 5.5, "sms_start": 6, "sms_done": e2e})
+        errors = [e for e in _drain(queue) if e["type"] == "error"]
+        assert len(errors) == 1 and "SLO breached" in errors[0]["data"]["error"]
+        assert tracker.summary()["slo_breached"]
+
+        for _ in range(4):
+            tracker.record({"seen": 0, "extracted": 5, "committed": 5.5, "sms_start": 6, "sms_done": 7})
+        assert not tracker.summary()["slo_breached"]
+
+    summary = tracker.summary()["intervals"]
+    assert summary["end_to_end"]["count"] == 4 and summary["end_to_end"]["p99"] == 7
+    assert summary["commit"]["p50"] == 0.5
+
+
+def _drain(queue):
+    out = []
+    while not queue.empty():
+        out.append(queue.get_nowait())
+    return out
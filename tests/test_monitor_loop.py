@@ -0,0 +1,243 @@
+"""
+Monitor loop tests on the in-memory fake browser and clock.
+"""
+
+import asyncio
+import threading
+
+from ig_monitor import events, monitor, state, worker
+from ig_monitor.http_backend import thread_id_from_url
+from ig_monitor.latency import LatencyTracker
+from ig_monitor.sms import encode_for_sms
+
+
+THREAD_ID = thread_id_from_url(str(monitor.settings.ig_thread_url))
+
+
+def _run_polls(monkeypatch, polls):
+    async def limited_running():
+        limited_running.calls += 1
+        return limited_running.calls <= polls
+    limited_running.calls = 0
+    monkeypatch.setattr(monitor, "is_running", limited_running)
+
+    async def go():
+        await state.init_state()
+        await monitor._monitor_loop()
+    asyncio.run(go())
+
+
+def test_notifies_each_new_message_once(fake_ig, monkeypatch):
+    fake_ig.add_message(THREAD_ID, "old one")
+    fake_ig.add_message(THREAD_ID, "latest before start")
+    fake_ig.add_message(THREAD_ID, "hello", at=300)
+    fake_ig.add_message(THREAD_ID, "hello", at=310)
+    fake_ig.add_message(THREAD_ID, "are you there?", at=2000)
+
+    _run_polls(monkeypatch, 40)
+
+    assert fake_ig.sent == ["IG: latest before start", "IG: hello", "IG: hello", "IG: are you there?"]
+    assert fake_ig.clock.slept > 2000
+
+
+def test_login_wall_notifies_then_resumes(fake_ig, monkeypatch):
+    fake_ig.log_out()
+    fake_ig.add_message(THREAD_ID, "first")
+
+    def sms(to, body):
+        fake_ig.sent.append(body)
+        if "login required" in body:
+            # The owner logs in through the remote browser a little later
+            fake_ig.log_in()
+    monkeypatch.setattr(monitor, "send_sms", sms)
+
+    _run_polls(monkeypatch, 3)
+
+    assert fake_ig.sent[0].startswith("IG Monitor: login required")
+    assert fake_ig.sent[1:] == ["IG: first"]
+
+
+def test_concurrent_first_users_share_one_launch(fake_ig, monkeypatch):
+    async def slow_context():
+        await asyncio.sleep(0.01)
+        return await fake_ig.new_context()
+    monitor.set_browser_factory(slow_context)
+    monkeypatch.setattr(monitor.settings, "browser_warmup", True)
+
+    async def go():
+        assert monitor.browser_launch_status()["status"] == "not_started"
+        warmup = asyncio.create_task(monitor.warm_up_browser())
+        await asyncio.sleep(0)
+        assert monitor.browser_launch_status()["status"] == "launching"
+        pages = await asyncio.gather(monitor.get_browser_page(), monitor._ensure_browser(), warmup)
+        assert pages[0] is pages[1]
+        assert monitor.browser_launch_status()["status"] == "open"
+
+    asyncio.run(go())
+    assert len(fake_ig.contexts) == 1
+
+
+def test_records_notification_latency(fake_ig, monkeypatch):
+    tracker = LatencyTracker(slo_seconds=0)
+    monkeypatch.setattr(monitor, "latency_tracker", tracker)
+    fake_ig.add_message(THREAD_ID, "before start")
+    fake_ig.add_message(THREAD_ID, "new one", at=300)
+
+    _run_polls(monkeypatch, 10)
+
+    # The message adopted on the first poll isn't timed; the new one is, from the
+    # start of the poll that found it (the page only shows group time labels)
+    end_to_end = tracker.summary()["intervals"]["end_to_end"]
+    assert end_to_end["count"] == 1
+    assert tracker.last["seen_source"] == "poll"
+    assert 0 <= end_to_end["p50"] <= monitor.settings.poll_seconds
+
+
+def test_backend_switches_do_not_resend_known_messages(fake_ig, monkeypatch):
+    monkeypatch.setattr(monitor, "_polled_by", {})
+    monkeypatch.setattr(monitor, "_last_visible", {})
+    thread_key = str(monitor.settings.ig_thread_url)
+    fake_ig.add_message(THREAD_ID, "hello")
+    fake_ig.add_message(THREAD_ID, "still there?")
+    api = [{"id": "ig:1", "text": "hello"}, {"id": "ig:2", "text": "still there?"}]
+
+    async def go():
+        await state.init_state()
+        await monitor._poll_http_messages(thread_key, api)
+        # The HTTP session expired: the browser takes over and identifies the
+        # same messages by DOM/hash ids. One arrived during the switch.
+        fake_ig.add_message(THREAD_ID, "during the switch")
+        page = await monitor._ensure_browser()
+        await monitor.open_thread_and_wait_ready(page)
+        await monitor._notify_if_new(page, thread_key)
+        fake_ig.add_message(THREAD_ID, "new one")
+        await monitor._notify_if_new(page, thread_key)
+        # Back to the HTTP backend once the login works again
+        api.append({"id": "ig:3", "text": "during the switch"})
+        api.append({"id": "ig:5", "text": "new one"})
+        await monitor._poll_http_messages(thread_key, api)
+        api.append({"id": "ig:4", "text": "bye"})
+        await monitor._poll_http_messages(thread_key, api)
+
+    asyncio.run(go())
+    assert fake_ig.sent == ["IG: still there?", "IG: during the switch", "IG: new one", "IG: bye"]
+
+
+def test_low_priority_digest_has_its_own_budget(monkeypatch):
+    sent = []
+    monkeypatch.setattr(monitor, "send_sms", lambda to, body, max_segments=None: sent.append((body, max_segments)))
+    monkeypatch.setattr(monitor.settings, "low_priority_digest_minutes", 1)
+    monkeypatch.setattr(monitor.settings, "digest_max_segments", 3)
+    monkeypatch.setattr(monitor, "_last_digest", 0.0)
+    entries = [f"IG: reaction number {i} to the photo you sent" for i in range(30)]
+    monkeypatch.setattr(monitor, "_low_priority", list(entries))
+
+    asyncio.run(monitor._flush_low_priority())
+
+    (body, max_segments), = sent
+    assert max_segments == 3
+    assert encode_for_sms(body)["segments"] <= 3
+    lines = body.split("\n")
+    assert lines[0] == "IG digest (30 low priority):"
+    # Whole entries, oldest first; the rest are only counted
+    kept = lines[1:-1]
+    assert kept == entries[:len(kept)] and len(kept) > 2
+    assert lines[-1] == f"(+{30 - len(kept)} more on the dashboard)"
+    assert monitor._low_priority == []
+
+
+def test_uncapped_digest_lists_everything(monkeypatch):
+    monkeypatch.setattr(monitor.settings, "digest_max_segments", 0)
+    entries = [f"IG: reaction number {i}" for i in range(30)]
+    assert monitor._digest_body(entries).split("\n")[1:] == entries
+
+
+def test_remote_login_gets_the_page_while_a_poll_waits_for_it(fake_ig, monkeypatch):
+    monkeypatch.setattr(monitor.settings, "monitor_mode", "inbox")
+    fake_ig.add_message(THREAD_ID, "first")
+    login_checks = []
+    real_is_logged_in = monitor.is_logged_in
+
+    async def is_logged_in(page):
+        login_checks.append(fake_ig.logged_in)
+        return await real_is_logged_in(page)
+    monkeypatch.setattr(monitor, "is_logged_in", is_logged_in)
+
+    async def remote_login():
+        # What the owner does through /browser: type the password and submit,
+        # each an input operation on the shared page
+        await worker._type("hunter2")
+        fake_ig.log_in()
+        await worker._key("Enter", settle=False)
+
+    def sms(to, body):
+        fake_ig.sent.append(body)
+        if "login required" in body:
+            # SMS go out from a worker thread; the login happens on the loop
+            remote.append(asyncio.run_coroutine_threadsafe(remote_login(), loop))
+    remote = []
+    loop = None
+    monkeypatch.setattr(monitor, "send_sms", sms)
+
+    async def running():
+        running.calls += 1
+        if running.calls == 2:
+            # Logged out between polls, and the shared page was taken off the inbox
+            fake_ig.log_out()
+            await monitor._page.goto("https://www.instagram.com/accounts/login/")
+        return running.calls <= 2
+    running.calls = 0
+    monkeypatch.setattr(monitor, "is_running", running)
+
+    async def go():
+        nonlocal loop
+        loop = asyncio.get_running_loop()
+        await state.init_state()
+        await monitor._monitor_loop()
+        await asyncio.gather(*map(asyncio.wrap_future, remote))
+    asyncio.run(go())
+
+    assert fake_ig.sent[1].startswith("IG Monitor: login required")
+    # The poll took the page back as soon as the remote input was done, instead
+    # of timing it out until its own ten-minute wait was over
+    assert login_checks.count(False) <= 2
+    assert ("type", "hunter2") in monitor._page.input_log
+
+
+def test_thread_polls_publish_the_login_state(fake_ig, monkeypatch):
+    fake_ig.add_message(THREAD_ID, "first")
+    states = []
+
+    async def running():
+        running.calls += 1
+        states.append(events.status_snapshot().get("logged_in"))
+        if running.calls == 3:
+            # The session expires while the page stays on the thread
+            fake_ig.log_out()
+        return running.calls <= 4
+    running.calls = 0
+    monkeypatch.setattr(monitor, "is_running", running)
+
+    async def go():
+        await state.init_state()
+        await monitor._monitor_loop()
+    asyncio.run(go())
+
+    assert states[1:3] == [True, True]
+    assert states[-1] is False
+
+
+def test_sms_is_sent_off_the_event_loop(fake_ig, monkeypatch):
+    fake_ig.add_message(THREAD_ID, "hello")
+    senders = []
+
+    def sms(to, body):
+        fake_ig.sent.append(body)
+        senders.append(threading.get_ident())
+    monkeypatch.setattr(monitor, "send_sms", sms)
+
+    _run_polls(monkeypatch, 2)
+
+    assert fake_ig.sent == ["IG: hello"]
+    # The SNS call blocks; the loop (on the main thread here) must keep running meanwhile
+    assert senders and threading.get_ident() not in senders
@@ -0,0 +1,106 @@
+"""
+Browser profile disk accounting and cache pruning tests, on a fake profile directory.
+"""
+
+import asyncio
+import os
+import threading
+
+import pytest
+
+from ig_monitor import monitor, profile, state
+
+
+def _write(path, size):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "wb") as fh:
+        fh.write(b"x" * size)
+
+
+@pytest.fixture
+def data_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(profile.settings, "data_dir", str(tmp_path))
+    monkeypatch.setattr(profile.settings, "user_data_dir_name", "user_data")
+    root = tmp_path / "user_data"
+    _write(str(root / "Default" / "Cookies"), 100)
+    _write(str(root / "Default" / "Local Storage" / "leveldb" / "000003.log"), 200)
+    _write(str(root / "Default" / "Cache" / "Cache_Data" / "f_000001"), 1000)
+    _write(str(root / "Default" / "Service Worker" / "CacheStorage" / "abc" / "index"), 400)
+    _write(str(root / "GrShaderCache" / "data_0"), 300)
+    _write(str(root / "Local State"), 10)
+    _write(str(tmp_path / "state.db"), 50)
+    return tmp_path
+
+
+def test_usage_report_breaks_the_profile_down(data_dir):
+    report = profile.usage_report()
+    assert report["profile"][os.path.join("Default", "Cache")] == 1000
+    assert report["profile"]["GrShaderCache"] == 300
+    assert report["profile"][os.path.join("Default", "Service Worker")] == 400
+    assert report["profile_total"] == 2010
+    # Only whole cache directories count as prunable in the estimate
+    assert report["prunable"] == 1300
+    assert report["data_dir"] == {"state.db": 50}
+    assert report["total"] == 2060
+    assert profile.last_report is report
+
+
+def test_prune_keeps_the_login(data_dir):
+    freed = profile.prune_caches()
+    assert freed == 1700
+    root = data_dir / "user_data"
+    assert (root / "Default" / "Cookies").exists()
+    assert (root / "Default" / "Local Storage" / "leveldb" / "000003.log").exists()
+    assert (root / "Local State").exists()
+    assert not (root / "Default" / "Cache").exists()
+    assert not (root / "Default" / "Service Worker" / "CacheStorage").exists()
+    assert not (root / "GrShaderCache").exists()
+    assert profile.usage_report()["profile_total"] == 310
+
+
+def test_budget(data_dir, monkeypatch):
+    report = profile.usage_report()
+    monkeypatch.setattr(profile.settings, "profile_budget_mb", 1)
+    assert not profile.over_budget(report)
+    assert profile.over_budget(dict(report, profile_total=2 * 1024 * 1024))
+
+
+def test_missing_profile_reports_nothing(tmp_path, monkeypatch):
+    monkeypatch.setattr(profile.settings, "data_dir", str(tmp_path / "absent"))
+    report = profile.usage_report()
+    assert report["profile_total"] == 0 and report["total"] == 0
+    assert profile.prune_caches() == 0
+
+
+def test_a_launch_waits_until_the_prune_is_done(data_dir, monkeypatch):
+    monkeypatch.setattr(state, "DB_PATH", str(data_dir / "test-state.db"))
+    order = []
+    release = threading.Event()
+
+    def prune_caches():
+        order.append("prune started")
+        release.wait(5)
+        order.append("prune finished")
+        return 0
+    monkeypatch.setattr(profile, "prune_caches", prune_caches)
+
+    async def launch_context():
+        order.append("launch")
+        raise RuntimeError("no browser here")
+    monkeypatch.setattr(monitor, "_launch_context", launch_context)
+
+    async def go():
+        await state.init_state()
+        pruning = asyncio.create_task(monitor._prune_profile())
+        while not order:
+            await asyncio.sleep(0.01)
+        # e.g. a /browser request arriving mid-prune
+        launching = asyncio.create_task(monitor._ensure_browser())
+        await asyncio.sleep(0.05)
+        release.set()
+        await pruning
+        with pytest.raises(RuntimeError):
+            await launching
+
+    asyncio.run(go())
+    assert order == ["prune started", "prune finished", "launch"]
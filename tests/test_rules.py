@@ -0,0 +1,72 @@
+"""
+Tests for the notification rules engine.
+"""
+
+import json
+
+from ig_monitor import rules
+from ig_monitor.rules import RuleSet
+
+
+RULES = {
+    "default_priority": "normal",
+    "exclude_keywords": ["giveaway"],
+    "deny_senders": ["spammer"],
+    "rules": [
+        {"name": "urgent", "keywords": ["urgent"], "priority": "high"},
+        {"name": "meh", "keywords": ["urgent-ish", "lol"], "priority": "low"},
+        {"name": "family", "senders": ["Mom"], "priority": "high"},
+        {"name": "reactions", "keywords": ["[like]"], "priority": "low"},
+    ],
+}
+
+
+def test_priorities():
+    rules = RuleSet(RULES)
+    assert rules.evaluate("See you later") == {"priority": "normal", "rule": None}
+    assert rules.evaluate("LOL that's funny")["priority"] == "low"
+    assert rules.evaluate("lol but URGENT")["rule"] == "urgent"
+    assert rules.evaluate("dinner?", sender="mom")["rule"] == "family"
+    assert rules.evaluate("[like]")["priority"] == "low"
+    # Whole words only
+    assert rules.evaluate("lollipop")["priority"] == "normal"
+
+
+def test_overlapping_keywords_all_match():
+    # "urgent-ish" starts with "urgent"; both rules apply and the higher priority wins
+    assert RuleSet(RULES).evaluate("urgent-ish")["rule"] == "urgent"
+
+
+def test_drops():
+    rules = RuleSet(RULES)
+    assert rules.evaluate("urgent giveaway")["priority"] == "drop"
+    assert rules.evaluate("urgent", sender="Spammer")["priority"] == "drop"
+    allow_only = RuleSet({"allow_senders": ["Mom"], "include_keywords": ["home"]})
+    assert allow_only.evaluate("coming home", sender="Mom")["priority"] == "normal"
+    assert allow_only.evaluate("coming home", sender="Bob")["priority"] == "drop"
+    assert allow_only.evaluate("hello", sender="Mom")["priority"] == "drop"
+
+
+def test_unknown_sender_and_the_allow_list():
+    allow_only = RuleSet({"allow_senders": ["Mom"], "deny_senders": ["spammer"]})
+    # The thread's name stands in for a sender the page didn't show
+    assert allow_only.evaluate("hi", thread_name="Mom")["priority"] == "normal"
+    assert allow_only.evaluate("hi", thread_name="Bob")["priority"] == "drop"
+    assert allow_only.evaluate("hi", sender="Bob", thread_name="Mom")["priority"] == "drop"
+    assert allow_only.evaluate("hi", thread_name="Spammer")["rule"] == "deny_senders"
+    # Nobody to check against: kept rather than silently dropped
+    assert allow_only.evaluate("hi") == {"priority": "normal", "rule": None}
+
+
+def test_rules_file_of_the_wrong_shape_falls_back_to_the_defaults(tmp_path, monkeypatch):
+    rules_file = tmp_path / "rules.json"
+    monkeypatch.setattr(rules.settings, "rules_path", str(rules_file))
+    monkeypatch.setattr(rules, "_ruleset", RuleSet())
+    monkeypatch.setattr(rules, "_loaded_mtime", None)
+    rules_file.write_text(json.dumps({"deny_senders": ["Bob"]}))
+    assert rules.evaluate("hi", sender="Bob")["priority"] == "drop"
+
+    for config in (["Mom"], {"rules": {"name": "x"}}, {"allow_senders": "Mom"}, {"rules": [{"keywords": "hi"}]}):
+        rules_file.write_text(json.dumps(config))
+        monkeypatch.setattr(rules, "_loaded_mtime", None)
+        assert rules.evaluate("hi", sender="Bob") == {"priority": "normal", "rule": None}
@@ -0,0 +1,45 @@
+"""
+Tests for the sampling CPU profiler.
+"""
+
+import asyncio
+import time
+import xml.dom.minidom
+
+import pytest
+
+from ig_monitor import sampler
+
+
+async def _spin():
+    while True:
+        started = time.perf_counter()
+        while time.perf_counter() - started < 0.02:
+            sum(range(1000))
+        await asyncio.sleep(0)
+
+
+def test_samples_are_tagged_with_the_running_task():
+    async def go():
+        task = asyncio.create_task(_spin(), name="ig-monitor-loop")
+        try:
+            return await sampler.profile(0.5)
+        finally:
+            task.cancel()
+
+    result = asyncio.run(go())
+    busy = [stack for stack in result["stacks"] if "task:ig-monitor-loop;_spin (test_sampler.py)" in stack]
+    assert busy and result["samples"] >= sum(result["stacks"].values())
+    assert sampler.collapsed({"a;b": 2}) == "a;b 2\n"
+    xml.dom.minidom.parseString(sampler.render_svg(result["stacks"]))
+
+
+def test_one_profile_at_a_time():
+    async def go():
+        first = asyncio.create_task(sampler.profile(0.2))
+        await asyncio.sleep(0)
+        with pytest.raises(sampler.ProfilerBusy):
+            await sampler.profile(0.2)
+        await first
+
+    asyncio.run(go())
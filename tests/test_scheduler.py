@@ -0,0 +1,90 @@
+"""
+Tests for the page operation scheduler.
+"""
+
+import asyncio
+
+import pytest
+
+from ig_monitor.scheduler import (
+    MAX_WAITING,
+    PRIORITY_INPUT,
+    PRIORITY_MONITOR,
+    PRIORITY_SCREENSHOT,
+    PageScheduler,
+    SchedulerBusy,
+)
+
+
+async def _op(scheduler, priority, name, order, hold=0.01):
+    async with scheduler.slot(priority, name):
+        order.append(name)
+        await asyncio.sleep(hold)
+
+
+def test_priority_order_and_stale_screenshots():
+    async def go():
+        scheduler = PageScheduler()
+        order = []
+        first = asyncio.create_task(_op(scheduler, PRIORITY_INPUT, "busy", order, hold=0.05))
+        await asyncio.sleep(0)
+        old_shot = asyncio.create_task(_op(scheduler, PRIORITY_SCREENSHOT, "old screenshot", order))
+        await asyncio.sleep(0)
+        tasks = [
+            asyncio.create_task(_op(scheduler, PRIORITY_SCREENSHOT, "screenshot", order)),
+            asyncio.create_task(_op(scheduler, PRIORITY_INPUT, "click", order)),
+            asyncio.create_task(_op(scheduler, PRIORITY_MONITOR, "poll", order)),
+        ]
+        await asyncio.gather(first, *tasks)
+        with pytest.raises(SchedulerBusy):
+            await old_shot
+        return order
+
+    assert asyncio.run(go()) == ["busy", "poll", "click", "screenshot"]
+
+
+def test_overload_is_rejected_with_retry_after():
+    async def go():
+        scheduler = PageScheduler()
+        order = []
+        holder = asyncio.create_task(_op(scheduler, PRIORITY_MONITOR, "poll", order, hold=0.05))
+        await asyncio.sleep(0)
+        waiting = [asyncio.create_task(_op(scheduler, PRIORITY_INPUT, f"k{i}", order)) for i in range(MAX_WAITING[PRIORITY_INPUT])]
+        await asyncio.sleep(0)
+        with pytest.raises(SchedulerBusy) as busy:
+            await _op(scheduler, PRIORITY_INPUT, "one too many", order)
+        await asyncio.gather(holder, *waiting)
+        return busy.value.retry_after, order
+
+    retry_after, order = asyncio.run(go())
+    assert retry_after >= 1
+    assert "one too many" not in order
+    assert len(order) == 1 + MAX_WAITING[PRIORITY_INPUT]
+
+
+def test_released_lets_waiting_operations_in_and_takes_the_page_back():
+    async def go():
+        scheduler = PageScheduler()
+        order = []
+
+        async def poll():
+            async with scheduler.slot(PRIORITY_MONITOR, "poll"):
+                order.append("poll starts")
+                await asyncio.sleep(0.01)
+                async with scheduler.released():
+                    await asyncio.sleep(0.05)
+                order.append("poll resumes")
+                await asyncio.sleep(0.01)
+                order.append("poll ends")
+
+        polling = asyncio.create_task(poll())
+        await asyncio.sleep(0)
+        await asyncio.gather(_op(scheduler, PRIORITY_INPUT, "click", order), polling)
+        # Holding nothing, released() is a no-op
+        async with scheduler.released():
+            order.append("outside")
+        return order, scheduler.queue_depth()
+
+    order, depth = asyncio.run(go())
+    assert order == ["poll starts", "click", "poll resumes", "poll ends", "outside"]
+    assert depth == 0
@@ -0,0 +1,91 @@
+"""
+Dedupe tests: the per-thread seen-set and which messages the monitor treats as new.
+"""
+
+import asyncio
+
+import pytest
+
+from ig_monitor import monitor, state
+
+
+THREAD = "https://www.instagram.com/direct/t/1/"
+
+
+@pytest.fixture
+def sent(tmp_path, monkeypatch):
+    monkeypatch.setattr(state, "DB_PATH", str(tmp_path / "state.db"))
+    sent = []
+    monkeypatch.setattr(monitor, "send_sms", lambda to, body: sent.append(body))
+    asyncio.run(state.init_state())
+    return sent
+
+
+def _messages(*ids):
+    return [{"id": i, "text": f"text {i}"} for i in ids]
+
+
+def test_seen_set_is_per_thread(sent):
+    async def go():
+        assert not await state.has_seen_any(THREAD)
+        await state.mark_seen(THREAD, ["a", "b"])
+        await state.mark_seen(THREAD, ["b"])  # marking twice is harmless
+        assert await state.has_seen_any(THREAD)
+        assert await state.filter_unseen(THREAD, ["a", "c", "b", "d"]) == ["c", "d"]
+        assert await state.filter_unseen("other", ["a"]) == ["a"]
+        assert await state.filter_unseen(THREAD, []) == []
+
+    asyncio.run(go())
+
+
+def test_first_poll_of_a_fresh_install_sends_only_the_latest(sent):
+    async def go():
+        await monitor._notify_new_messages(THREAD, _messages("a", "b", "c"))
+        await monitor._notify_new_messages(THREAD, _messages("a", "b", "c"))
+    asyncio.run(go())
+    assert sent == ["IG: text c"]
+
+
+def test_first_poll_after_an_upgrade_sends_nothing(sent):
+    async def go():
+        # The pre-seen-set version only remembered the last message id
+        await state.set_last_seen_id("old-style-id", THREAD)
+        await monitor._notify_new_messages(THREAD, _messages("a", "b"))
+        await monitor._notify_new_messages(THREAD, _messages("a", "b", "c"))
+    asyncio.run(go())
+    assert sent == ["IG: text c"]
+
+
+def test_changed_ids_above_the_newest_known_message_are_adopted(sent):
+    async def go():
+        await monitor._notify_new_messages(THREAD, _messages("a", "b", "c"))
+        # "a2" is "a" whose hashed id changed; "d" is really new
+        await monitor._notify_new_messages(THREAD, _messages("a2", "b", "c", "d"))
+        assert await state.filter_unseen(THREAD, ["a2", "d"]) == []
+    asyncio.run(go())
+    assert sent == ["IG: text c", "IG: text d"]
+
+
+def test_nothing_known_in_view_means_everything_is_new(sent):
+    async def go():
+        await monitor._notify_new_messages(THREAD, _messages("a"))
+        await monitor._notify_new_messages(THREAD, _messages("x", "y"))
+    asyncio.run(go())
+    assert sent == ["IG: text a", "IG: text x", "IG: text y"]
+
+
+def test_threads_seen_under_an_older_id_scheme_are_adopted_once(sent, monkeypatch):
+    monkeypatch.setattr(monitor, "_readopt_pending", None)
+
+    async def go():
+        await state.mark_seen(THREAD, ["old-a", "old-b"])
+        # The next start finds seen ids written under another scheme
+        monkeypatch.setattr(state, "MESSAGE_ID_SCHEME", state.MESSAGE_ID_SCHEME + 1)
+        await state.init_state()
+        await monitor._notify_new_messages(THREAD, _messages("a", "b"))
+        await monitor._notify_new_messages(THREAD, _messages("a", "b", "c"))
+        # ...and only once
+        await state.init_state()
+        assert await state.get_readopt_threads() == []
+    asyncio.run(go())
+    assert sent == ["IG: text c"]
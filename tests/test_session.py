@@ -0,0 +1,126 @@
+"""
+storage_state session mode tests: a recorded stand-in for the Playwright browser.
+"""
+
+import asyncio
+import json
+import os
+
+import pytest
+
+from ig_monitor import engines, monitor
+from tests.fakes import FakeInstagram
+
+
+class RecordingBrowser:
+    """Playwright's Browser as far as storage_state mode uses it"""
+
+    def __init__(self, ig):
+        self.ig = ig
+        self.context_kwargs = []
+        self.connected = True
+
+    def is_connected(self):
+        return self.connected
+
+    async def new_context(self, **kwargs):
+        self.context_kwargs.append(kwargs)
+        return await self.ig.new_context()
+
+    async def close(self):
+        self.connected = False
+
+
+class RecordingLauncher:
+    def __init__(self, ig):
+        self.ig = ig
+        self.launches = []
+
+    async def launch(self, **kwargs):
+        self.launches.append(kwargs)
+        return RecordingBrowser(self.ig)
+
+    async def launch_persistent_context(self, **kwargs):
+        raise AssertionError("storage_state mode must not use a persistent profile")
+
+
+@pytest.fixture
+def launcher(tmp_path, monkeypatch, reset_browser):
+    monkeypatch.setattr(monitor.settings, "session_mode", "storage_state")
+    monkeypatch.setattr(monitor.settings, "data_dir", str(tmp_path))
+    launcher = RecordingLauncher(FakeInstagram())
+    monkeypatch.setattr(monitor, "_playwright", object())
+    monkeypatch.setattr(engines, "browser_type", lambda pw, engine: launcher)
+    monkeypatch.setattr(engines, "stealth_script", lambda engine: None)
+    return launcher
+
+
+def test_first_launch_starts_without_a_saved_session(launcher):
+    async def go():
+        await monitor._ensure_browser()
+        return monitor.session_status()
+
+    status = asyncio.run(go())
+    assert len(launcher.launches) == 1
+    assert monitor._browser.context_kwargs[0]["storage_state"] is None
+    assert status["saved_session"] is False
+
+
+def test_session_is_saved_atomically_and_seeds_the_next_context(launcher, tmp_path):
+    async def go():
+        await monitor._ensure_browser()
+        first_context = monitor._context
+        path = await monitor.save_session()
+        page = await monitor.recycle_context()
+        return first_context, path, page
+
+    first_context, path, page = asyncio.run(go())
+    assert path == monitor.storage_state_path() and os.path.dirname(path) == str(tmp_path)
+    assert not os.path.exists(path + ".tmp")
+    with open(path, encoding="utf-8") as fh:
+        assert any(c["name"] == "sessionid" for c in json.load(fh)["cookies"])
+    assert monitor.session_status()["saved_session"] is True
+
+    # Recycling closes the context but keeps the browser process
+    assert first_context.closed and page is monitor._page
+    assert len(launcher.launches) == 1
+    assert [kw["storage_state"] for kw in monitor._browser.context_kwargs] == [None, path]
+
+
+def test_close_saves_the_session_and_relaunches_lazily(launcher):
+    async def go():
+        await monitor._ensure_browser()
+        browser = monitor._browser
+        await monitor.close_browser()
+        assert not browser.is_connected() and not monitor.is_browser_open()
+        await monitor._ensure_browser()
+
+    asyncio.run(go())
+    assert len(launcher.launches) == 2
+    assert monitor._browser.context_kwargs[0]["storage_state"] == monitor.storage_state_path()
+
+
+def test_a_hung_page_only_costs_a_new_context(launcher, monkeypatch):
+    runs = [monitor.MonitorStalled("no heartbeat"), None]
+
+    async def run_watched():
+        error = runs.pop(0)
+        if error:
+            raise error
+    monkeypatch.setattr(monitor, "_run_watched", run_watched)
+
+    async def running():
+        return True
+    monkeypatch.setattr(monitor, "is_running", running)
+    monkeypatch.setattr(monitor, "RESTART_BACKOFF_INITIAL", 0)
+
+    async def go():
+        await monitor._ensure_browser()
+        hung_context = monitor._context
+        await monitor._supervise()
+        return hung_context
+
+    hung_context = asyncio.run(go())
+    assert hung_context.closed and monitor._context is not hung_context
+    # The browser process is kept
+    assert len(launcher.launches) == 1 and monitor._browser.is_connected()
@@ -0,0 +1,111 @@
+"""
+Settle detector tests: a scripted page (DOM verdicts, request events) on the fake clock.
+"""
+
+import asyncio
+
+import pytest
+
+from ig_monitor import settle
+from tests.fakes import FakeClock
+
+
+class ScriptedPage:
+    """Each evaluate() takes the next DOM verdict ("settled", "busy" or "navigated")"""
+
+    def __init__(self, clock, dom, on_evaluate=None):
+        self.clock = clock
+        self.dom = list(dom)
+        self.handlers = {}
+        self.on_evaluate = on_evaluate
+        self.evaluations = 0
+
+    def on(self, event, handler):
+        self.handlers.setdefault(event, []).append(handler)
+
+    def emit(self, event, payload):
+        for handler in self.handlers.get(event, []):
+            handler(payload)
+
+    async def evaluate(self, script, args):
+        quiet_ms, max_ms = args
+        self.evaluations += 1
+        if self.on_evaluate:
+            self.on_evaluate(self)
+        verdict = self.dom.pop(0) if self.dom else "settled"
+        if verdict == "navigated":
+            raise RuntimeError("Execution context was destroyed")
+        if verdict == "busy":
+            self.clock.advance(max_ms / 1000)
+            return {"settled": False, "waited": max_ms}
+        self.clock.advance(quiet_ms / 1000)
+        return {"settled": True, "waited": quiet_ms}
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    # Trackers are keyed by id(page): a new page could reuse a collected one's id
+    # and inherit its tracker, whose handlers are bound to the old page
+    monkeypatch.setattr(settle, "_trackers", {})
+    clock = FakeClock()
+    with clock.patch(settle):
+        yield clock
+
+
+def _settle(page, quiet_ms=500, max_ms=5000):
+    return asyncio.run(settle.wait_for_settle(page, quiet_ms=quiet_ms, max_ms=max_ms))
+
+
+def test_quiet_page_settles_after_one_quiet_period(clock):
+    page = ScriptedPage(clock, ["settled"])
+    clock.advance(10)  # no requests for a while
+    start = clock.now
+    assert _settle(page)
+    assert page.evaluations == 1 and clock.now - start == pytest.approx(0.5)
+
+
+def test_busy_dom_gives_up_at_the_cap(clock):
+    page = ScriptedPage(clock, ["busy"])
+    start = clock.now
+    assert not _settle(page)
+    assert clock.now - start == pytest.approx(5.0)
+
+
+def test_navigation_mid_wait_retries(clock):
+    page = ScriptedPage(clock, ["navigated", "settled"])
+    clock.advance(10)
+    assert _settle(page)
+    assert page.evaluations == 2
+
+
+def test_waits_for_pending_requests_but_not_long_polls(clock):
+    def first_evaluate(page):
+        if page.evaluations == 1:
+            page.emit("request", "realtime")  # stays open: a long-poll
+            page.emit("request", "thread-api")
+    page = ScriptedPage(clock, ["settled", "settled", "settled"], on_evaluate=first_evaluate)
+
+    # While the short request is pending the network isn't quiet
+    started = clock.now
+    original_sleep = clock.sleep
+
+    async def sleep(seconds, result=None):
+        if clock.now - started >= 1.0:
+            page.emit("requestfinished", "thread-api")
+        return await original_sleep(seconds, result)
+    clock.sleep = sleep
+    with clock.patch(settle):
+        assert _settle(page)
+
+    # Only settled once thread-api finished and a quiet period passed after it,
+    # even though the realtime request never finished
+    assert clock.now - started >= 1.5
+    assert page.evaluations >= 2
+
+
+def test_tracker_forgets_closed_pages(clock):
+    page = ScriptedPage(clock, [])
+    settle.track_network(page)
+    assert id(page) in settle._trackers
+    page.emit("close", page)
+    assert id(page) not in settle._trackers
@@ -0,0 +1,48 @@
+"""
+Tests for the segment-aware SMS encoder.
+"""
+
+from ig_monitor.sms import count_segments, encode_for_sms
+
+
+def test_segment_counts():
+    assert count_segments("a" * 160) == 1
+    assert count_segments("a" * 161) == 2
+    assert count_segments("a" * 306) == 2
+    # Extension characters take two septets
+    assert count_segments("€" * 80) == 1
+    assert count_segments("€" * 81) == 2
+    # One emoji switches to UCS-2 (70 per segment, emoji = two code units)
+    assert count_segments("a" * 69 + "😀") == 2
+    assert count_segments("a" * 68 + "😀") == 1
+
+
+def test_typographic_punctuation_stays_gsm7():
+    encoded = encode_for_sms("IG: it’s “fine” — really…")
+    assert encoded["text"] == "IG: it's \"fine\" - really..."
+    assert encoded["encoding"] == "GSM-7"
+    assert not encoded["transliterated"]
+
+
+def test_auto_keeps_emoji_when_it_costs_nothing():
+    encoded = encode_for_sms("IG: see you 😀", max_segments=1)
+    assert encoded["encoding"] == "UCS-2"
+    assert encoded["text"].endswith("😀")
+
+
+def test_auto_transliterates_when_it_saves_segments():
+    encoded = encode_for_sms("IG: " + "café " * 20 + "😀", max_segments=1)
+    assert encoded["encoding"] == "GSM-7"
+    assert encoded["transliterated"]
+    assert encoded["segments"] == 1
+    assert "😀" not in encoded["text"]
+
+
+def test_truncates_to_budget_on_a_word_boundary():
+    encoded = encode_for_sms("word " * 100, max_segments=2)
+    assert encoded["truncated"]
+    assert encoded["segments"] == 2
+    assert encoded["text"].endswith("word...")
+    never = encode_for_sms("😀" * 100, max_segments=1, mode="never")
+    assert never["encoding"] == "UCS-2"
+    assert never["segments"] == 1
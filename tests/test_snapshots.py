@@ -0,0 +1,63 @@
+"""
+Tests for DOM snapshot sanitizing and the size-capped snapshot store.
+"""
+
+import os
+import re
+
+from ig_monitor.snapshots import Masker, SnapshotStore, load_snapshot, sanitize_html
+
+
+def test_sanitize_masks_text_and_strips_payloads():
+    masker = Masker(b"test-key")
+    html = (
+        '<div role="main" style="color:red" onclick="steal()">'
+        '<script>var token = "secret";</script>'
+        '<div role="row" aria-label="Alice, 10:32"><img src="https://cdn/x.jpg" alt="Alice\'s profile picture">'
+        '<time datetime="2024-05-01T10:32:00Z">10:32</time>'
+        '<div dir="auto">Meet at 5 &amp; bring Alice</div></div></div>'
+    )
+    clean = sanitize_html(html, masker)
+
+    assert "Alice" not in clean and "Meet" not in clean
+    assert "secret" not in clean and "<script" not in clean
+    assert "style=" not in clean and "onclick" not in clean and "src=" not in clean
+    assert 'role="row"' in clean and 'dir="auto"' in clean
+    # The same words map to the same pseudonyms everywhere, UI words stay readable
+    alice = masker.text("Alice")
+    assert f'aria-label="{alice}, ' in clean
+    assert f"alt=\"{alice}&#x27;s profile picture\"" in clean
+    assert masker.text("Meet at 5 & bring Alice").replace("&", "&amp;") in clean
+
+
+def test_store_drops_oldest_beyond_budget(tmp_path):
+    store = SnapshotStore(str(tmp_path), budget_bytes=3000)
+    for i in range(10):
+        path = store.write(f"{i:03d}.json.gz", {"html": os.urandom(400).hex(), "expected": []})
+        os.utime(path, (i, i))
+        store.enforce_budget()
+    files = [os.path.basename(p) for p in store.files()]
+    assert files and len(files) < 10
+    assert files[-1] == "009.json.gz"
+    assert sum(os.path.getsize(p) for p in store.files()) <= 3000
+    assert "html" in load_snapshot(store.files()[-1])
+
+
+def test_no_message_word_survives_sanitizing():
+    masker = Masker(b"test-key")
+    message = "Did you see the photo I sent you today at 5 pm"
+    html = (
+        '<div role="main"><div role="row" aria-label="Alice Smith, 10:32" data-scope="thread-alice-smith">'
+        f'<div id="mid.{message.replace(" ", "_")}" data-message-id="alice-1234">'
+        f'<div dir="auto">{message}</div></div>'
+        '<div role="button" aria-label="Reply to message">Reply</div></div></div>'
+    )
+    clean = sanitize_html(html, masker)
+
+    for word in message.split():
+        assert not re.search(rf"(?<![^\W_]){re.escape(word)}(?![^\W_])", clean, re.IGNORECASE), word
+    assert "alice" not in clean.lower() and "1234" not in clean
+    # Structure the extractor matches on survives; labels and buttons keep UI words
+    assert 'id="mid.' in clean and "data-message-id=" in clean
+    assert 'aria-label="Reply to message"' in clean
+    assert ">Reply</div>" in clean
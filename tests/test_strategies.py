@@ -0,0 +1,109 @@
+"""
+Tests for the self-tuning extraction strategy choice.
+"""
+
+import asyncio
+
+import pytest
+
+from playwright.async_api import Error as PlaywrightError
+
+from ig_monitor import state
+from ig_monitor.extract import LAST_BUBBLE_JS, MESSAGES_JS
+from ig_monitor.strategies import MIN_SAMPLES, StrategyTuner
+
+
+ROWS = [{"text": "hello", "timestamp": "t1", "sender": "a"}, {"text": "how are you", "timestamp": "t1", "sender": "a"}]
+
+
+class ScriptedPage:
+    """Answers MESSAGES_JS per container (with an artificial delay) and LAST_BUBBLE_JS"""
+
+    def __init__(self, containers, delays=None):
+        self.containers = containers
+        self.delays = delays or {}
+        self.closed = False
+
+    def is_closed(self):
+        return self.closed
+
+    async def evaluate(self, script, arg=None):
+        if script == LAST_BUBBLE_JS:
+            return "how are you"
+        assert script == MESSAGES_JS
+        incremental, container = arg[2], arg[3]
+        key = container if incremental else container + " rescan"
+        await asyncio.sleep(self.delays.get(key, 0))
+        rows = self.containers.get(key)
+        if rows is None:
+            return []
+        return [dict(r, index=i) for i, r in enumerate(rows)]
+
+
+@pytest.fixture
+def db(tmp_path, monkeypatch):
+    monkeypatch.setattr(state, "DB_PATH", str(tmp_path / "state.db"))
+    asyncio.run(state.init_state())
+
+
+def test_fails_over_in_order_and_persists(db):
+    async def go():
+        page = ScriptedPage({"[role='grid']": ROWS})
+        tuner = StrategyTuner()
+        messages = await tuner.extract(page, "t")
+        assert [m["text"] for m in messages] == ["hello", "how are you"]
+        assert tuner.current == "grid-rows"
+
+        # Nothing has rows any more: the newest bubble is still found, but its
+        # text-only id can't be matched against the full strategies' ids
+        page.containers = {}
+        assert await tuner.extract(page, "t") == []
+        assert tuner.current == "last-bubble"
+
+        # A restart begins with the persisted choice
+        restarted = StrategyTuner()
+        await restarted._load()
+        assert restarted.current == "last-bubble"
+        assert restarted.stats["grid-rows"]["hits"]
+
+        # The full strategies are tried on every poll and report what arrived meanwhile
+        page.containers = {"body": ROWS + [{"text": "still there?", "timestamp": "t2", "sender": "a"}]}
+        messages = await tuner.extract(page, "t")
+        assert [m["text"] for m in messages] == ["hello", "how are you", "still there?"]
+        assert tuner.current == "page-message-ids"
+
+    asyncio.run(go())
+
+
+def test_promotes_faster_strategy_that_agrees(db):
+    async def go():
+        main = "[role='main']"
+        page = ScriptedPage(
+            {main: ROWS, main + " rescan": ROWS, "[role='grid']": ROWS[1:], "body": ROWS},
+            delays={main: 0.02, main + " rescan": 0.02, "body": 0.0},
+        )
+        tuner = StrategyTuner(explore_every=1)
+        for _ in range(3 * MIN_SAMPLES + 3):
+            await tuner.extract(page, "t")
+        # grid-rows is fast too but disagrees with the active result, so it never qualifies
+        assert tuner.current == "page-message-ids"
+        assert tuner.hit_rate("grid-rows") == 0.0
+
+    asyncio.run(go())
+
+
+def test_a_closed_page_is_not_a_strategy_failure(db):
+    class ClosedPage(ScriptedPage):
+        async def evaluate(self, script, arg=None):
+            self.closed = True
+            raise PlaywrightError("Target page, context or browser has been closed")
+
+    async def go():
+        tuner = StrategyTuner()
+        with pytest.raises(PlaywrightError, match="has been closed"):
+            await tuner.extract(ClosedPage({}), "t")
+        # No failover, and the active strategy isn't blamed
+        assert tuner.current == "rows"
+        assert not tuner.stats["rows"]["hits"]
+
+    asyncio.run(go())
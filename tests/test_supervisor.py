@@ -0,0 +1,190 @@
+"""
+Monitor supervisor tests: restarts, backoff, resuming after a process restart,
+page operation deadlines and the heartbeat watchdog.
+"""
+
+import asyncio
+
+import pytest
+
+from ig_monitor import events, monitor, state
+from tests.fakes import FakeClock, FakeInstagram
+
+
+class StubPage:
+    def __init__(self, closed=False):
+        self.closed = closed
+
+    def is_closed(self):
+        return self.closed
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    discarded = []
+
+    async def discard():
+        discarded.append(monitor._page)
+        monitor._context = None
+        monitor._page = None
+    monkeypatch.setattr(monitor, "_discard_browser", discard)
+    clock.discarded = discarded
+    with clock.patch(monitor):
+        yield clock
+    monitor._context = None
+    monitor._page = None
+
+
+def _supervise(monkeypatch, runs):
+    """Run _supervise with _run_watched taking (seconds, exception or None) from runs"""
+    remaining = list(runs)
+
+    async def run_watched():
+        seconds, error = remaining.pop(0)
+        await monitor.asyncio.sleep(seconds)
+        if error:
+            raise error
+    monkeypatch.setattr(monitor, "_run_watched", run_watched)
+
+    async def running():
+        return True
+    monkeypatch.setattr(monitor, "is_running", running)
+
+    async def go():
+        with events.subscribe() as queue:
+            await monitor._supervise()
+            return [
+                e["data"]["restarting_in"] for e in (queue.get_nowait() for _ in range(queue.qsize()))
+                if "restarting_in" in e["data"]
+            ]
+    return asyncio.run(go())
+
+
+def test_crashes_back_off_exponentially_up_to_the_cap(clock, monkeypatch):
+    monkeypatch.setattr(monitor, "RESTART_BACKOFF_MAX", 10)
+    crash = (1, RuntimeError("boom"))
+    delays = _supervise(monkeypatch, [crash] * 5 + [(1, None)])
+    assert delays == [2, 4, 8, 10, 10]
+
+
+def test_a_healthy_run_resets_the_backoff(clock, monkeypatch):
+    crash = (1, RuntimeError("boom"))
+    long_run_then_crash = (monitor.HEALTHY_RUN_SECONDS + 1, RuntimeError("boom"))
+    delays = _supervise(monkeypatch, [crash, crash, long_run_then_crash, crash, (1, None)])
+    assert delays == [2, 4, 2, 4]
+
+
+def test_browser_is_only_relaunched_when_it_died(clock, monkeypatch):
+    monitor._context = object()
+    monitor._page = StubPage()
+    _supervise(monkeypatch, [(1, RuntimeError("selector not found")), (1, None)])
+    assert clock.discarded == []
+
+    dead = StubPage(closed=True)
+    monitor._page = dead
+    _supervise(monkeypatch, [(1, RuntimeError("Target closed")), (1, None)])
+    assert clock.discarded == [dead]
+
+    # A hang always recycles the page, even if it still looks alive
+    alive = StubPage()
+    monitor._context = object()
+    monitor._page = alive
+    _supervise(monkeypatch, [(1, monitor.MonitorStalled("no heartbeat")), (1, None)])
+    assert clock.discarded == [dead, alive]
+
+
+def test_resumes_after_restart_only_if_it_was_running(tmp_path, monkeypatch):
+    monkeypatch.setattr(state, "DB_PATH", str(tmp_path / "state.db"))
+    started = []
+
+    async def supervise():
+        started.append(True)
+    monkeypatch.setattr(monitor, "_supervise", supervise)
+
+    async def go():
+        await state.init_state()
+        assert await monitor.resume_monitor_if_enabled() is None
+        await state.set_running(True)
+        assert await monitor.resume_monitor_if_enabled() == "started"
+        await monitor._monitor_task
+
+    asyncio.run(go())
+    assert started == [True]
+    monitor._monitor_task = None
+
+
+def test_deadline_turns_a_hung_page_call_into_a_timeout():
+    async def hung():
+        await asyncio.Event().wait()
+
+    async def go():
+        assert await monitor._deadline(asyncio.sleep(0, "done"), "quick", 1) == "done"
+        with pytest.raises(monitor.PageOperationTimeout, match="screenshot did not finish"):
+            await monitor._deadline(hung(), "screenshot", 0.01)
+
+    asyncio.run(go())
+
+
+def _watch(monkeypatch, loop):
+    monkeypatch.setattr(monitor, "WATCHDOG_INTERVAL_SECONDS", 0.01)
+    monkeypatch.setattr(monitor.settings, "watchdog_stale_seconds", 300)
+    monkeypatch.setattr(monitor, "_monitor_loop", loop)
+    asyncio.run(monitor._run_watched())
+
+
+def test_watchdog_cancels_a_loop_that_stops_beating(clock, monkeypatch):
+    cancelled = []
+
+    async def wedged_loop():
+        clock.advance(301)
+        try:
+            await asyncio.Event().wait()
+        except asyncio.CancelledError:
+            cancelled.append(True)
+            raise
+
+    with pytest.raises(monitor.MonitorStalled, match="no heartbeat for 301s"):
+        _watch(monkeypatch, wedged_loop)
+    assert cancelled == [True]
+
+
+def test_a_slow_loop_that_keeps_beating_is_left_alone(clock, monkeypatch):
+    async def slow_loop():
+        for _ in range(5):
+            clock.advance(200)
+            monitor._beat()
+            # Real time, so the watchdog gets to look in between
+            await asyncio.sleep(0.02)
+        return "finished"
+
+    _watch(monkeypatch, slow_loop)
+
+
+def test_an_inbox_pass_opening_many_threads_is_not_a_stall(clock, reset_browser, tmp_path, monkeypatch):
+    monkeypatch.setattr(state, "DB_PATH", str(tmp_path / "state.db"))
+    monkeypatch.setattr(monitor.settings, "monitor_mode", "inbox")
+    monkeypatch.setattr(monitor, "send_sms", lambda to, body: None)
+    ig = FakeInstagram(clock)
+    for thread in range(5):
+        ig.add_message(str(thread), f"hi {thread}")
+    monitor.set_browser_factory(ig.new_context)
+    real_open_entry = monitor.open_entry
+
+    async def slow_open_entry(page, key):
+        # Each thread takes most of the stale threshold to open
+        clock.advance(200)
+        await asyncio.sleep(0.02)
+        return await real_open_entry(page, key)
+    monkeypatch.setattr(monitor, "open_entry", slow_open_entry)
+
+    async def one_pass():
+        one_pass.calls += 1
+        return one_pass.calls <= 1
+    one_pass.calls = 0
+    monkeypatch.setattr(monitor, "is_running", one_pass)
+
+    async def setup():
+        await state.init_state()
+    asyncio.run(setup())
+    _watch(monkeypatch, monitor._monitor_loop)
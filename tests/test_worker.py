@@ -0,0 +1,105 @@
+"""
+Browser worker tests: a worker server and a client in one process, on the fake browser.
+"""
+
+import asyncio
+import time
+
+import pytest
+
+from ig_monitor import events, monitor, state, worker
+from tests.fakes import PNG_1X1, FakeInstagram
+
+
+@pytest.fixture
+def fake_ig(tmp_path, monkeypatch, reset_browser):
+    # Real time: the worker's background loops would otherwise skip ahead to
+    # the browser idle timeout
+    monkeypatch.setattr(state, "DB_PATH", str(tmp_path / "state.db"))
+    ig = FakeInstagram()
+    monitor.set_browser_factory(ig.new_context)
+    return ig
+
+
+def _with_worker(tmp_path, monkeypatch, check):
+    # Server and client share one event bus here: an event coming back from the
+    # worker is recorded instead of republished (the server would send it again)
+    published, forwarded = [], []
+    real_forward = events.forward
+
+    def forward(event):
+        if event in published:
+            forwarded.append(event)
+        else:
+            published.append(event)
+            real_forward(event)
+    monkeypatch.setattr(events, "forward", forward)
+
+    async def go():
+        path = str(tmp_path / "worker.sock")
+        stop = asyncio.Event()
+        server = asyncio.create_task(worker.run_worker(path, stop))
+        while not worker._can_connect(path):
+            await asyncio.sleep(0.01)
+        client = worker.WorkerClient(path, spawn=False)
+        try:
+            await client.start()
+            await check(client, forwarded)
+        finally:
+            await client.close()
+            stop.set()
+            await server
+
+    asyncio.run(go())
+
+
+def test_operations_and_screenshots_go_through_the_worker(fake_ig, tmp_path, monkeypatch):
+    async def check(client, forwarded):
+        result = await client.call("navigate", url="https://www.instagram.com/accounts/login/", wait_until="load")
+        assert result["url"] == "https://www.instagram.com/accounts/login/"
+        assert await client.screenshot() == PNG_1X1
+        with pytest.raises(ValueError):
+            await client.call("scroll", direction="sideways")
+        # The worker listens before its state database is open
+        for _ in range(100):
+            status = await client.call("status")
+            if status["state_ready"]:
+                break
+            await asyncio.sleep(0.01)
+        assert status["state_ready"] and status["browser"]["status"] == "open"
+
+        events.publish("state", url="https://example.test/")
+        for _ in range(100):
+            if any(e["data"].get("url") == "https://example.test/" for e in forwarded):
+                break
+            await asyncio.sleep(0.01)
+        else:
+            pytest.fail("event was not forwarded by the worker")
+
+    _with_worker(tmp_path, monkeypatch, check)
+
+
+def test_client_without_worker_is_unavailable(tmp_path):
+    client = worker.WorkerClient(str(tmp_path / "missing.sock"), spawn=False)
+    with pytest.raises(worker.WorkerUnavailable):
+        asyncio.run(client.call("status"))
+
+
+def test_client_health_fails_once_the_published_heartbeat_is_stale(tmp_path, monkeypatch):
+    monkeypatch.setattr(events, "_status", {})
+    monkeypatch.setattr(monitor, "_heartbeat_published", None)
+    monkeypatch.setattr(monitor.settings, "watchdog_stale_seconds", 300)
+    client = worker.WorkerClient(str(tmp_path / "missing.sock"), spawn=False)
+
+    events.publish("state", running=True)
+    monitor._beat()
+    health = asyncio.run(client.health())
+    assert health["healthy"] and health["heartbeat_age_seconds"] < 5
+
+    # The worker stopped publishing (or the loop stopped beating) 301s ago
+    events.publish("state", heartbeat_at=time.time() - 301)
+    health = asyncio.run(client.health())
+    assert not health["healthy"] and health["heartbeat_age_seconds"] > 300
+
+    events.publish("state", running=False)
+    assert asyncio.run(client.health())["healthy"]